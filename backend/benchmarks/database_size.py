@@ -0,0 +1,94 @@
+"""
+Reports the size of the user, file, closure and share tables and their indexes, and
+how many of their pages sit in shared buffers if the pg_buffercache extension is
+installed. Partitioned tables are summed over their partitions. Run it before and
+after a schema migration to measure the difference:
+
+    python benchmarks/database_size.py
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from yama import database
+
+_TABLES = [
+    "users",
+    "user_ancestors_user_descendants",
+    "files",
+    "file_ancestors_file_descendants",
+    "file_shares",
+]
+
+
+async def _main() -> None:
+    config = database.Config()  # pyright: ignore[reportCallIssue]
+    async with database.make_connection(
+        host=config.host,
+        port=config.port,
+        username=config.username,
+        password=config.password,
+        database=config.database,
+    ) as c:
+        has_buffercache = (
+            await c.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_buffercache'")
+            )
+        ).first() is not None
+
+        print(
+            f"{'table':<34} {'rows':>12} {'table':>10} {'indexes':>10} {'cached':>10}"
+        )
+        for table in _TABLES:
+            row = (
+                await c.execute(
+                    text("""
+                        SELECT
+                            sum(greatest(c.reltuples, 0))::bigint AS row_count,
+                            sum(pg_table_size(c.oid)) AS table_size,
+                            sum(pg_indexes_size(c.oid)) AS index_size
+                        FROM pg_partition_tree(CAST(:table AS regclass)) t
+                        JOIN pg_class c ON c.oid = t.relid
+                    """),
+                    {"table": table},
+                )
+            ).one()
+            cached_size = None
+            if has_buffercache:
+                cached_size = (
+                    await c.execute(
+                        text("""
+                            SELECT count(*) * current_setting('block_size')::bigint
+                            FROM pg_buffercache b
+                            JOIN pg_class c ON b.relfilenode = pg_relation_filenode(c.oid)
+                            WHERE c.oid IN (
+                                SELECT relid
+                                FROM pg_partition_tree(CAST(:table AS regclass))
+                                UNION
+                                SELECT i.indexrelid
+                                FROM pg_partition_tree(CAST(:table AS regclass)) t
+                                JOIN pg_index i ON i.indrelid = t.relid
+                            )
+                        """),
+                        {"table": table},
+                    )
+                ).scalar_one()
+            print(
+                f"{table:<34} {row.row_count:>12} "
+                f"{_format_size(row.table_size):>10} "
+                f"{_format_size(row.index_size):>10} "
+                f"{_format_size(cached_size) if cached_size is not None else '-':>10}"
+            )
+
+
+def _format_size(size: int, /) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size //= 1024
+    return f"{size:.0f}TiB"
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,192 @@
+"""
+Compares the closure table of files with and without hash partitioning by
+ancestor_id: the time to vacuum it after 1% of its rows are deleted and the latency
+of looking up a file's descendants, which filters by ancestor_id, and a file's
+ancestors, which filters by descendant_id. The plans of both lookups are printed
+too, so the partitions they scan can be read off.
+
+Builds both layouts from scratch in a yama_benchmark schema of the database
+configured by the yama__database__* environment variables and drops it afterwards.
+Filling 50M rows takes a while and needs several GiB of disk:
+
+    python benchmarks/file_closure_partitioning.py --row-count 50000000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from uuid import UUID
+
+from sqlalchemy import TextClause, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from yama import database
+
+_SCHEMA = "yama_benchmark"
+_TABLE = f"{_SCHEMA}.file_ancestors_file_descendants"
+
+
+async def _create_table(
+    *, partition_count: int | None, row_count: int, fanout: int, c: AsyncConnection
+) -> None:
+    partition_by = " PARTITION BY HASH (ancestor_id)" if partition_count else ""
+    _ = await c.execute(
+        text(f"""
+            CREATE TABLE {_TABLE} (
+                ancestor_id uuid NOT NULL,
+                descendant_id uuid NOT NULL,
+                descendant_path varchar NOT NULL,
+                descendant_depth integer NOT NULL
+            ){partition_by}
+        """)
+    )
+    for i in range(partition_count or 0):
+        _ = await c.execute(
+            text(f"""
+                CREATE TABLE {_TABLE}_p{i} PARTITION OF {_TABLE}
+                    FOR VALUES WITH (MODULUS {partition_count}, REMAINDER {i})
+            """)
+        )
+
+    # Every ancestor gets fanout descendants. IDs are derived from numbers, so
+    # lookups can pick existing ancestors without reading them back.
+    _ = await c.execute(
+        text(f"""
+            INSERT INTO {_TABLE}
+                (ancestor_id, descendant_id, descendant_path, descendant_depth)
+            SELECT
+                md5((i / :fanout)::text)::uuid,
+                md5(i::text)::uuid,
+                'd' || (i % :fanout),
+                1 + i % 4
+            FROM generate_series(0, :row_count - 1) AS i
+        """),
+        {"fanout": fanout, "row_count": row_count},
+    )
+    for statement in [
+        f"ALTER TABLE {_TABLE} ADD PRIMARY KEY (ancestor_id, descendant_id)",
+        f"CREATE INDEX ON {_TABLE} (descendant_id, descendant_depth)",
+        f"ANALYZE {_TABLE}",
+    ]:
+        _ = await c.execute(text(statement))
+
+
+async def _measure_vacuum_seconds(*, c: AsyncConnection) -> float:
+    _ = await c.execute(text(f"DELETE FROM {_TABLE} WHERE random() < 0.01"))
+    started_at = time.perf_counter()
+    _ = await c.execute(text(f"VACUUM {_TABLE}"))
+    return time.perf_counter() - started_at
+
+
+_DESCENDANTS_QUERY = text(f"SELECT descendant_id FROM {_TABLE} WHERE ancestor_id = :id")
+_ANCESTORS_QUERY = text(f"SELECT ancestor_id FROM {_TABLE} WHERE descendant_id = :id")
+
+
+async def _measure_lookup_seconds(
+    query: TextClause, /, *, lookup_count: int, id_count: int, c: AsyncConnection
+) -> list[float]:
+    latencies = []
+    for _ in range(lookup_count):
+        id_ = await _make_id(random.randrange(id_count), c=c)
+        started_at = time.perf_counter()
+        _ = (await c.execute(query, {"id": id_})).all()
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+async def _explain(query: TextClause, /, *, c: AsyncConnection) -> str:
+    # A generic plan is what prebuilt statements get once they are prepared, so the
+    # partitions are pruned at execution time and show up as "Subplans Removed".
+    _ = await c.execute(text("SET plan_cache_mode = force_generic_plan"))
+    _ = await c.execute(text(f"PREPARE lookup AS {query.text.replace(':id', '$1')}"))
+    try:
+        # Utility statements take no bind parameters, the ID is a UUID literal.
+        id_ = await _make_id(0, c=c)
+        rows = (
+            await c.execute(
+                text(
+                    f"EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) EXECUTE lookup('{id_}')"
+                )
+            )
+        ).all()
+    finally:
+        _ = await c.execute(text("DEALLOCATE lookup"))
+        _ = await c.execute(text("RESET plan_cache_mode"))
+    return "\n".join(row[0] for row in rows)
+
+
+async def _make_id(i: int, /, *, c: AsyncConnection) -> UUID:
+    id_: UUID = (
+        await c.execute(text("SELECT md5(CAST(:i AS text))::uuid"), {"i": str(i)})
+    ).scalar_one()
+    return id_
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--row-count", type=int, default=50_000_000)
+    _ = parser.add_argument("--fanout", type=int, default=32)
+    _ = parser.add_argument("--partition-count", type=int, default=16)
+    _ = parser.add_argument("--lookup-count", type=int, default=1000)
+    args = parser.parse_args()
+
+    config = database.Config()  # pyright: ignore[reportCallIssue]
+    async with database.make_connection(
+        host=config.host,
+        port=config.port,
+        username=config.username,
+        password=config.password,
+        database=config.database,
+    ) as c:
+        # VACUUM can't run inside a transaction.
+        c = await c.execution_options(isolation_level="AUTOCOMMIT")
+        for partition_count in [None, args.partition_count]:
+            _ = await c.execute(text(f"DROP SCHEMA IF EXISTS {_SCHEMA} CASCADE"))
+            _ = await c.execute(text(f"CREATE SCHEMA {_SCHEMA}"))
+            try:
+                await _create_table(
+                    partition_count=partition_count,
+                    row_count=args.row_count,
+                    fanout=args.fanout,
+                    c=c,
+                )
+                vacuum_seconds = await _measure_vacuum_seconds(c=c)
+                lookups = [
+                    (
+                        name,
+                        await _measure_lookup_seconds(
+                            query,
+                            lookup_count=args.lookup_count,
+                            id_count=id_count,
+                            c=c,
+                        ),
+                        await _explain(query, c=c),
+                    )
+                    for name, query, id_count in [
+                        (
+                            "descendants",
+                            _DESCENDANTS_QUERY,
+                            args.row_count // args.fanout,
+                        ),
+                        ("ancestors", _ANCESTORS_QUERY, args.row_count),
+                    ]
+                ]
+            finally:
+                _ = await c.execute(text(f"DROP SCHEMA {_SCHEMA} CASCADE"))
+
+            layout = f"{partition_count} partitions" if partition_count else "plain"
+            print(f"{layout:<14} vacuum {vacuum_seconds:8.2f}s")
+            for name, latencies, plan in lookups:
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(
+                    f"{'':<14} {name:<11} lookup "
+                    f"p50 {quantiles[49] * 1000:6.3f}ms "
+                    f"p99 {quantiles[98] * 1000:6.3f}ms"
+                )
+                print(plan)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,92 @@
+"""
+Measures the throughput of FileSystemDriver.write_regular_content with every
+durability mode.
+
+Run it on the disk that stores the files since the cost of syncing depends on it:
+
+    python benchmarks/file_durability.py --dir /var/lib/yama/bench
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import get_args
+from uuid import uuid4
+
+from yama.file import Durability, FileSystemDriver, Syncer
+from yama.file._stream import BytesReader
+
+
+async def _bench(
+    durability: Durability,
+    /,
+    *,
+    file_system_dir: Path,
+    file_count: int,
+    file_size: int,
+    concurrency: int,
+) -> float:
+    """
+    Returns the number of files written per second.
+    """
+    content = b"x" * file_size
+    semaphore = asyncio.Semaphore(concurrency)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        driver = FileSystemDriver(
+            file_system_dir=file_system_dir,
+            executor=executor,
+            syncer=Syncer(durability, executor=executor),
+        )
+        await driver.startup()
+
+        async def write() -> None:
+            async with semaphore:
+                _ = await driver.write_regular_content(
+                    BytesReader(content),
+                    uuid4(),
+                    chunk_size=1024 * 1024,
+                    max_file_size=file_size,
+                )
+
+        started_at = time.perf_counter()
+        _ = await asyncio.gather(*(write() for _ in range(file_count)))
+        elapsed = time.perf_counter() - started_at
+
+        await driver.shutdown()
+
+    return file_count / elapsed
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--dir", type=Path, default=None)
+    _ = parser.add_argument("--file-count", type=int, default=1000)
+    _ = parser.add_argument("--file-size", type=int, default=64 * 1024)
+    _ = parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'durability':<20} {'files/s':>10} {'MiB/s':>10}")
+    for durability in get_args(Durability):
+        base_dir = Path(tempfile.mkdtemp(dir=args.dir))
+        try:
+            files_per_second = await _bench(
+                durability,
+                file_system_dir=base_dir / "file-system",
+                file_count=args.file_count,
+                file_size=args.file_size,
+                concurrency=args.concurrency,
+            )
+        finally:
+            shutil.rmtree(base_dir)
+
+        mib_per_second = files_per_second * args.file_size / 1024 / 1024
+        print(f"{durability:<20} {files_per_second:>10.1f} {mib_per_second:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
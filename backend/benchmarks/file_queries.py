@@ -0,0 +1,78 @@
+"""
+Measures the Python overhead the file service's hot queries add to each request,
+without a database.
+
+Before SQLAlchemy can reuse a compiled statement from the engine's cache it has to
+build the statement and compute its cache key. Statements built per call pay for
+both every time. Prebuilt ones pay for neither since their cache key is memoized.
+Compiling is shown for reference, it's what a cache miss costs:
+
+    python benchmarks/file_queries.py --iteration-count 2000
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import Select
+from sqlalchemy.dialects import postgresql
+
+from yama.file import _service
+
+_QUERIES: list[tuple[str, Callable[[], Select[Any]], Select[Any]]] = [
+    (
+        "_add_file",
+        lambda: _service._make_add_file_query(with_id=False),
+        _service._ADD_FILE_QUERY,
+    ),
+    (
+        "_get_file",
+        lambda: _service._make_get_file_query(deep=True, depth_limited=True),
+        _service._GET_DEEP_FILE_QUERY,
+    ),
+    ("_move_file", _service._make_move_file_query, _service._MOVE_FILE_QUERY),
+    ("_remove_file", _service._make_remove_file_query, _service._REMOVE_FILE_QUERY),
+    (
+        "_check_share_for_file_and_user",
+        _service._make_check_share_for_file_and_user_query,
+        _service._CHECK_SHARE_FOR_FILE_AND_USER_QUERY,
+    ),
+]
+
+
+def _measure_us(f: Callable[[], object], /, *, iteration_count: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iteration_count):
+        _ = f()
+    return (time.perf_counter() - started_at) / iteration_count * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--iteration-count", type=int, default=2000)
+    args = parser.parse_args()
+
+    dialect = postgresql.asyncpg.dialect()  # type: ignore[no-untyped-call]
+
+    print(f"{'query':<32} {'per call':>10} {'prebuilt':>10} {'compile':>10}")
+    for name, make_query, query in _QUERIES:
+        per_call_us = _measure_us(
+            lambda: make_query()._generate_cache_key(),
+            iteration_count=args.iteration_count,
+        )
+        prebuilt_us = _measure_us(
+            lambda: query._generate_cache_key(),
+            iteration_count=args.iteration_count,
+        )
+        compile_us = _measure_us(
+            lambda: query.compile(dialect=dialect),
+            iteration_count=args.iteration_count // 10,
+        )
+        print(
+            f"{name:<32} {per_call_us:8.1f}us {prebuilt_us:8.1f}us {compile_us:8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the latency of read queries run in SQLAlchemy's implicit transaction
+against the same queries run on read-only autocommit connections, which skip the
+BEGIN and ROLLBACK round trips.
+
+Connects to the database configured by the yama__database__* environment variables:
+
+    python benchmarks/read_only_connections.py --request-count 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+from functools import partial
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from yama import database
+
+# Mirrors a typical read handler: a lookup followed by a dependent lookup.
+_QUERIES = [text("SELECT 1"), text("SELECT 2")]
+
+
+async def _measure(
+    connect: Callable[[], AbstractAsyncContextManager[AsyncConnection]],
+    /,
+    *,
+    request_count: int,
+) -> list[float]:
+    latencies = []
+    for _ in range(request_count):
+        started_at = time.perf_counter()
+        async with connect() as connection:
+            for query in _QUERIES:
+                _ = (await connection.execute(query)).scalar_one()
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+def _report(name: str, latencies: list[float], /) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<22} "
+        f"mean {statistics.mean(latencies) * 1000:7.3f}ms "
+        f"p50 {quantiles[49] * 1000:7.3f}ms "
+        f"p99 {quantiles[98] * 1000:7.3f}ms"
+    )
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--request-count", type=int, default=2000)
+    args = parser.parse_args()
+
+    config = database.Config()  # pyright: ignore[reportCallIssue]
+    async with database.make_engine(
+        host=config.host,
+        port=config.port,
+        username=config.username,
+        password=config.password,
+        database=config.database,
+    ) as engine:
+        # Warms up the pool so both runs reuse the same connection.
+        _ = await _measure(engine.connect, request_count=10)
+
+        _report(
+            "implicit transaction",
+            await _measure(engine.connect, request_count=args.request_count),
+        )
+        _report(
+            "read-only autocommit",
+            await _measure(
+                partial(database.connect_read_only, engine),
+                request_count=args.request_count,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
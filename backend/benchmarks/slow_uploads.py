@@ -0,0 +1,107 @@
+"""
+Uploads files slowly over many concurrent requests against a running API and
+reports the database pool's occupancy from GET /metrics while they are in flight.
+
+Writes don't hold a connection while their content is streamed, so the number of
+checked out connections should stay near zero however many uploads are in flight:
+
+    python benchmarks/slow_uploads.py --base-url http://localhost:8000 \\
+        --username root --password root --upload-count 64
+"""
+
+import argparse
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from uuid import uuid4
+
+import aiohttp
+
+
+async def _slow_content(
+    *, chunk_count: int, chunk_size: int, delay_seconds: float
+) -> AsyncIterator[bytes]:
+    for _ in range(chunk_count):
+        await asyncio.sleep(delay_seconds)
+        yield b"x" * chunk_size
+
+
+async def _upload(
+    session: aiohttp.ClientSession,
+    /,
+    *,
+    dir_name: str,
+    chunk_count: int,
+    chunk_size: int,
+    delay_seconds: float,
+) -> None:
+    async with session.put(
+        f"/files/{dir_name}/{uuid4().hex}.txt",
+        data=_slow_content(
+            chunk_count=chunk_count, chunk_size=chunk_size, delay_seconds=delay_seconds
+        ),
+        headers={"content-type": "application/octet-stream"},
+    ) as response:
+        response.raise_for_status()
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--base-url", default="http://localhost:8000")
+    _ = parser.add_argument("--username", required=True)
+    _ = parser.add_argument("--password", required=True)
+    _ = parser.add_argument("--upload-count", type=int, default=64)
+    _ = parser.add_argument("--chunk-count", type=int, default=20)
+    _ = parser.add_argument("--chunk-size", type=int, default=1024)
+    _ = parser.add_argument("--delay-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    async with aiohttp.ClientSession(args.base_url) as session:
+        async with session.post(
+            "/auth",
+            data={
+                "grant_type": "password",
+                "username": args.username,
+                "password": args.password,
+            },
+        ) as response:
+            response.raise_for_status()
+            access_token = (await response.json())["access_token"]
+        session.headers["authorization"] = f"Bearer {access_token}"
+
+        dir_name = f"slow-uploads-{uuid4().hex}"
+        async with session.put(f"/files/{dir_name}", data={"type": "directory"}) as r:
+            r.raise_for_status()
+
+        uploads = asyncio.gather(
+            *(
+                _upload(
+                    session,
+                    dir_name=dir_name,
+                    chunk_count=args.chunk_count,
+                    chunk_size=args.chunk_size,
+                    delay_seconds=args.delay_seconds,
+                )
+                for _ in range(args.upload_count)
+            )
+        )
+
+        started_at = time.perf_counter()
+        max_checked_out = 0
+        while not uploads.done():
+            async with session.get("/metrics") as response:
+                pool = (await response.json())["database_pool"]
+            max_checked_out = max(max_checked_out, pool["checked_out"])
+            print(
+                f"{time.perf_counter() - started_at:6.1f}s "
+                f"checked out {pool['checked_out']:3} "
+                f"of {pool['size']} (+{pool['overflow']} overflow)"
+            )
+            await asyncio.sleep(0.5)
+        await uploads
+
+    print(f"{args.upload_count} uploads, at most {max_checked_out} checked out")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,14 +1,22 @@
 import asyncio
+from collections.abc import AsyncIterator
+from pathlib import Path
 
+import aiofiles
+import typer
 import uvicorn
 from typer import Typer
 
-from yama import api, database
+from yama import api, database, user
 from yama.database import provision
 
 app = Typer()
 database_app = Typer()
 app.add_typer(database_app, name="database")
+users_app = Typer()
+app.add_typer(users_app, name="users")
+
+_USERS_IMPORT_CHUNK_SIZE = 64 * 1024
 
 
 @app.command(name="api")
@@ -66,6 +74,87 @@ def handle_database_down() -> None:
     asyncio.run(f())
 
 
+@database_app.command(name="partition-file-closure")
+def handle_database_partition_file_closure(*, partition_count: int = 16) -> None:
+    async def f() -> None:
+        database_config = database.Config()  # pyright: ignore[reportCallIssue]
+        database_provision_config = provision.Config()  # pyright: ignore[reportCallIssue]
+
+        async with database.make_connection(
+            host=database_config.host,
+            port=database_config.port,
+            username=database_provision_config.username,
+            password=database_provision_config.password,
+            database=database_config.database,
+        ) as conn:
+            await provision.partition_file_closure(
+                partition_count=partition_count, connection=conn
+            )
+
+    asyncio.run(f())
+
+
+@database_app.command(name="unpartition-file-closure")
+def handle_database_unpartition_file_closure() -> None:
+    async def f() -> None:
+        database_config = database.Config()  # pyright: ignore[reportCallIssue]
+        database_provision_config = provision.Config()  # pyright: ignore[reportCallIssue]
+
+        async with database.make_connection(
+            host=database_config.host,
+            port=database_config.port,
+            username=database_provision_config.username,
+            password=database_provision_config.password,
+            database=database_config.database,
+        ) as conn:
+            await provision.unpartition_file_closure(connection=conn)
+
+    asyncio.run(f())
+
+
+@users_app.command(name="import")
+def handle_users_import(*, path: Path, format: user.UserImportFormat = "csv") -> None:
+    """
+    Imports users from a CSV file with a header or an NDJSON file, one record per
+    line with a handle and optionally a password and a type, and prints the records
+    that weren't imported.
+    """
+
+    async def read_chunks() -> AsyncIterator[bytes]:
+        async with aiofiles.open(path, "rb") as f:
+            while chunk := await f.read(_USERS_IMPORT_CHUNK_SIZE):
+                yield chunk
+
+    async def f() -> user.UserImportReport:
+        database_config = database.Config()  # pyright: ignore[reportCallIssue]
+        user_config = user.Config()  # pyright: ignore[reportCallIssue]
+
+        with user.make_import_executor(config=user_config) as executor:
+            async with database.make_connection(
+                host=database_config.host,
+                port=database_config.port,
+                username=database_config.username,
+                password=database_config.password,
+                database=database_config.database,
+            ) as conn:
+                return await user.import_users(
+                    read_chunks(),
+                    format=format,
+                    batch_size=user_config.import_batch_size,
+                    executor=executor,
+                    connection=conn,
+                )
+
+    report = asyncio.run(f())
+
+    for conflict in report.conflicts:
+        typer.echo(f"{conflict.line}\t{conflict.reason}\t{conflict.handle or ''}")
+    typer.echo(
+        f"Imported {report.imported_count} users, {len(report.conflicts)} conflicts.",
+        err=True,
+    )
+
+
 @app.command(name="function")
 def handle_function(*, command: list[str]) -> None: ...
 
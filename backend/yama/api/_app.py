@@ -17,26 +17,63 @@ async def _lifespan(_app: FastAPI) -> AsyncIterator[dict[str, Any]]:
     user_config = user.Config()  # pyright: ignore[reportCallIssue]
     auth_config = auth.Config()  # pyright: ignore[reportCallIssue]
 
-    async with database.make_engine(
-        host=database_config.host,
-        port=database_config.port,
-        username=database_config.username,
-        password=database_config.password,
-        database=database_config.database,
-    ) as engine:
-        # These must not be accessed directly, they must
-        # be accessed through lifetime dependencies.
-        yield {
-            "engine": engine,
-            "file_config": file_config,
-            "function_config": function_config,
-            "user_config": user_config,
-            "auth_config": auth_config,
-        }
+    with (
+        file.make_executor(config=file_config) as file_executor,
+        user.make_import_executor(config=user_config) as user_import_executor,
+    ):
+        file_content_cache = file.make_content_cache(config=file_config)
+
+        async with (
+            database.make_engine(
+                host=database_config.host,
+                port=database_config.port,
+                username=database_config.username,
+                password=database_config.password,
+                database=database_config.database,
+                pool_size=database_config.pool_size,
+                pool_max_overflow=database_config.pool_max_overflow,
+                pool_timeout_seconds=database_config.pool_timeout_seconds,
+                pool_recycle_seconds=database_config.pool_recycle_seconds,
+                prepared_statement_cache_size=database_config.prepared_statement_cache_size,
+                pgbouncer=database_config.pgbouncer,
+            ) as engine,
+            database.make_replica_engines(config=database_config) as replica_engines,
+            file.make_tiered_cache(
+                config=file_config, executor=file_executor
+            ) as file_tiered_cache,
+            file.make_driver(
+                config=file_config,
+                executor=file_executor,
+                content_cache=file_content_cache,
+                tiered_cache=file_tiered_cache,
+            ) as file_driver,
+        ):
+            for e in [engine, *replica_engines]:
+                await database.prewarm_engine(
+                    e, count=database_config.pool_prewarm_count
+                )
+
+            # These must not be accessed directly, they must
+            # be accessed through lifetime dependencies.
+            yield {
+                "database_config": database_config,
+                "engine": engine,
+                "replica_engines": replica_engines,
+                "file_config": file_config,
+                "file_content_cache": file_content_cache,
+                "file_tiered_cache": file_tiered_cache,
+                "file_driver": file_driver,
+                "function_config": function_config,
+                "user_config": user_config,
+                "user_import_executor": user_import_executor,
+                "auth_config": auth_config,
+            }
 
 
 app = FastAPI(lifespan=_lifespan)
 
+app.middleware("http")(database.pin_to_primary_after_writes)
+
 app.include_router(router)
 app.include_router(auth.router)
 app.include_router(file.router)
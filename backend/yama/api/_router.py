@@ -1,7 +1,11 @@
-from typing import Literal
+from typing import Annotated, Literal
+from uuid import UUID
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from yama import auth, database, file, user
 
 router = APIRouter()
 
@@ -10,6 +14,86 @@ class HealthOut(BaseModel):
     status: Literal["ok"]
 
 
+class ContentCacheMetricsOut(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+    entry_count: int
+    size: int
+
+
+class DatabasePoolMetricsOut(BaseModel):
+    size: int
+    checked_out: int
+    overflow: int
+    wait_count: int | None
+    wait_seconds_total: float | None
+    wait_seconds_max: float | None
+
+
+class MetricsOut(BaseModel):
+    database_pool: DatabasePoolMetricsOut
+    file_content_cache: ContentCacheMetricsOut | None
+    file_tiered_cache: ContentCacheMetricsOut | None
+
+
 @router.get("/health")
 async def get_health() -> HealthOut:
     return HealthOut(status="ok")
+
+
+@router.get(
+    "/metrics",
+    description="Read database pool and file cache metrics. Only the root user can read metrics.",
+)
+async def get_metrics(
+    *,
+    current_user_id: Annotated[UUID, Depends(auth.get_current_user_id)],
+    user_config: Annotated[user.Config, Depends(user.get_config)],
+    file_content_cache: Annotated[
+        file.ContentCache | None, Depends(file.get_content_cache)
+    ],
+    file_tiered_cache: Annotated[
+        file.TieredCache | None, Depends(file.get_tiered_cache)
+    ],
+    engine: Annotated[AsyncEngine, Depends(database.get_engine)],
+) -> MetricsOut:
+    if current_user_id != user_config.root_user_id:
+        raise HTTPException(400, "Permission denied.")
+
+    pool = engine.sync_engine.pool
+    pool_wait_stats = database.get_pool_wait_stats(engine)
+    return MetricsOut(
+        database_pool=DatabasePoolMetricsOut(
+            size=pool.size(),  # type: ignore[attr-defined]
+            checked_out=pool.checkedout(),  # type: ignore[attr-defined]
+            overflow=pool.overflow(),  # type: ignore[attr-defined]
+            wait_count=pool_wait_stats.count if pool_wait_stats else None,
+            wait_seconds_total=(
+                pool_wait_stats.total_seconds if pool_wait_stats else None
+            ),
+            wait_seconds_max=pool_wait_stats.max_seconds if pool_wait_stats else None,
+        ),
+        file_content_cache=(
+            _content_cache_stats_to_metrics_out(file_content_cache.stats())
+            if file_content_cache is not None
+            else None
+        ),
+        file_tiered_cache=(
+            _content_cache_stats_to_metrics_out(file_tiered_cache.stats())
+            if file_tiered_cache is not None
+            else None
+        ),
+    )
+
+
+def _content_cache_stats_to_metrics_out(
+    stats: file.ContentCacheStats, /
+) -> ContentCacheMetricsOut:
+    return ContentCacheMetricsOut(
+        hits=stats.hits,
+        misses=stats.misses,
+        hit_ratio=stats.hit_ratio,
+        entry_count=stats.entry_count,
+        size=stats.size,
+    )
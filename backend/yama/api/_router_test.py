@@ -0,0 +1,46 @@
+from uuid import UUID
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from yama import auth, database, file, user
+
+from . import _router
+
+_ROOT_USER_ID = UUID(int=3)
+
+
+async def test_get_metrics() -> None:
+    """Tests that only the root user can read metrics."""
+    current_user_id = _ROOT_USER_ID
+    # The pool is only inspected, no connection is made.
+    engine = create_async_engine("postgresql+asyncpg://yama@localhost/yama")
+
+    app = FastAPI()
+    app.include_router(_router.router)
+    app.dependency_overrides[user.get_config] = lambda: user.Config(
+        public_user_id=UUID(int=2), root_user_id=_ROOT_USER_ID
+    )
+    app.dependency_overrides[auth.get_current_user_id] = lambda: current_user_id
+    app.dependency_overrides[database.get_engine] = lambda: engine
+    app.dependency_overrides[file.get_content_cache] = lambda: None
+    app.dependency_overrides[file.get_tiered_cache] = lambda: None
+
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            # Case about reading metrics as the root user.
+
+            response = await client.get("/metrics")
+            assert response.status_code == 200
+            assert response.json()["database_pool"]["checked_out"] == 0
+
+            # Case about reading metrics as another user.
+
+            current_user_id = UUID(int=4)
+            response = await client.get("/metrics")
+            assert response.status_code == 400
+    finally:
+        await engine.dispose()
@@ -2,11 +2,11 @@ from typing import Literal
 
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import func, select, update
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncConnection
 from starlette.status import HTTP_401_UNAUTHORIZED
 
-from yama.user.database import UserDb
+from yama.user.database import UserDb, lower_handle
 from yama.user.password import (
     hash_password,
     is_password_valid,
@@ -43,7 +43,7 @@ async def _password_grant_in_to_token_out(
     connection: AsyncConnection,
 ) -> _TokenOut:
     query = select(UserDb).where(
-        func.lower(UserDb.handle) == func.lower(password_grant_in.username)
+        lower_handle(UserDb.handle) == lower_handle(password_grant_in.username)
     )
     row = (await connection.execute(query)).mappings().one_or_none()
     user_db = UserDb(**row) if row is not None else None
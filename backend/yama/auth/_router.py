@@ -2,7 +2,6 @@ from typing import Annotated, Literal, TypeAlias, assert_never
 
 from fastapi import APIRouter, Depends, Form, HTTPException
 from pydantic import TypeAdapter, ValidationError
-from sqlalchemy.ext.asyncio import AsyncConnection
 
 from yama import database
 
@@ -55,8 +54,11 @@ async def _authorize(
     *,
     grant_in: Annotated[_GrantIn, Depends(_get_grant_in)],
     config: Annotated[Config, Depends(get_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
 ) -> _TokenOut:
+    connection = await lazy_connection.get()
     match grant_in:
         case _PasswordGrantIn():
             try:
@@ -81,8 +83,11 @@ async def _unauthorize(
     *,
     refresh_token: Annotated[str, Form()],
     config: Annotated[Config, Depends(get_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
 ) -> None:
+    connection = await lazy_connection.get()
     try:
         t = await _parse_refresh_token(
             refresh_token, config=config, connection=connection
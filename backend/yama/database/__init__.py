@@ -1,5 +1,23 @@
 from ._config import Config as Config
+from ._config import ReplicaConfig as ReplicaConfig
+from ._config import get_config as get_config
 from ._database import BaseTable as BaseTable
+from ._database import LazyConnection as LazyConnection
+from ._database import PoolWaitStats as PoolWaitStats
+from ._database import connect_read_only as connect_read_only
 from ._database import get_connection as get_connection
+from ._database import get_engine as get_engine
+from ._database import get_lazy_connection as get_lazy_connection
+from ._database import get_pool_wait_stats as get_pool_wait_stats
+from ._database import get_read_engine as get_read_engine
+from ._database import (
+    get_read_only_lazy_connection as get_read_only_lazy_connection,
+)
+from ._database import get_replica_engines as get_replica_engines
 from ._database import make_connection as make_connection
 from ._database import make_engine as make_engine
+from ._database import make_replica_engines as make_replica_engines
+from ._database import (
+    pin_to_primary_after_writes as pin_to_primary_after_writes,
+)
+from ._database import prewarm_engine as prewarm_engine
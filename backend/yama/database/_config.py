@@ -1,4 +1,10 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from starlette.requests import Request
+
+
+class ReplicaConfig(BaseSettings):
+    host: str
+    port: int
 
 
 class Config(BaseSettings):
@@ -11,3 +17,27 @@ class Config(BaseSettings):
     database: str
     username: str
     password: str
+
+    pool_size: int = 5
+    pool_max_overflow: int = 10
+    pool_timeout_seconds: float = 30
+    # Connections older than this are reopened on checkout. None keeps them forever.
+    pool_recycle_seconds: int | None = None
+    # Connections opened at startup, at most pool_size of them stay open.
+    pool_prewarm_count: int = 0
+    # The number of prepared statements asyncpg keeps per connection.
+    prepared_statement_cache_size: int = 100
+    # Connects through PgBouncer in transaction pooling mode, where consecutive
+    # transactions may run on different server connections. Prepared statements are
+    # then neither cached nor reused across transactions.
+    pgbouncer: bool = False
+
+    # Replicas share the primary's database and credentials. Read-only routes are
+    # served by them unless the client has written recently.
+    replicas: list[ReplicaConfig] = []
+    read_your_writes_seconds: int = 5
+
+
+def get_config(*, request: Request) -> Config:
+    """A lifetime dependency."""
+    return request.state.database_config  # type: ignore[no-any-return]
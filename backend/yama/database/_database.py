@@ -1,30 +1,174 @@
-from contextlib import asynccontextmanager
-from typing import Annotated, AsyncIterator
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import Annotated, Any, AsyncIterator
+from uuid import uuid4
 
 from fastapi import Depends
 from sqlalchemy import URL
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
 from starlette.requests import Request
+from starlette.responses import Response
+
+from ._config import Config
+
+# Set on responses to writes while replicas are configured. Its presence pins the
+# client's reads to the primary until it expires.
+_PRIMARY_COOKIE_NAME = "yama_database_primary"
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
 
 
 class BaseTable(DeclarativeBase): ...
 
 
+@dataclass
+class PoolWaitStats:
+    count: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+
+    def record(self, seconds: float, /) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class _MeasuredPool(AsyncAdaptedQueuePool):
+    """
+    Measures how long checkouts wait for a connection, including the time it takes
+    to open a new one.
+    """
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)  # type: ignore[arg-type]
+        self.wait_stats = PoolWaitStats()
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.monotonic()
+        try:
+            return super().connect()
+        finally:
+            self.wait_stats.record(time.monotonic() - start)
+
+
+class LazyConnection:
+    """
+    Checks out a connection from the engine's pool on first use and keeps it until
+    closed. Requests that fail or finish before touching the database never wait for
+    the pool.
+    """
+
+    def __init__(self, engine: AsyncEngine, /, *, read_only: bool = False) -> None:
+        self.engine = engine
+        self.read_only = read_only
+        self._connection: AsyncConnection | None = None
+        self._exit_stack = AsyncExitStack()
+
+    @property
+    def is_checked_out(self) -> bool:
+        return self._connection is not None
+
+    async def get(self) -> AsyncConnection:
+        if self._connection is None:
+            self._connection = await self._exit_stack.enter_async_context(
+                connect_read_only(self.engine)
+                if self.read_only
+                else self.engine.connect()
+            )
+        return self._connection
+
+    async def close(self) -> None:
+        self._connection = None
+        await self._exit_stack.aclose()
+
+
 @asynccontextmanager
 async def make_engine(
-    *, host: str, port: int, username: str, password: str, database: str
+    *,
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+    database: str,
+    pool_size: int = 5,
+    pool_max_overflow: int = 10,
+    pool_timeout_seconds: float = 30,
+    pool_recycle_seconds: int | None = None,
+    prepared_statement_cache_size: int = 100,
+    pgbouncer: bool = False,
 ) -> AsyncIterator[AsyncEngine]:
     url = _make_connection_url(
         host=host, port=port, username=username, password=password, database=database
     )
-    engine = create_async_engine(url)
+    connect_args: dict[str, Any] = {
+        "prepared_statement_cache_size": prepared_statement_cache_size
+    }
+    if pgbouncer:
+        # PgBouncer may run each transaction on a different server connection, so a
+        # statement prepared by one transaction can't be reused by the next. asyncpg
+        # still prepares every statement and its default per-connection names
+        # collide on shared server connections, hence the unique names.
+        connect_args = {
+            "prepared_statement_cache_size": 0,
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": _make_prepared_statement_name,
+        }
+    engine = create_async_engine(
+        url,
+        poolclass=_MeasuredPool,
+        pool_size=pool_size,
+        max_overflow=pool_max_overflow,
+        pool_timeout=pool_timeout_seconds,
+        pool_recycle=pool_recycle_seconds if pool_recycle_seconds is not None else -1,
+        connect_args=connect_args,
+    )
     try:
         yield engine
     finally:
         await engine.dispose()
 
 
+@asynccontextmanager
+async def make_replica_engines(*, config: Config) -> AsyncIterator[list[AsyncEngine]]:
+    async with AsyncExitStack() as stack:
+        yield [
+            await stack.enter_async_context(
+                make_engine(
+                    host=r.host,
+                    port=r.port,
+                    username=config.username,
+                    password=config.password,
+                    database=config.database,
+                    pool_size=config.pool_size,
+                    pool_max_overflow=config.pool_max_overflow,
+                    pool_timeout_seconds=config.pool_timeout_seconds,
+                    pool_recycle_seconds=config.pool_recycle_seconds,
+                    prepared_statement_cache_size=config.prepared_statement_cache_size,
+                    pgbouncer=config.pgbouncer,
+                )
+            )
+            for r in config.replicas
+        ]
+
+
+async def prewarm_engine(engine: AsyncEngine, /, *, count: int) -> None:
+    """
+    Opens connections up front, so the first requests don't pay for the connection
+    setup. Connections beyond the pool's size would be closed right away and aren't
+    opened.
+    """
+    count = min(count, engine.sync_engine.pool.size())  # type: ignore[attr-defined]
+    async with AsyncExitStack() as stack:
+        _ = await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(count))
+        )
+
+
 @asynccontextmanager
 async def make_connection(
     *, host: str, port: int, username: str, password: str, database: str
@@ -36,6 +180,23 @@ async def make_connection(
             yield conn
 
 
+@asynccontextmanager
+async def connect_read_only(engine: AsyncEngine, /) -> AsyncIterator[AsyncConnection]:
+    """
+    Checks out a connection in autocommit mode, so statements don't pay for the BEGIN
+    and ROLLBACK of the implicit transaction. It must be used only for reads: nothing
+    can be rolled back and consecutive statements may see different snapshots. The
+    isolation level is reset when the connection is returned to the pool.
+    """
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        yield connection
+
+
+def _make_prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
 def _make_connection_url(
     *, host: str, port: int, username: str, password: str, database: str
 ) -> URL:
@@ -49,14 +210,86 @@ def _make_connection_url(
     )
 
 
-def _get_engine(*, request: Request) -> AsyncEngine:
+def get_engine(*, request: Request) -> AsyncEngine:
     """A lifetime dependency."""
     return request.state.engine  # type: ignore[no-any-return]
 
 
+def get_replica_engines(*, request: Request) -> list[AsyncEngine]:
+    """A lifetime dependency."""
+    return request.state.replica_engines  # type: ignore[no-any-return]
+
+
+def get_read_engine(
+    *,
+    request: Request,
+    engine: Annotated[AsyncEngine, Depends(get_engine)],
+    replica_engines: Annotated[list[AsyncEngine], Depends(get_replica_engines)],
+) -> AsyncEngine:
+    """
+    A dependency. Picks a replica to read from, or the primary if there are no
+    replicas or the client has written recently.
+    """
+    if not replica_engines or _PRIMARY_COOKIE_NAME in request.cookies:
+        return engine
+    return random.choice(replica_engines)
+
+
+async def pin_to_primary_after_writes(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """
+    An HTTP middleware. Pins a client that has successfully written to the primary
+    for a short while, so its reads don't miss its own writes on lagging replicas.
+    Clients that don't keep cookies get no such guarantee.
+    """
+    response = await call_next(request)
+    if (
+        request.method not in _SAFE_METHODS
+        and response.status_code < 400
+        and request.state.replica_engines
+    ):
+        config: Config = request.state.database_config
+        response.set_cookie(
+            _PRIMARY_COOKIE_NAME,
+            "1",
+            max_age=config.read_your_writes_seconds,
+            httponly=True,
+            samesite="strict",
+        )
+    return response
+
+
 async def get_connection(
-    *, engine: Annotated[AsyncEngine, Depends(_get_engine)]
+    *, engine: Annotated[AsyncEngine, Depends(get_engine)]
 ) -> AsyncIterator[AsyncConnection]:
     """A dependency."""
     async with engine.connect() as connection:
         yield connection
+
+
+async def get_lazy_connection(
+    *, engine: Annotated[AsyncEngine, Depends(get_engine)]
+) -> AsyncIterator[LazyConnection]:
+    """A dependency."""
+    connection = LazyConnection(engine)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+
+async def get_read_only_lazy_connection(
+    *, engine: Annotated[AsyncEngine, Depends(get_read_engine)]
+) -> AsyncIterator[LazyConnection]:
+    """A dependency."""
+    connection = LazyConnection(engine, read_only=True)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+
+def get_pool_wait_stats(engine: AsyncEngine, /) -> PoolWaitStats | None:
+    pool = engine.sync_engine.pool
+    return pool.wait_stats if isinstance(pool, _MeasuredPool) else None
@@ -0,0 +1,102 @@
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Annotated, Literal, cast
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ._config import Config, ReplicaConfig
+from ._database import (
+    LazyConnection,
+    get_engine,
+    get_read_engine,
+    get_replica_engines,
+    pin_to_primary_after_writes,
+)
+
+
+class _CountingEngine:
+    def __init__(self) -> None:
+        self.connect_count = 0
+        self.checked_out = 0
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncConnection]:
+        self.connect_count += 1
+        self.checked_out += 1
+        try:
+            yield cast(AsyncConnection, object())
+        finally:
+            self.checked_out -= 1
+
+
+async def test_lazy_connection() -> None:
+    """Tests that the LazyConnection checks out at most one connection on use."""
+    engine = _CountingEngine()
+
+    # Case about a connection that is never used.
+
+    connection = LazyConnection(cast(AsyncEngine, engine))
+    await connection.close()
+
+    assert engine.connect_count == 0
+
+    # Case about a connection that is used multiple times.
+
+    connection = LazyConnection(cast(AsyncEngine, engine))
+    assert not connection.is_checked_out
+    assert await connection.get() is await connection.get()
+    assert connection.is_checked_out
+    assert (engine.connect_count, engine.checked_out) == (1, 1)
+
+    await connection.close()
+
+    assert (engine.connect_count, engine.checked_out) == (1, 0)
+
+
+async def test_read_engine_routing() -> None:
+    """Tests that reads go to replicas unless the client has written recently."""
+    primary = cast(AsyncEngine, object())
+    replica = cast(AsyncEngine, object())
+
+    app = FastAPI()
+    app.middleware("http")(pin_to_primary_after_writes)
+    app.dependency_overrides[get_engine] = lambda: primary
+    app.dependency_overrides[get_replica_engines] = lambda: [replica]
+
+    @app.get("/read")
+    def read(
+        *, engine: Annotated[AsyncEngine, Depends(get_read_engine)]
+    ) -> Literal["primary", "replica"]:
+        return "primary" if engine is primary else "replica"
+
+    @app.post("/write")
+    def write() -> None: ...
+
+    @app.middleware("http")
+    async def add_state(
+        request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        request.state.replica_engines = [replica]
+        request.state.database_config = Config(
+            host="localhost",
+            port=5432,
+            database="yama",
+            username="yama",
+            password="yama",
+            replicas=[ReplicaConfig(host="replica", port=5432)],
+        )
+        return await call_next(request)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        assert (await client.get("/read")).json() == "replica"
+
+        response = await client.post("/write")
+        assert response.status_code == 200
+
+        assert (await client.get("/read")).json() == "primary"
@@ -1,4 +1,6 @@
 from ._config import Config as Config
+from ._partition import partition_file_closure as partition_file_closure
+from ._partition import unpartition_file_closure as unpartition_file_closure
 from ._provision import ProvisionError as ProvisionError
 from ._provision import setup_database as setup_database
 from ._provision import teardown_database as teardown_database
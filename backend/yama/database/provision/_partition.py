@@ -0,0 +1,132 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ._provision import ProvisionError
+
+# The closure table of files grows as files times depth. Hash partitioning it keeps
+# every partition's vacuum and index maintenance small.
+#
+# The partition key has to be ancestor_id: unique indexes of a partitioned table must
+# include the partition key, and the unique index of children's names is keyed by
+# the parent's ID, that is ancestor_id. Files have no other place that keeps sibling
+# names unique.
+#
+# Only lookups that filter by ancestor_id are pruned to a single partition, such as
+# resolving a path below a directory and reading a directory's content. Most
+# lookups in the file service filter by descendant_id instead, such as checking a
+# user's shares on a file's ancestors, and probe the descendant_id index of every
+# partition, so the partition count should stay small (see
+# benchmarks/file_closure_partitioning.py for plans and latencies of both).
+
+_TABLE = "file_ancestors_file_descendants"
+_OLD_TABLE = "file_ancestors_file_descendants_old"
+_COLUMNS = "ancestor_id, descendant_id, descendant_path, descendant_depth"
+
+
+async def partition_file_closure(
+    *, partition_count: int, connection: AsyncConnection
+) -> None:
+    """
+    Migrates the closure table of files to a hash-partitioned one. It's optional and
+    meant for deployments with millions of files. The table is locked while its rows
+    are copied.
+    """
+    if partition_count < 2:
+        raise ValueError("Partition count must be at least 2")
+
+    async with connection.begin():
+        if await _is_file_closure_partitioned(connection=connection):
+            raise ProvisionError("File closure is already partitioned")
+
+        await _execute(
+            f"ALTER TABLE {_TABLE} RENAME TO {_OLD_TABLE}",
+            "DROP INDEX fafd_parent_id_child_name_uidx",
+            "DROP INDEX fafd_descendant_id_descendant_depth_idx",
+            f"""
+            CREATE TABLE {_TABLE} (
+                ancestor_id uuid NOT NULL,
+                descendant_id uuid NOT NULL,
+                descendant_path varchar NOT NULL,
+                descendant_depth integer NOT NULL,
+                FOREIGN KEY (ancestor_id) REFERENCES files (id),
+                FOREIGN KEY (descendant_id) REFERENCES files (id)
+            ) PARTITION BY HASH (ancestor_id)
+            """,
+            *(
+                f"""
+                CREATE TABLE {_TABLE}_p{i} PARTITION OF {_TABLE}
+                    FOR VALUES WITH (MODULUS {partition_count}, REMAINDER {i})
+                """
+                for i in range(partition_count)
+            ),
+            # Indexes are built after the copy, it's faster than maintaining them.
+            f"INSERT INTO {_TABLE} ({_COLUMNS}) SELECT {_COLUMNS} FROM {_OLD_TABLE}",
+            f"DROP TABLE {_OLD_TABLE}",
+            f"ALTER TABLE {_TABLE} ADD PRIMARY KEY (ancestor_id, descendant_id)",
+            f"""
+            CREATE UNIQUE INDEX fafd_parent_id_child_name_uidx
+                ON {_TABLE} (ancestor_id, descendant_path)
+                WHERE descendant_depth = 1
+            """,
+            f"""
+            CREATE INDEX fafd_descendant_id_descendant_depth_idx
+                ON {_TABLE} (descendant_id, descendant_depth)
+            """,
+            f"ANALYZE {_TABLE}",
+            connection=connection,
+        )
+
+
+async def unpartition_file_closure(*, connection: AsyncConnection) -> None:
+    """
+    Reverts partition_file_closure.
+    """
+    async with connection.begin():
+        if not await _is_file_closure_partitioned(connection=connection):
+            raise ProvisionError("File closure isn't partitioned")
+
+        await _execute(
+            f"ALTER TABLE {_TABLE} RENAME TO {_OLD_TABLE}",
+            "DROP INDEX fafd_parent_id_child_name_uidx",
+            "DROP INDEX fafd_descendant_id_descendant_depth_idx",
+            f"""
+            CREATE TABLE {_TABLE} (
+                ancestor_id uuid NOT NULL,
+                descendant_id uuid NOT NULL,
+                descendant_path varchar NOT NULL,
+                descendant_depth integer NOT NULL,
+                FOREIGN KEY (ancestor_id) REFERENCES files (id),
+                FOREIGN KEY (descendant_id) REFERENCES files (id)
+            )
+            """,
+            f"INSERT INTO {_TABLE} ({_COLUMNS}) SELECT {_COLUMNS} FROM {_OLD_TABLE}",
+            f"DROP TABLE {_OLD_TABLE}",
+            f"ALTER TABLE {_TABLE} ADD PRIMARY KEY (ancestor_id, descendant_id)",
+            f"""
+            CREATE UNIQUE INDEX fafd_parent_id_child_name_uidx
+                ON {_TABLE} (ancestor_id, descendant_path)
+                WHERE descendant_depth = 1
+            """,
+            f"""
+            CREATE INDEX fafd_descendant_id_descendant_depth_idx
+                ON {_TABLE} (descendant_id, descendant_depth)
+            """,
+            f"ANALYZE {_TABLE}",
+            connection=connection,
+        )
+
+
+async def _is_file_closure_partitioned(*, connection: AsyncConnection) -> bool:
+    result = await connection.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table"
+            " WHERE partrelid = CAST(:table AS regclass)"
+        ),
+        {"table": _TABLE},
+    )
+    return result.first() is not None
+
+
+async def _execute(*statements: str, connection: AsyncConnection) -> None:
+    for statement in statements:
+        await connection.execute(text(statement))
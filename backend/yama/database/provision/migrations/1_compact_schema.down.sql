@@ -0,0 +1,48 @@
+BEGIN;
+
+ALTER TABLE file_shares
+    DROP CONSTRAINT file_shares_pkey,
+    ADD COLUMN id uuid NOT NULL DEFAULT uuid_generate_v4(),
+    ADD PRIMARY KEY (id);
+
+ALTER TABLE file_ancestors_file_descendants
+    DROP CONSTRAINT file_ancestors_file_descendants_pkey,
+    ADD COLUMN id uuid NOT NULL DEFAULT uuid_generate_v4(),
+    ADD PRIMARY KEY (id);
+
+ALTER TABLE user_ancestors_user_descendants
+    DROP CONSTRAINT user_ancestors_user_descendants_pkey,
+    ADD COLUMN id uuid NOT NULL DEFAULT uuid_generate_v4(),
+    ADD PRIMARY KEY (id);
+
+CREATE TABLE IF NOT EXISTS file_share_types (
+    type varchar NOT NULL,
+    PRIMARY KEY (type)
+);
+INSERT INTO file_share_types (type) VALUES ('read'), ('write'), ('share');
+ALTER TABLE file_shares
+    ALTER COLUMN type TYPE varchar USING type::text,
+    ADD FOREIGN KEY (type) REFERENCES file_share_types (type);
+DROP TYPE file_share_type;
+
+CREATE TABLE IF NOT EXISTS file_types (
+    type varchar NOT NULL,
+    PRIMARY KEY (type)
+);
+INSERT INTO file_types (type) VALUES ('regular'), ('directory');
+ALTER TABLE files
+    ALTER COLUMN type TYPE varchar USING type::text,
+    ADD FOREIGN KEY (type) REFERENCES file_types (type);
+DROP TYPE file_type;
+
+CREATE TABLE IF NOT EXISTS user_types (
+    type varchar NOT NULL,
+    PRIMARY KEY (type)
+);
+INSERT INTO user_types (type) VALUES ('regular'), ('group');
+ALTER TABLE users
+    ALTER COLUMN type TYPE varchar USING type::text,
+    ADD FOREIGN KEY (type) REFERENCES user_types (type);
+DROP TYPE user_type;
+
+COMMIT;
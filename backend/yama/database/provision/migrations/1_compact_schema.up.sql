@@ -0,0 +1,52 @@
+BEGIN;
+
+-- Types become enums: 4 bytes a row instead of a varchar and no foreign key checks.
+
+CREATE TYPE user_type AS ENUM ('regular', 'group');
+ALTER TABLE users
+    DROP CONSTRAINT users_type_fkey,
+    ALTER COLUMN type TYPE user_type USING type::user_type;
+DROP TABLE user_types;
+
+CREATE TYPE file_type AS ENUM ('regular', 'directory');
+ALTER TABLE files
+    DROP CONSTRAINT files_type_fkey,
+    ALTER COLUMN type TYPE file_type USING type::file_type;
+DROP TABLE file_types;
+
+CREATE TYPE file_share_type AS ENUM ('read', 'write', 'share');
+ALTER TABLE file_shares
+    DROP CONSTRAINT file_shares_type_fkey,
+    ALTER COLUMN type TYPE file_share_type USING type::file_share_type;
+DROP TABLE file_share_types;
+
+-- Surrogate IDs nothing reads give way to composite primary keys that also serve
+-- the lookups by their leading columns. Duplicate rows can't be keyed, so they go.
+
+DELETE FROM user_ancestors_user_descendants a
+    USING user_ancestors_user_descendants b
+    WHERE a.ancestor_id = b.ancestor_id
+        AND a.descendant_id = b.descendant_id
+        AND a.id > b.id;
+ALTER TABLE user_ancestors_user_descendants
+    DROP CONSTRAINT user_ancestors_user_descendants_pkey,
+    DROP COLUMN id,
+    ADD PRIMARY KEY (ancestor_id, descendant_id);
+
+ALTER TABLE file_ancestors_file_descendants
+    DROP CONSTRAINT file_ancestors_file_descendants_pkey,
+    DROP COLUMN id,
+    ADD PRIMARY KEY (ancestor_id, descendant_id);
+
+DELETE FROM file_shares a
+    USING file_shares b
+    WHERE a.file_id = b.file_id
+        AND a.user_id = b.user_id
+        AND a.type = b.type
+        AND a.id > b.id;
+ALTER TABLE file_shares
+    DROP CONSTRAINT file_shares_pkey,
+    DROP COLUMN id,
+    ADD PRIMARY KEY (file_id, user_id, type);
+
+COMMIT;
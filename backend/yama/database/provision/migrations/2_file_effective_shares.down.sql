@@ -0,0 +1,23 @@
+BEGIN;
+
+DROP TRIGGER IF EXISTS uaud_after_delete ON user_ancestors_user_descendants;
+DROP FUNCTION IF EXISTS uaud_after_delete();
+
+DROP TRIGGER IF EXISTS uaud_after_insert ON user_ancestors_user_descendants;
+DROP FUNCTION IF EXISTS uaud_after_insert();
+
+DROP TRIGGER IF EXISTS file_shares_after_delete ON file_shares;
+DROP FUNCTION IF EXISTS file_shares_after_delete();
+
+DROP TRIGGER IF EXISTS file_shares_after_insert ON file_shares;
+DROP FUNCTION IF EXISTS file_shares_after_insert();
+
+DROP FUNCTION IF EXISTS file_effective_shares_recompute(uuid[], uuid[]);
+
+DROP INDEX IF EXISTS uaud_descendant_id_idx;
+
+DROP INDEX IF EXISTS fafd_descendant_id_descendant_depth_idx;
+
+DROP TABLE IF EXISTS file_effective_shares;
+
+COMMIT;
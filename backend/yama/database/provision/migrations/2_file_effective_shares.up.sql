@@ -0,0 +1,117 @@
+BEGIN;
+
+-- The share types are ordered from the weakest to the strongest, so a user's
+-- effective share on a file is the greatest of the shares to the user and to the
+-- groups the user is in. Lookups of the shares that apply to a file then probe this
+-- table once for every ancestor of the file instead of joining the user closure.
+-- It's maintained by the triggers below, so every writer of file_shares and
+-- user_ancestors_user_descendants keeps it up to date.
+
+CREATE TABLE IF NOT EXISTS file_effective_shares (
+    user_id uuid NOT NULL,
+    file_id uuid NOT NULL,
+    type file_share_type NOT NULL,
+    PRIMARY KEY (user_id, file_id),
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (file_id) REFERENCES files (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS fafd_descendant_id_descendant_depth_idx
+    ON file_ancestors_file_descendants (descendant_id, descendant_depth);
+
+CREATE INDEX IF NOT EXISTS uaud_descendant_id_idx
+    ON user_ancestors_user_descendants (descendant_id);
+
+INSERT INTO file_effective_shares (user_id, file_id, type)
+SELECT uaud.descendant_id, fs.file_id, max(fs.type)
+FROM file_shares fs
+JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = fs.user_id
+GROUP BY uaud.descendant_id, fs.file_id;
+
+-- Recomputes the effective shares of the pairs after shares or memberships that
+-- granted them are gone.
+CREATE FUNCTION file_effective_shares_recompute(user_ids uuid[], file_ids uuid[])
+RETURNS void LANGUAGE sql AS $$
+    DELETE FROM file_effective_shares fes
+    USING unnest(user_ids, file_ids) AS p (user_id, file_id)
+    WHERE fes.user_id = p.user_id AND fes.file_id = p.file_id;
+
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT p.user_id, p.file_id, max(fs.type)
+    FROM unnest(user_ids, file_ids) AS p (user_id, file_id)
+    JOIN user_ancestors_user_descendants uaud ON uaud.descendant_id = p.user_id
+    JOIN file_shares fs ON fs.user_id = uaud.ancestor_id AND fs.file_id = p.file_id
+    GROUP BY p.user_id, p.file_id;
+$$;
+
+CREATE FUNCTION file_shares_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT uaud.descendant_id, s.file_id, max(s.type)
+    FROM new_shares s
+    JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = s.user_id
+    GROUP BY uaud.descendant_id, s.file_id
+    ON CONFLICT (user_id, file_id)
+        DO UPDATE SET type = greatest(file_effective_shares.type, excluded.type);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER file_shares_after_insert
+    AFTER INSERT ON file_shares
+    REFERENCING NEW TABLE AS new_shares
+    FOR EACH STATEMENT EXECUTE FUNCTION file_shares_after_insert();
+
+CREATE FUNCTION file_shares_after_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM file_effective_shares_recompute(array_agg(user_id), array_agg(file_id))
+    FROM (
+        SELECT DISTINCT uaud.descendant_id AS user_id, s.file_id
+        FROM old_shares s
+        JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = s.user_id
+    ) AS p;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER file_shares_after_delete
+    AFTER DELETE ON file_shares
+    REFERENCING OLD TABLE AS old_shares
+    FOR EACH STATEMENT EXECUTE FUNCTION file_shares_after_delete();
+
+CREATE FUNCTION uaud_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT e.descendant_id, fs.file_id, max(fs.type)
+    FROM new_edges e
+    JOIN file_shares fs ON fs.user_id = e.ancestor_id
+    GROUP BY e.descendant_id, fs.file_id
+    ON CONFLICT (user_id, file_id)
+        DO UPDATE SET type = greatest(file_effective_shares.type, excluded.type);
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER uaud_after_insert
+    AFTER INSERT ON user_ancestors_user_descendants
+    REFERENCING NEW TABLE AS new_edges
+    FOR EACH STATEMENT EXECUTE FUNCTION uaud_after_insert();
+
+CREATE FUNCTION uaud_after_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM file_effective_shares_recompute(array_agg(user_id), array_agg(file_id))
+    FROM (
+        SELECT DISTINCT e.descendant_id AS user_id, fs.file_id
+        FROM old_edges e
+        JOIN file_shares fs ON fs.user_id = e.ancestor_id
+    ) AS p;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER uaud_after_delete
+    AFTER DELETE ON user_ancestors_user_descendants
+    REFERENCING OLD TABLE AS old_edges
+    FOR EACH STATEMENT EXECUTE FUNCTION uaud_after_delete();
+
+COMMIT;
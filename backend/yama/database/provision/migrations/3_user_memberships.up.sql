@@ -0,0 +1,28 @@
+BEGIN;
+
+-- Direct memberships of users in groups. user_ancestors_user_descendants is their
+-- transitive closure and is maintained from them.
+
+CREATE TABLE IF NOT EXISTS user_memberships (
+    group_id uuid NOT NULL,
+    member_id uuid NOT NULL,
+    PRIMARY KEY (group_id, member_id),
+    FOREIGN KEY (group_id) REFERENCES users (id),
+    FOREIGN KEY (member_id) REFERENCES users (id)
+);
+CREATE INDEX IF NOT EXISTS user_memberships_member_id_idx
+    ON user_memberships (member_id);
+
+INSERT INTO user_memberships (group_id, member_id)
+SELECT ancestor_id, descendant_id
+FROM user_ancestors_user_descendants
+WHERE descendant_depth = 1;
+
+-- Every user is its own ancestor, so its own shares apply to it. Users created
+-- through the API used to miss this row.
+INSERT INTO user_ancestors_user_descendants (ancestor_id, descendant_id, descendant_depth)
+SELECT id, id, 0
+FROM users
+ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,49 @@
+BEGIN;
+
+CREATE OR REPLACE FUNCTION uaud_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT e.descendant_id, fs.file_id, max(fs.type)
+    FROM new_edges e
+    JOIN file_shares fs ON fs.user_id = e.ancestor_id
+    GROUP BY e.descendant_id, fs.file_id
+    ON CONFLICT (user_id, file_id)
+        DO UPDATE SET type = greatest(file_effective_shares.type, excluded.type);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION file_shares_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT uaud.descendant_id, s.file_id, max(s.type)
+    FROM new_shares s
+    JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = s.user_id
+    GROUP BY uaud.descendant_id, s.file_id
+    ON CONFLICT (user_id, file_id)
+        DO UPDATE SET type = greatest(file_effective_shares.type, excluded.type);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION file_effective_shares_recompute(user_ids uuid[], file_ids uuid[])
+RETURNS void LANGUAGE sql AS $$
+    DELETE FROM file_effective_shares fes
+    USING unnest(user_ids, file_ids) AS p (user_id, file_id)
+    WHERE fes.user_id = p.user_id AND fes.file_id = p.file_id;
+
+    INSERT INTO file_effective_shares (user_id, file_id, type)
+    SELECT p.user_id, p.file_id, max(fs.type)
+    FROM unnest(user_ids, file_ids) AS p (user_id, file_id)
+    JOIN user_ancestors_user_descendants uaud ON uaud.descendant_id = p.user_id
+    JOIN file_shares fs ON fs.user_id = uaud.ancestor_id AND fs.file_id = p.file_id
+    GROUP BY p.user_id, p.file_id;
+$$;
+
+DROP INDEX IF EXISTS fes_user_id_shared_at_file_id_idx;
+
+ALTER TABLE file_effective_shares DROP COLUMN IF EXISTS shared_at;
+
+ALTER TABLE file_shares DROP COLUMN IF EXISTS created_at;
+
+COMMIT;
@@ -0,0 +1,82 @@
+BEGIN;
+
+-- A user's effective share on a file is shared with the user when it comes from a
+-- share created by someone else, and shared_at is when the latest such share was
+-- created. It's null for effective shares coming only from the user's own shares,
+-- like the ones on the files the user created, so the partial index below covers
+-- just the files shared with the user, newest first.
+
+ALTER TABLE file_shares ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now();
+
+ALTER TABLE file_effective_shares ADD COLUMN IF NOT EXISTS shared_at timestamptz;
+
+UPDATE file_effective_shares fes
+SET shared_at = p.shared_at
+FROM (
+    SELECT uaud.descendant_id AS user_id, fs.file_id, max(fs.created_at) AS shared_at
+    FROM file_shares fs
+    JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = fs.user_id
+    WHERE fs.created_by <> uaud.descendant_id
+    GROUP BY uaud.descendant_id, fs.file_id
+) AS p
+WHERE fes.user_id = p.user_id AND fes.file_id = p.file_id;
+
+CREATE INDEX IF NOT EXISTS fes_user_id_shared_at_file_id_idx
+    ON file_effective_shares (user_id, shared_at DESC, file_id DESC)
+    WHERE shared_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION file_effective_shares_recompute(user_ids uuid[], file_ids uuid[])
+RETURNS void LANGUAGE sql AS $$
+    DELETE FROM file_effective_shares fes
+    USING unnest(user_ids, file_ids) AS p (user_id, file_id)
+    WHERE fes.user_id = p.user_id AND fes.file_id = p.file_id;
+
+    INSERT INTO file_effective_shares (user_id, file_id, type, shared_at)
+    SELECT
+        p.user_id,
+        p.file_id,
+        max(fs.type),
+        max(fs.created_at) FILTER (WHERE fs.created_by <> p.user_id)
+    FROM unnest(user_ids, file_ids) AS p (user_id, file_id)
+    JOIN user_ancestors_user_descendants uaud ON uaud.descendant_id = p.user_id
+    JOIN file_shares fs ON fs.user_id = uaud.ancestor_id AND fs.file_id = p.file_id
+    GROUP BY p.user_id, p.file_id;
+$$;
+
+CREATE OR REPLACE FUNCTION file_shares_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type, shared_at)
+    SELECT
+        uaud.descendant_id,
+        s.file_id,
+        max(s.type),
+        max(s.created_at) FILTER (WHERE s.created_by <> uaud.descendant_id)
+    FROM new_shares s
+    JOIN user_ancestors_user_descendants uaud ON uaud.ancestor_id = s.user_id
+    GROUP BY uaud.descendant_id, s.file_id
+    ON CONFLICT (user_id, file_id) DO UPDATE SET
+        type = greatest(file_effective_shares.type, excluded.type),
+        shared_at = greatest(file_effective_shares.shared_at, excluded.shared_at);
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION uaud_after_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO file_effective_shares (user_id, file_id, type, shared_at)
+    SELECT
+        e.descendant_id,
+        fs.file_id,
+        max(fs.type),
+        max(fs.created_at) FILTER (WHERE fs.created_by <> e.descendant_id)
+    FROM new_edges e
+    JOIN file_shares fs ON fs.user_id = e.ancestor_id
+    GROUP BY e.descendant_id, fs.file_id
+    ON CONFLICT (user_id, file_id) DO UPDATE SET
+        type = greatest(file_effective_shares.type, excluded.type),
+        shared_at = greatest(file_effective_shares.shared_at, excluded.shared_at);
+    RETURN NULL;
+END;
+$$;
+
+COMMIT;
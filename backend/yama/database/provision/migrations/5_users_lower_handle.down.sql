@@ -0,0 +1,5 @@
+BEGIN;
+
+DROP INDEX IF EXISTS users_lower_handle_uidx;
+
+COMMIT;
@@ -0,0 +1,28 @@
+BEGIN;
+
+-- Handles used to be unique only as they were written, so handles that differ only in
+-- case are renamed first. The user whose handle is already in lower case, or else the
+-- one with the lowest ID, keeps it; the others get their IDs appended to a prefix of
+-- the handle, which keeps them within the handle length limit.
+
+UPDATE users
+SET handle = left(users.handle, 50) || '~' || users.id::text
+FROM (
+    SELECT
+        id,
+        row_number() OVER (
+            PARTITION BY lower(handle) COLLATE "C"
+            ORDER BY handle = lower(handle) DESC, id
+        ) AS rank
+    FROM users
+) AS ranked_users
+WHERE users.id = ranked_users.id AND ranked_users.rank > 1;
+
+-- Handles are unique regardless of case. The "C" collation orders the index by code
+-- points, so it serves equality lookups, handle prefix ranges and keyset pagination
+-- of the user directory alike.
+
+CREATE UNIQUE INDEX IF NOT EXISTS users_lower_handle_uidx
+    ON users ((lower(handle) COLLATE "C"));
+
+COMMIT;
@@ -0,0 +1,5 @@
+BEGIN;
+
+ALTER TABLE user_memberships DROP COLUMN IF EXISTS is_admin;
+
+COMMIT;
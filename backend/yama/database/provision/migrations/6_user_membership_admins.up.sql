@@ -0,0 +1,10 @@
+BEGIN;
+
+-- Groups are managed by their admins, direct members marked with is_admin, and by
+-- the root user. A group's creator is its first admin. Groups created before admins
+-- existed have none, so only the root user manages them.
+
+ALTER TABLE user_memberships
+    ADD COLUMN IF NOT EXISTS is_admin boolean NOT NULL DEFAULT false;
+
+COMMIT;
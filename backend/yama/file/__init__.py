@@ -1,17 +1,41 @@
+from ._cache import CachingDriver as CachingDriver
+from ._cache import ContentCache as ContentCache
+from ._cache import ContentCacheStats as ContentCacheStats
 from ._config import Config as Config
+from ._config import DriverConfig as DriverConfig
+from ._config import FileSystemDriverConfig as FileSystemDriverConfig
+from ._config import S3DriverConfig as S3DriverConfig
 from ._config import get_config as get_config
 from ._driver import Driver as Driver
 from ._driver import DriverFileError as DriverFileError
 from ._driver import DriverFileTooLargeError as DriverFileTooLargeError
+from ._driver import DriverUpload as DriverUpload
+from ._driver import DriverUploadError as DriverUploadError
+from ._driver import DriverUploadNotFoundError as DriverUploadNotFoundError
+from ._driver import DriverUploadOffsetError as DriverUploadOffsetError
+from ._driver import DriverVersion as DriverVersion
+from ._driver import DriverVersionNotFoundError as DriverVersionNotFoundError
+from ._driver import DriverVersionPolicy as DriverVersionPolicy
 from ._driver import FileSystemDriver as FileSystemDriver
-from ._driver import get_driver as get_driver
+from ._durability import Durability as Durability
+from ._durability import Syncer as Syncer
+from ._errors import FileContentConflictError as FileContentConflictError
 from ._errors import FileFileError as FileFileError
 from ._errors import FileFileExistsError as FileFileExistsError
 from ._errors import FileFileNotFoundError as FileFileNotFoundError
+from ._errors import FileInvalidPatchError as FileInvalidPatchError
 from ._errors import FileIsADirectoryError as FileIsADirectoryError
 from ._errors import FileNotADirectoryError as FileNotADirectoryError
 from ._errors import FilePermissionError as FilePermissionError
 from ._errors import exception_handlers as exception_handlers
+from ._factory import get_content_cache as get_content_cache
+from ._factory import get_driver as get_driver
+from ._factory import get_tiered_cache as get_tiered_cache
+from ._factory import make_content_cache as make_content_cache
+from ._factory import make_driver as make_driver
+from ._factory import make_executor as make_executor
+from ._factory import make_tiered_cache as make_tiered_cache
+from ._lock import LockManager as LockManager
 from ._models import Directory as Directory
 from ._models import DirectoryContent as DirectoryContent
 from ._models import DirectoryContentFile as DirectoryContentFile
@@ -24,19 +48,41 @@ from ._models import FileName as FileName
 from ._models import FileOut as FileOut
 from ._models import FilePath as FilePath
 from ._models import FilePathAdapter as FilePathAdapter
+from ._models import FileShare as FileShare
+from ._models import FileShareOut as FileShareOut
 from ._models import FileShareType as FileShareType
+from ._models import FileShareWrite as FileShareWrite
 from ._models import FileType as FileType
 from ._models import FileWrite as FileWrite
 from ._models import Regular as Regular
+from ._models import RegularContentEdit as RegularContentEdit
 from ._models import RegularContentOut as RegularContentOut
+from ._models import RegularContentPatch as RegularContentPatch
+from ._models import RegularContentUploadWrite as RegularContentUploadWrite
 from ._models import RegularContentWrite as RegularContentWrite
 from ._models import RegularOut as RegularOut
+from ._models import RegularVersionOut as RegularVersionOut
 from ._models import RegularWrite as RegularWrite
+from ._models import SharedFile as SharedFile
+from ._models import SharedFileOut as SharedFileOut
+from ._models import SharedFilesOut as SharedFilesOut
+from ._models import UploadOut as UploadOut
 from ._router import router as router
+from ._s3 import S3Driver as S3Driver
+from ._s3 import S3DriverError as S3DriverError
+from ._service import (
+    driver_version_to_regular_version_out as driver_version_to_regular_version_out,
+)
 from ._service import file_to_file_out as file_to_file_out
 from ._service import move_file as move_file
+from ._service import patch_file as patch_file
 from ._service import read_file as read_file
+from ._service import read_shared_files as read_shared_files
 from ._service import remove_file as remove_file
+from ._service import revoke_files as revoke_files
 from ._service import share_file as share_file
+from ._service import share_files as share_files
 from ._service import walk_parent as walk_parent
 from ._service import write_file as write_file
+from ._tiered import TieredCache as TieredCache
+from ._tiered import TieredDriver as TieredDriver
@@ -0,0 +1,290 @@
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from uuid import UUID
+
+from typing_extensions import override
+
+from ._driver import Driver, DriverUpload, DriverVersion
+from ._stream import AsyncReadable, BytesReader, PrefixedReader
+
+
+@dataclass(frozen=True)
+class ContentCacheStats:
+    hits: int
+    misses: int
+    entry_count: int
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True)
+class _ContentCacheEntry:
+    tag: str
+    content: bytes
+    stored_at: float
+
+
+class ContentCache:
+    """
+    An LRU cache of regular contents bounded by the total size of the contents.
+
+    Entries are keyed by file ID and content tag (see Driver.read_regular_content_tag),
+    so a content replaced by this or any other process is never served from the
+    cache. Entries may also expire after max_age_seconds.
+    """
+
+    def __init__(
+        self,
+        /,
+        *,
+        max_size: int,
+        max_entry_size: int,
+        max_age_seconds: float | None,
+    ) -> None:
+        self.max_size = max_size
+        self.max_entry_size = min(max_entry_size, max_size)
+        self.max_age_seconds = max_age_seconds
+
+        self._entries: OrderedDict[UUID, _ContentCacheEntry] = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, id_: UUID, tag: str, /) -> bytes | None:
+        entry = self._entries.get(id_)
+        if entry is not None and (entry.tag != tag or self._is_expired(entry)):
+            self._remove(id_)
+            entry = None
+
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(id_)
+        return entry.content
+
+    def peek(self, id_: UUID, tag: str, /) -> bytes | None:
+        """
+        Returns the content without affecting the entries' order and statistics.
+        """
+        entry = self._entries.get(id_)
+        if entry is None or entry.tag != tag or self._is_expired(entry):
+            return None
+        return entry.content
+
+    def put(self, id_: UUID, tag: str, content: bytes, /) -> None:
+        if len(content) > self.max_entry_size:
+            return
+
+        self._remove(id_)
+        self._entries[id_] = _ContentCacheEntry(
+            tag=tag, content=content, stored_at=time.monotonic()
+        )
+        self._size += len(content)
+
+        while self._size > self.max_size:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+
+    def invalidate(self, id_: UUID, /) -> None:
+        """
+        Removes the entry of a replaced content. The entry wouldn't be served anyway
+        since its tag is stale, this only frees its space early.
+        """
+        self._remove(id_)
+
+    def stats(self) -> ContentCacheStats:
+        return ContentCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            entry_count=len(self._entries),
+            size=self._size,
+        )
+
+    def _remove(self, id_: UUID, /) -> None:
+        entry = self._entries.pop(id_, None)
+        if entry is not None:
+            self._size -= len(entry.content)
+
+    def _is_expired(self, entry: _ContentCacheEntry, /) -> bool:
+        if self.max_age_seconds is None:
+            return False
+        return entry.stored_at + self.max_age_seconds <= time.monotonic()
+
+
+class CachingDriver(Driver):
+    """
+    Serves small regular contents from a content cache in front of another driver.
+    """
+
+    def __init__(self, driver: Driver, /, *, cache: ContentCache) -> None:
+        super().__init__()
+        self.driver = driver
+        self.cache = cache
+
+    @override
+    async def startup(self) -> None:
+        await self.driver.startup()
+
+    @override
+    async def shutdown(self) -> None:
+        await self.driver.shutdown()
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        # The tag is read before the content, so if the content is replaced in
+        # between, the newer content is stored under the older tag which is never
+        # looked up again.
+        tag = await self.driver.read_regular_content_tag(id_)
+
+        if offset or size is not None:
+            # Partial reads are served from the cache but don't fill it.
+            content = self.cache.peek(id_, tag)
+            if content is not None:
+                end = offset + size if size is not None else None
+                yield BytesReader(content[offset:end])
+                return
+
+            async with self.driver.read_regular_content(
+                id_, offset=offset, size=size
+            ) as f:
+                yield f
+            return
+
+        content = self.cache.get(id_, tag)
+        if content is not None:
+            yield BytesReader(content)
+            return
+
+        async with self.driver.read_regular_content(id_) as f:
+            # Reading one byte more than an entry can hold tells whether the whole
+            # content fits without reading large contents into memory.
+            prefix = await _read_at_most(f, self.cache.max_entry_size + 1)
+            if len(prefix) > self.cache.max_entry_size:
+                yield PrefixedReader(prefix, f)
+                return
+
+        self.cache.put(id_, tag, prefix)
+        yield BytesReader(prefix)
+
+    @override
+    async def read_regular_content_tag(self, id_: UUID, /) -> str:
+        return await self.driver.read_regular_content_tag(id_)
+
+    @override
+    async def write_regular_content(
+        self,
+        content_stream: AsyncReadable,
+        id_: UUID,
+        /,
+        *,
+        chunk_size: int,
+        max_file_size: int,
+        expected_tag: str | None = None,
+    ) -> int:
+        try:
+            return await self.driver.write_regular_content(
+                content_stream,
+                id_,
+                chunk_size=chunk_size,
+                max_file_size=max_file_size,
+                expected_tag=expected_tag,
+            )
+        finally:
+            self.cache.invalidate(id_)
+
+    @override
+    async def remove_regular_content(self, id_: UUID, /) -> None:
+        try:
+            await self.driver.remove_regular_content(id_)
+        finally:
+            self.cache.invalidate(id_)
+
+    @override
+    async def read_regular_content_versions(self, id_: UUID, /) -> list[DriverVersion]:
+        return await self.driver.read_regular_content_versions(id_)
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]:
+        async with self.driver.read_regular_content_version(id_, version) as f:
+            yield f
+
+    @override
+    async def create_upload(
+        self, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        return await self.driver.create_upload(
+            user_id=user_id, expire_seconds=expire_seconds
+        )
+
+    @override
+    async def read_upload(
+        self, upload_id: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        return await self.driver.read_upload(
+            upload_id, user_id=user_id, expire_seconds=expire_seconds
+        )
+
+    @override
+    async def append_upload(
+        self,
+        content_stream: AsyncReadable,
+        upload_id: UUID,
+        /,
+        *,
+        user_id: UUID,
+        offset: int,
+        chunk_size: int,
+        max_file_size: int,
+        expire_seconds: int,
+    ) -> DriverUpload:
+        return await self.driver.append_upload(
+            content_stream,
+            upload_id,
+            user_id=user_id,
+            offset=offset,
+            chunk_size=chunk_size,
+            max_file_size=max_file_size,
+            expire_seconds=expire_seconds,
+        )
+
+    @override
+    async def commit_upload(
+        self, upload_id: UUID, id_: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> int:
+        try:
+            return await self.driver.commit_upload(
+                upload_id, id_, user_id=user_id, expire_seconds=expire_seconds
+            )
+        finally:
+            self.cache.invalidate(id_)
+
+    @override
+    async def remove_upload(self, upload_id: UUID, /, *, user_id: UUID) -> None:
+        await self.driver.remove_upload(upload_id, user_id=user_id)
+
+    @override
+    async def remove_expired_uploads(self, /, *, expire_seconds: int) -> int:
+        return await self.driver.remove_expired_uploads(expire_seconds=expire_seconds)
+
+
+async def _read_at_most(stream: AsyncReadable, size: int, /) -> bytes:
+    chunks: list[bytes] = []
+    while size > 0 and (chunk := await stream.read(size)):
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+from uuid import UUID
+
+import aiofiles
+
+from ._cache import CachingDriver, ContentCache
+from ._driver import FileSystemDriver
+
+
+async def test_caching_driver_read_regular_content(*, tmp_path: Path) -> None:
+    """Tests the CachingDriver.read_regular_content method."""
+    file_system_dir = tmp_path / "file-system"
+    cache = ContentCache(max_size=16, max_entry_size=8, max_age_seconds=None)
+    driver = CachingDriver(
+        FileSystemDriver(file_system_dir=file_system_dir), cache=cache
+    )
+
+    await driver.startup()
+    for name, content in [
+        ("42bd9c321c96485faf69b48536bc3c4a", b"# Foo\n"),
+        ("24bd9c321c96485faf69b48536bc3c4a", b"# Bar\n"),
+        ("00bd9c321c96485faf69b48536bc3c4a", b"# Baz\n\nQux.\n"),
+    ]:
+        async with aiofiles.open(file_system_dir / name, "wb") as f:
+            _ = await f.write(content)
+
+    # Case about reading a small file twice.
+
+    for _ in range(2):
+        async with driver.read_regular_content(
+            UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+        ) as f:
+            assert await f.read() == b"# Foo\n"
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entry_count) == (1, 1, 1)
+
+    # Case about reading a file that is larger than an entry.
+
+    async with driver.read_regular_content(
+        UUID("00bd9c32-1c96-485f-af69-b48536bc3c4a")
+    ) as f:
+        assert await f.read(3) == b"# B"
+        assert await f.read() == b"az\n\nQux.\n"
+
+    assert cache.stats().entry_count == 1
+
+    # Case about reading a file after it has been overwritten.
+
+    async with aiofiles.open(tmp_path / "some-file.md", "wb") as f:
+        _ = await f.write(b"# Quux\n")
+    async with aiofiles.open(tmp_path / "some-file.md", "rb") as f:
+        _ = await driver.write_regular_content(
+            f,
+            UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a"),
+            chunk_size=64,
+            max_file_size=512,
+        )
+
+    async with driver.read_regular_content(
+        UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    ) as f:
+        assert await f.read() == b"# Quux\n"
+
+    # Case about reading a file after it has been overwritten by another process.
+
+    async with aiofiles.open(tmp_path / "some-file.md", "wb") as f:
+        _ = await f.write(b"# Corge\n")
+    os.replace(
+        tmp_path / "some-file.md", file_system_dir / "42bd9c321c96485faf69b48536bc3c4a"
+    )
+
+    async with driver.read_regular_content(
+        UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    ) as f:
+        assert await f.read() == b"# Corge\n"
+
+    # Case about evicting the least recently used file.
+
+    async with driver.read_regular_content(
+        UUID("24bd9c32-1c96-485f-af69-b48536bc3c4a")
+    ) as f:
+        _ = await f.read()
+    async with driver.read_regular_content(
+        UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    ) as f:
+        _ = await f.read()
+
+    stats = cache.stats()
+    assert (stats.entry_count, stats.size) == (2, 14)
@@ -1,14 +1,46 @@
 from pathlib import Path
-from typing import Literal
+from typing import Annotated, Literal
 from uuid import UUID
 
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from starlette.requests import Request
 
+from ._durability import Durability
 
-class DriverConfig(BaseSettings):
+
+class FileSystemDriverConfig(BaseSettings):
     type: Literal["file-system"]
     file_system_dir: Path
+    durability: Durability = "fsync-file-and-dir"
+    # Only used by the "group-commit" durability.
+    group_commit_delay_seconds: float = 0
+
+    version_snapshot_interval: Annotated[int, Field(ge=1)] = 16
+    version_max_count: int = 64
+    version_max_age_seconds: int | None = 60 * 60 * 24 * 30  # 30 days
+    version_max_delta_content_size: int = 1024 * 1024 * 16  # 16 MiB
+
+
+class S3DriverConfig(BaseSettings):
+    type: Literal["s3"]
+    endpoint_url: str
+    bucket: str
+    region: str = "us-east-1"
+    access_key_id: str
+    secret_access_key: str
+    key_prefix: str = ""
+
+    # S3 requires every part of a multipart upload except the last one to be at
+    # least 5 MiB.
+    part_size: int = 1024 * 1024 * 8  # 8 MiB
+    # The HTTP client's connections are pooled and shared by all requests.
+    connection_limit: int = 100
+
+
+DriverConfig = Annotated[
+    FileSystemDriverConfig | S3DriverConfig, Field(discriminator="type")
+]
 
 
 class Config(BaseSettings):
@@ -18,6 +50,18 @@ class Config(BaseSettings):
 
     chunk_size: int = 1024 * 1024 * 10  # 10 MiB
     max_file_size: int = 1024 * 1024 * 512  # 512 MiB
+    upload_expire_seconds: int = 60 * 60 * 24  # 1 day
+    # Blocking file I/O runs in a thread pool of its own.
+    io_thread_count: int = 32
+    # The content cache is disabled when its max size is 0.
+    content_cache_max_size: int = 1024 * 1024 * 64  # 64 MiB
+    content_cache_max_entry_size: int = 1024 * 256  # 256 KiB
+    content_cache_max_age_seconds: float | None = None
+    # The tiered cache keeps contents on local disk in front of the driver and is
+    # disabled when its directory isn't set.
+    tiered_cache_dir: Path | None = None
+    tiered_cache_max_size: int = 1024 * 1024 * 1024 * 4  # 4 GiB
+    tiered_cache_max_entry_size: int = 1024 * 1024 * 256  # 256 MiB
     files_base_url: str
     root_file_id: UUID
 
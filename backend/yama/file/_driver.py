@@ -1,14 +1,31 @@
+import asyncio
+import os
+import time
 from abc import ABC, abstractmethod
-from contextlib import asynccontextmanager
+from concurrent.futures import Executor
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
 from pathlib import Path
-from typing import Annotated, AsyncIterator, Protocol, assert_never
-from uuid import UUID
+from typing import AsyncIterator
+from uuid import UUID, uuid4
 
 import aiofiles.os
-from fastapi import Depends
 from typing_extensions import override
 
-from ._config import Config, get_config
+from ._durability import Syncer
+from ._lock import LockManager
+from ._stream import AsyncReadable, BytesReader, LimitedReader
+from ._version import (
+    DELTA_HEADER_SIZE,
+    apply_delta,
+    make_delta,
+    read_delta_size,
+)
+
+_LAST_VERSION_NAME = "last-version"
+# Deltas larger than this fraction of their content are kept as snapshots instead.
+_MAX_DELTA_SIZE_RATIO = 0.5
 
 
 class DriverFileError(Exception): ...
@@ -27,14 +44,104 @@ class DriverFileNotFoundError(DriverFileError):
         return f"{self.id_}"
 
 
-class AsyncReadable(Protocol):
-    async def read(self, size: int = ..., /) -> bytes: ...
+class DriverContentConflictError(DriverFileError):
+    def __init__(self, id_: UUID, /) -> None:
+        super().__init__()
+        self.id_ = id_
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.id_}"
+
+
+class DriverVersionNotFoundError(DriverFileError):
+    def __init__(self, id_: UUID, version: int, /) -> None:
+        super().__init__()
+        self.id_ = id_
+        self.version = version
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.id_} at version {self.version}"
+
+
+class DriverUploadError(Exception):
+    def __init__(self, upload_id: UUID, /) -> None:
+        super().__init__()
+        self.upload_id = upload_id
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.upload_id}"
+
+
+class DriverUploadNotFoundError(DriverUploadError): ...
+
+
+class DriverUploadOffsetError(DriverUploadError):
+    def __init__(self, upload_id: UUID, /, *, offset: int) -> None:
+        super().__init__(upload_id)
+        self.offset = offset
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.upload_id} at offset {self.offset}"
+
+
+@dataclass(frozen=True)
+class DriverUpload:
+    id: UUID
+    offset: int
+    expires_at: datetime
+
+
+@dataclass(frozen=True)
+class DriverVersion:
+    version: int
+    size: int
+    created_at: datetime
+
+
+@dataclass(frozen=True)
+class DriverVersionPolicy:
+    # Every version with a number divisible by the interval is kept as a full snapshot
+    # which bounds the number of deltas that are applied to read a version.
+    snapshot_interval: int
+    max_count: int
+    max_age_seconds: int | None
+    # Versions of larger contents are kept as snapshots since making their deltas
+    # would require reading them into memory.
+    max_delta_content_size: int
 
 
 class Driver(ABC):
+    """
+    A driver is created once per app. It's started up before it's used and shut down
+    after it's no longer used.
+    """
+
+    async def startup(self) -> None: ...
+
+    async def shutdown(self) -> None: ...
+
     @abstractmethod
     @asynccontextmanager
-    def read_regular_content(self, id_: UUID, /) -> AsyncIterator[AsyncReadable]: ...
+    def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        """
+        Reads the regular content starting at the offset. At most size bytes are read
+        if the size is given.
+        """
+        ...
+
+    @abstractmethod
+    async def read_regular_content_tag(self, id_: UUID, /) -> str:
+        """
+        Returns a tag that changes whenever the regular content is replaced, also by
+        other processes, so that caches can tell their entries are stale.
+        """
+        ...
 
     @abstractmethod
     async def write_regular_content(
@@ -45,28 +152,148 @@ class Driver(ABC):
         *,
         chunk_size: int,
         max_file_size: int,
-    ) -> int: ...
+        expected_tag: str | None = None,
+    ) -> int:
+        """
+        Returns the size of the written content. If the expected tag is given, the
+        content is only replaced while its tag is still the expected one, otherwise
+        DriverContentConflictError is raised.
+        """
+        ...
+
+    @abstractmethod
+    async def remove_regular_content(self, id_: UUID, /) -> None:
+        """
+        Removes the regular content along with its versions.
+        """
+        ...
 
     @abstractmethod
-    async def remove_regular_content(self, id_: UUID, /) -> None: ...
+    async def read_regular_content_versions(self, id_: UUID, /) -> list[DriverVersion]:
+        """
+        Returns previous versions of the regular content from the oldest to the newest.
+        """
+        ...
+
+    @abstractmethod
+    @asynccontextmanager
+    def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]: ...
+
+    @abstractmethod
+    async def create_upload(
+        self, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        """
+        Creates an upload owned by the user. Other methods treat uploads owned by
+        other users as missing.
+        """
+        ...
+
+    @abstractmethod
+    async def read_upload(
+        self, upload_id: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload: ...
+
+    @abstractmethod
+    async def append_upload(
+        self,
+        content_stream: AsyncReadable,
+        upload_id: UUID,
+        /,
+        *,
+        user_id: UUID,
+        offset: int,
+        chunk_size: int,
+        max_file_size: int,
+        expire_seconds: int,
+    ) -> DriverUpload:
+        """
+        Appends the content to the upload if the upload's size equals the offset.
+
+        Content that has been appended before an error occurred is kept so that the
+        upload can be resumed from the new offset.
+        """
+        ...
+
+    @abstractmethod
+    async def commit_upload(
+        self, upload_id: UUID, id_: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> int:
+        """
+        Atomically replaces the regular content with the upload's content and removes
+        the upload.
+        """
+        ...
+
+    @abstractmethod
+    async def remove_upload(self, upload_id: UUID, /, *, user_id: UUID) -> None: ...
+
+    @abstractmethod
+    async def remove_expired_uploads(self, /, *, expire_seconds: int) -> int: ...
 
 
 class FileSystemDriver(Driver):
-    def __init__(self, /, *, file_system_dir: Path) -> None:
+    """
+    Stores regular contents as files named after their IDs.
+
+    When a version policy is given, a replaced regular content is kept as a version in
+    its own directory. Versions are stored as reverse deltas against the next newer
+    version (or the current content) with periodic full snapshots. Since older versions
+    depend on newer ones and never the other way around, the oldest versions can be
+    removed without rewriting the remaining ones.
+    """
+
+    def __init__(
+        self,
+        /,
+        *,
+        file_system_dir: Path,
+        version_policy: DriverVersionPolicy | None = None,
+        executor: Executor | None = None,
+        syncer: Syncer | None = None,
+    ) -> None:
         super().__init__()
         self.file_system_dir = file_system_dir
+        self.version_policy = version_policy
+        self.executor = executor
+        self.syncer = syncer or Syncer("none")
+
+        self._locks = LockManager()
+
+    @override
+    async def startup(self) -> None:
+        uploads_dir = _make_uploads_dir(file_system_dir=self.file_system_dir)
+        await aiofiles.os.makedirs(uploads_dir, exist_ok=True, executor=self.executor)
 
     @override
     @asynccontextmanager
-    async def read_regular_content(self, id_: UUID, /) -> AsyncIterator[AsyncReadable]:
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
         path = _id_to_path(id_, file_system_dir=self.file_system_dir)
 
         try:
-            async with aiofiles.open(path, "rb") as f:
-                yield f
+            async with aiofiles.open(path, "rb", executor=self.executor) as f:
+                if offset:
+                    _ = await f.seek(offset)
+                yield f if size is None else LimitedReader(f, size)
         except FileNotFoundError as e:
             raise DriverFileNotFoundError(id_) from e
 
+    @override
+    async def read_regular_content_tag(self, id_: UUID, /) -> str:
+        path = _id_to_path(id_, file_system_dir=self.file_system_dir)
+
+        try:
+            stat_result = await aiofiles.os.stat(path, executor=self.executor)
+        except FileNotFoundError as e:
+            raise DriverFileNotFoundError(id_) from e
+
+        # Contents are replaced by renames, so a replaced content has another inode.
+        return f"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
     @override
     async def write_regular_content(
         self,
@@ -76,9 +303,8 @@ class FileSystemDriver(Driver):
         *,
         chunk_size: int,
         max_file_size: int,
+        expected_tag: str | None = None,
     ) -> int:
-        await aiofiles.os.makedirs(self.file_system_dir, exist_ok=True)
-
         incomplete_path = _id_to_incomplete_path(
             id_, file_system_dir=self.file_system_dir
         )
@@ -86,7 +312,9 @@ class FileSystemDriver(Driver):
 
         try:
             file_size = 0
-            async with aiofiles.open(incomplete_path, "wb") as f:
+            async with aiofiles.open(
+                incomplete_path, "wb", executor=self.executor
+            ) as f:
                 while chunk := await content_stream.read(chunk_size):
                     file_size += len(chunk)
 
@@ -95,34 +323,460 @@ class FileSystemDriver(Driver):
 
                     _ = await f.write(chunk)
 
-            _ = incomplete_path.rename(complete_path)
+                await f.flush()
+                await self.syncer.sync_file(f.fileno())
+
+            # Concurrent writes of the content don't wait for each other while
+            # streaming but replace the content one at a time, the last one wins.
+            async with self._locks.lock(id_):
+                if (
+                    expected_tag is not None
+                    and await self.read_regular_content_tag(id_) != expected_tag
+                ):
+                    raise DriverContentConflictError(id_)
+                await self._keep_version(id_, newer_path=incomplete_path)
+                _ = incomplete_path.rename(complete_path)
         finally:
             incomplete_path.unlink(missing_ok=True)
 
+        await self.syncer.sync_dir(self.file_system_dir)
+
         return file_size
 
     @override
     async def remove_regular_content(self, id_: UUID, /) -> None:
+        async with self._locks.lock(id_):
+            await self._remove_regular_content(id_)
+
+    async def _remove_regular_content(self, id_: UUID, /) -> None:
         path = _id_to_path(id_, file_system_dir=self.file_system_dir)
 
         try:
-            await aiofiles.os.remove(path)
+            await aiofiles.os.remove(path, executor=self.executor)
         except FileNotFoundError as e:
             raise DriverFileNotFoundError(id_) from e
 
+        versions_dir = _id_to_versions_dir(id_, file_system_dir=self.file_system_dir)
+        for version_path, _, _ in await _list_version_paths(
+            versions_dir, executor=self.executor
+        ):
+            await aiofiles.os.remove(version_path, executor=self.executor)
+        try:
+            await aiofiles.os.remove(
+                versions_dir / _LAST_VERSION_NAME, executor=self.executor
+            )
+        except FileNotFoundError:
+            ...
+        try:
+            await aiofiles.os.rmdir(versions_dir, executor=self.executor)
+        except FileNotFoundError:
+            ...
+
+    @override
+    async def read_regular_content_versions(self, id_: UUID, /) -> list[DriverVersion]:
+        versions_dir = _id_to_versions_dir(id_, file_system_dir=self.file_system_dir)
+
+        versions: list[DriverVersion] = []
+        for version_path, version, is_snapshot in await _list_version_paths(
+            versions_dir, executor=self.executor
+        ):
+            stat_result = await aiofiles.os.stat(version_path, executor=self.executor)
+            if is_snapshot:
+                size = stat_result.st_size
+            else:
+                async with aiofiles.open(
+                    version_path, "rb", executor=self.executor
+                ) as f:
+                    size = read_delta_size(await f.read(DELTA_HEADER_SIZE))
+            created_at = datetime.fromtimestamp(stat_result.st_mtime, UTC)
+            versions.append(
+                DriverVersion(version=version, size=size, created_at=created_at)
+            )
+
+        return versions
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]:
+        versions_dir = _id_to_versions_dir(id_, file_system_dir=self.file_system_dir)
+
+        async with AsyncExitStack() as stack:
+            # The base and the deltas are opened while writes can't rotate them, so
+            # the opened files stay one consistent chain even if a write replaces
+            # the base or removes versions while they are being read.
+            async with self._locks.lock(id_):
+                version_paths = await _list_version_paths(
+                    versions_dir, executor=self.executor
+                )
+
+                # Collect the deltas from the version up to the nearest newer
+                # snapshot or the current content.
+
+                delta_paths: list[Path] = []
+                base_path: Path | None = None
+                for version_path, v, is_snapshot in version_paths:
+                    if v < version:
+                        continue
+                    if v == version or delta_paths:
+                        if is_snapshot:
+                            base_path = version_path
+                            break
+                        delta_paths.append(version_path)
+                if not delta_paths and base_path is None:
+                    raise DriverVersionNotFoundError(id_, version)
+                if base_path is None:
+                    base_path = _id_to_path(id_, file_system_dir=self.file_system_dir)
+
+                base_f = await stack.enter_async_context(
+                    aiofiles.open(base_path, "rb", executor=self.executor)
+                )
+                delta_fs = [
+                    await stack.enter_async_context(
+                        aiofiles.open(delta_path, "rb", executor=self.executor)
+                    )
+                    for delta_path in delta_paths
+                ]
+
+            if not delta_fs:
+                yield base_f
+                return
+
+            content = await base_f.read()
+            loop = asyncio.get_running_loop()
+            for delta_f in reversed(delta_fs):
+                delta = await delta_f.read()
+                content = await loop.run_in_executor(
+                    self.executor, apply_delta, content, delta
+                )
+
+            yield BytesReader(content)
+
+    async def _keep_version(self, id_: UUID, /, *, newer_path: Path) -> None:
+        """
+        Keeps the current regular content as a version before it gets replaced with
+        the content at the newer path.
+        """
+        if self.version_policy is None or self.version_policy.max_count <= 0:
+            return
+
+        older_path = _id_to_path(id_, file_system_dir=self.file_system_dir)
+        try:
+            older_size = (
+                await aiofiles.os.stat(older_path, executor=self.executor)
+            ).st_size
+        except FileNotFoundError:
+            return
+        newer_size = (
+            await aiofiles.os.stat(newer_path, executor=self.executor)
+        ).st_size
+
+        versions_dir = _id_to_versions_dir(id_, file_system_dir=self.file_system_dir)
+        await aiofiles.os.makedirs(versions_dir, exist_ok=True, executor=self.executor)
+        version_paths = await _list_version_paths(versions_dir, executor=self.executor)
+        # Version numbers are never reused, not even after every version has been
+        # removed, so the last one is kept in a file of its own.
+        version = (
+            max(
+                await _read_last_version(versions_dir, executor=self.executor),
+                version_paths[-1][1] if version_paths else 0,
+            )
+            + 1
+        )
+        await _write_last_version(versions_dir, version, executor=self.executor)
+
+        loop = asyncio.get_running_loop()
+        delta: bytes | None = None
+        if (
+            version % self.version_policy.snapshot_interval != 0
+            and older_size <= self.version_policy.max_delta_content_size
+            and newer_size <= self.version_policy.max_delta_content_size
+        ):
+            async with aiofiles.open(older_path, "rb", executor=self.executor) as f:
+                older = await f.read()
+            async with aiofiles.open(newer_path, "rb", executor=self.executor) as f:
+                newer = await f.read()
+            delta = await loop.run_in_executor(self.executor, make_delta, newer, older)
+            # A delta about as large as the content, such as one of a rewritten
+            # content, saves little, so the content is kept as a snapshot instead.
+            if len(delta) > older_size * _MAX_DELTA_SIZE_RATIO:
+                delta = None
+
+        if delta is None:
+            # The current content is about to be replaced by a rename, so the
+            # snapshot can share its data instead of copying it. The link shares the
+            # content's mtime too, so it's reset to when the content was replaced
+            # like a delta's.
+            snapshot_path = versions_dir / _make_version_name(version, True)
+            await aiofiles.os.link(older_path, snapshot_path, executor=self.executor)
+            await loop.run_in_executor(self.executor, os.utime, snapshot_path)
+        else:
+            delta_path = versions_dir / _make_version_name(version, False)
+            incomplete_delta_path = delta_path.with_suffix(".incomplete")
+            try:
+                async with aiofiles.open(
+                    incomplete_delta_path, "wb", executor=self.executor
+                ) as f:
+                    _ = await f.write(delta)
+                await aiofiles.os.replace(
+                    incomplete_delta_path, delta_path, executor=self.executor
+                )
+            finally:
+                incomplete_delta_path.unlink(missing_ok=True)
+
+        await self._remove_old_versions(versions_dir)
+
+    async def _remove_old_versions(self, versions_dir: Path, /) -> None:
+        assert self.version_policy is not None
+
+        version_paths = await _list_version_paths(versions_dir, executor=self.executor)
+        removed_count = max(len(version_paths) - self.version_policy.max_count, 0)
+
+        if self.version_policy.max_age_seconds is not None:
+            min_mtime = time.time() - self.version_policy.max_age_seconds
+            for version_path, _, _ in version_paths[removed_count:]:
+                if (
+                    await aiofiles.os.stat(version_path, executor=self.executor)
+                ).st_mtime >= min_mtime:
+                    break
+                removed_count += 1
+
+        # Versions are removed from the oldest since every version is readable
+        # without the versions older than it.
+        for version_path, _, _ in version_paths[:removed_count]:
+            await aiofiles.os.remove(version_path, executor=self.executor)
+
+    @override
+    async def create_upload(
+        self, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        upload_id = uuid4()
+        path = _upload_id_to_path(
+            upload_id, user_id=user_id, file_system_dir=self.file_system_dir
+        )
+        async with aiofiles.open(path, "xb", executor=self.executor):
+            ...
+
+        return DriverUpload(
+            id=upload_id,
+            offset=0,
+            expires_at=_make_expires_at(time.time(), expire_seconds),
+        )
+
+    @override
+    async def read_upload(
+        self, upload_id: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        path = _upload_id_to_path(
+            upload_id, user_id=user_id, file_system_dir=self.file_system_dir
+        )
+        offset, expires_at = await _stat_upload(
+            path, upload_id, expire_seconds=expire_seconds, executor=self.executor
+        )
+        return DriverUpload(id=upload_id, offset=offset, expires_at=expires_at)
+
+    @override
+    async def append_upload(
+        self,
+        content_stream: AsyncReadable,
+        upload_id: UUID,
+        /,
+        *,
+        user_id: UUID,
+        offset: int,
+        chunk_size: int,
+        max_file_size: int,
+        expire_seconds: int,
+    ) -> DriverUpload:
+        path = _upload_id_to_path(
+            upload_id, user_id=user_id, file_system_dir=self.file_system_dir
+        )
+        # The lock makes the offset check and the write atomic, otherwise concurrent
+        # appends at the same offset would overwrite each other.
+        async with self._locks.lock(upload_id):
+            upload_size, _ = await _stat_upload(
+                path, upload_id, expire_seconds=expire_seconds, executor=self.executor
+            )
+            if upload_size != offset:
+                raise DriverUploadOffsetError(upload_id, offset=upload_size)
+
+            file_size = offset
+            async with aiofiles.open(path, "r+b", executor=self.executor) as f:
+                _ = await f.seek(offset)
+                while chunk := await content_stream.read(chunk_size):
+                    if file_size + len(chunk) > max_file_size:
+                        raise DriverFileTooLargeError()
+
+                    _ = await f.write(chunk)
+                    file_size += len(chunk)
+
+        return DriverUpload(
+            id=upload_id,
+            offset=file_size,
+            expires_at=_make_expires_at(time.time(), expire_seconds),
+        )
+
+    @override
+    async def commit_upload(
+        self, upload_id: UUID, id_: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> int:
+        path = _upload_id_to_path(
+            upload_id, user_id=user_id, file_system_dir=self.file_system_dir
+        )
+        complete_path = _id_to_path(id_, file_system_dir=self.file_system_dir)
+
+        # The upload is locked before the content so that an append can't be in
+        # progress while the upload is committed.
+        async with self._locks.lock(upload_id):
+            file_size, _ = await _stat_upload(
+                path, upload_id, expire_seconds=expire_seconds, executor=self.executor
+            )
+            try:
+                async with aiofiles.open(path, "rb", executor=self.executor) as f:
+                    await self.syncer.sync_file(f.fileno())
+                async with self._locks.lock(id_):
+                    await self._keep_version(id_, newer_path=path)
+                    await aiofiles.os.replace(
+                        path, complete_path, executor=self.executor
+                    )
+            except FileNotFoundError as e:
+                raise DriverUploadNotFoundError(upload_id) from e
+
+        await self.syncer.sync_dir(self.file_system_dir)
+
+        return file_size
+
+    @override
+    async def remove_upload(self, upload_id: UUID, /, *, user_id: UUID) -> None:
+        path = _upload_id_to_path(
+            upload_id, user_id=user_id, file_system_dir=self.file_system_dir
+        )
+
+        try:
+            await aiofiles.os.remove(path, executor=self.executor)
+        except FileNotFoundError as e:
+            raise DriverUploadNotFoundError(upload_id) from e
+
+    @override
+    async def remove_expired_uploads(self, /, *, expire_seconds: int) -> int:
+        uploads_dir = _make_uploads_dir(file_system_dir=self.file_system_dir)
+
+        try:
+            names = await aiofiles.os.listdir(uploads_dir, executor=self.executor)
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        removed_count = 0
+        for name in names:
+            path = uploads_dir / name
+            try:
+                stat_result = await aiofiles.os.stat(path, executor=self.executor)
+                if stat_result.st_mtime + expire_seconds <= now:
+                    await aiofiles.os.remove(path, executor=self.executor)
+                    removed_count += 1
+            except FileNotFoundError:
+                # The upload has been committed or removed concurrently.
+                ...
+
+        return removed_count
+
+
+async def _stat_upload(
+    path: Path, upload_id: UUID, /, *, expire_seconds: int, executor: Executor | None
+) -> tuple[int, datetime]:
+    """
+    Returns the upload's size and expiration time. Expired uploads are treated as
+    missing.
+    """
+    try:
+        stat_result = await aiofiles.os.stat(path, executor=executor)
+    except FileNotFoundError as e:
+        raise DriverUploadNotFoundError(upload_id) from e
+
+    if stat_result.st_mtime + expire_seconds <= time.time():
+        raise DriverUploadNotFoundError(upload_id)
+
+    return stat_result.st_size, _make_expires_at(stat_result.st_mtime, expire_seconds)
+
+
+def _make_expires_at(timestamp: float, expire_seconds: int, /) -> datetime:
+    return datetime.fromtimestamp(timestamp + expire_seconds, UTC)
+
 
 def _id_to_path(id_: UUID, /, *, file_system_dir: Path) -> Path:
     return file_system_dir / id_.hex
 
 
 def _id_to_incomplete_path(id_: UUID, /, *, file_system_dir: Path) -> Path:
-    return file_system_dir / (id_.hex + ".incomplete")
-
-
-def get_driver(*, config: Annotated[Config, Depends(get_config)]) -> Driver:
-    """A dependency."""
-    match config.driver.type:
-        case "file-system":
-            return FileSystemDriver(file_system_dir=config.driver.file_system_dir)
-        case _:
-            assert_never(config.driver)
+    # Every write gets a path of its own so that concurrent writes of one content
+    # don't clobber each other.
+    return file_system_dir / f"{id_.hex}.{uuid4().hex}.incomplete"
+
+
+def _id_to_versions_dir(id_: UUID, /, *, file_system_dir: Path) -> Path:
+    return file_system_dir / "versions" / id_.hex
+
+
+async def _read_last_version(
+    versions_dir: Path, /, *, executor: Executor | None
+) -> int:
+    try:
+        async with aiofiles.open(
+            versions_dir / _LAST_VERSION_NAME, "r", executor=executor
+        ) as f:
+            return int(await f.read())
+    except FileNotFoundError:
+        return 0
+
+
+async def _write_last_version(
+    versions_dir: Path, version: int, /, *, executor: Executor | None
+) -> None:
+    path = versions_dir / _LAST_VERSION_NAME
+    incomplete_path = path.with_suffix(".incomplete")
+    async with aiofiles.open(incomplete_path, "w", executor=executor) as f:
+        _ = await f.write(str(version))
+    await aiofiles.os.replace(incomplete_path, path, executor=executor)
+
+
+def _make_version_name(version: int, is_snapshot: bool, /) -> str:
+    return f"{version}.snapshot" if is_snapshot else f"{version}.delta"
+
+
+async def _list_version_paths(
+    versions_dir: Path, /, *, executor: Executor | None
+) -> list[tuple[Path, int, bool]]:
+    """
+    Returns paths, numbers and snapshot flags of the versions from the oldest to the
+    newest.
+    """
+    try:
+        names = await aiofiles.os.listdir(versions_dir, executor=executor)
+    except FileNotFoundError:
+        return []
+
+    version_paths: list[tuple[Path, int, bool]] = []
+    for name in names:
+        stem, _, suffix = name.partition(".")
+        if suffix in ("snapshot", "delta") and stem.isdigit():
+            version_paths.append((versions_dir / name, int(stem), suffix == "snapshot"))
+    version_paths.sort(key=lambda t: t[1])
+
+    return version_paths
+
+
+def _make_uploads_dir(*, file_system_dir: Path) -> Path:
+    return file_system_dir / "uploads"
+
+
+def _upload_id_to_path(
+    upload_id: UUID, /, *, user_id: UUID, file_system_dir: Path
+) -> Path:
+    # Uploads are named after their owners too, so an upload can't be reached with
+    # another user's ID.
+    return (
+        _make_uploads_dir(file_system_dir=file_system_dir)
+        / f"{user_id.hex}.{upload_id.hex}"
+    )
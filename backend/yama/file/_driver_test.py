@@ -1,3 +1,6 @@
+import asyncio
+import os
+import time
 from pathlib import Path
 from uuid import UUID
 
@@ -5,20 +8,26 @@ import aiofiles
 import pytest
 
 from ._driver import (
+    DriverContentConflictError,
     DriverFileNotFoundError,
     DriverFileTooLargeError,
+    DriverUploadNotFoundError,
+    DriverUploadOffsetError,
+    DriverVersionNotFoundError,
+    DriverVersionPolicy,
     FileSystemDriver,
 )
+from ._stream import BytesReader
 
 
 async def test_file_system_driver_read_regular_content(*, tmp_path: Path) -> None:
     """Tests the FileSystemDriver.read_regular_content method."""
     file_system_dir = tmp_path / "file-system"
     driver = FileSystemDriver(file_system_dir=file_system_dir)
+    await driver.startup()
 
     # Case about reading an existing file.
 
-    file_system_dir.mkdir()
     async with aiofiles.open(
         file_system_dir / "42bd9c321c96485faf69b48536bc3c4a", "wb"
     ) as f:
@@ -31,6 +40,15 @@ async def test_file_system_driver_read_regular_content(*, tmp_path: Path) -> Non
 
     assert content == b"# Foo\n\nBar.\n"
 
+    # Case about reading a range.
+
+    async with driver.read_regular_content(
+        UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a"), offset=7, size=4
+    ) as f:
+        content = await f.read()
+
+    assert content == b"Bar."
+
     # Case about reading a missing file.
 
     with pytest.raises(DriverFileNotFoundError):
@@ -44,6 +62,7 @@ async def test_file_system_driver_write_regular_content(*, tmp_path: Path) -> No
     """Tests the FileSystemDriver.write_regular_content method."""
     file_system_dir = tmp_path / "file-system"
     driver = FileSystemDriver(file_system_dir=file_system_dir)
+    await driver.startup()
 
     # Case about writing a file.
 
@@ -80,15 +99,35 @@ async def test_file_system_driver_write_regular_content(*, tmp_path: Path) -> No
                 max_file_size=512,
             )
 
+    # Case about writing a file only while it has the expected tag.
+
+    id_ = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    tag = await driver.read_regular_content_tag(id_)
+    _ = await driver.write_regular_content(
+        BytesReader(b"# Bar\n"), id_, chunk_size=64, max_file_size=512
+    )
+
+    with pytest.raises(DriverContentConflictError):
+        _ = await driver.write_regular_content(
+            BytesReader(b"# Baz\n"),
+            id_,
+            chunk_size=64,
+            max_file_size=512,
+            expected_tag=tag,
+        )
+    async with driver.read_regular_content(id_) as f:
+        assert await f.read() == b"# Bar\n"
+    assert not list(file_system_dir.glob("*.incomplete"))
+
 
 async def test_file_system_driver_remove_regular_content(*, tmp_path: Path) -> None:
     """Tests the FileSystemDriver.remove_regular_content method."""
     file_system_dir = tmp_path / "file-system"
     driver = FileSystemDriver(file_system_dir=file_system_dir)
+    await driver.startup()
 
     # Case about removing an existing file.
 
-    file_system_dir.mkdir()
     async with aiofiles.open(
         file_system_dir / "42bd9c321c96485faf69b48536bc3c4a", "wb"
     ) as f:
@@ -104,3 +143,251 @@ async def test_file_system_driver_remove_regular_content(*, tmp_path: Path) -> N
         await driver.remove_regular_content(
             UUID("00bd9c32-1c96-485f-af69-b48536bc3c4a")
         )
+
+
+async def test_file_system_driver_versions(*, tmp_path: Path) -> None:
+    """Tests the FileSystemDriver's version methods."""
+    file_system_dir = tmp_path / "file-system"
+    driver = FileSystemDriver(
+        file_system_dir=file_system_dir,
+        version_policy=DriverVersionPolicy(
+            snapshot_interval=3,
+            max_count=5,
+            max_age_seconds=None,
+            max_delta_content_size=512,
+        ),
+    )
+    await driver.startup()
+    id_ = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+
+    # Case about reading versions kept by overwriting a file.
+
+    contents = [f"# Foo\n\nBar {i}.\n".encode() * (i + 1) for i in range(8)]
+    for content in contents:
+        content_file = tmp_path / "some-file.md"
+        async with aiofiles.open(content_file, "wb") as f:
+            _ = await f.write(content)
+        async with aiofiles.open(content_file, "rb") as f:
+            _ = await driver.write_regular_content(
+                f, id_, chunk_size=64, max_file_size=512
+            )
+
+    versions = await driver.read_regular_content_versions(id_)
+    assert [v.version for v in versions] == [3, 4, 5, 6, 7]
+    assert [v.size for v in versions] == [len(c) for c in contents[2:7]]
+
+    for v in versions:
+        async with driver.read_regular_content_version(id_, v.version) as f:
+            content = await f.read()
+        assert content == contents[v.version - 1]
+
+    # Case about reading a removed version.
+
+    with pytest.raises(DriverVersionNotFoundError):
+        async with driver.read_regular_content_version(id_, 2) as _:
+            assert False
+
+    # Case about removing a file with versions.
+
+    await driver.remove_regular_content(id_)
+
+    assert await driver.read_regular_content_versions(id_) == []
+
+
+async def test_file_system_driver_version_removal_by_age(*, tmp_path: Path) -> None:
+    """Tests removing the FileSystemDriver's versions by age."""
+    file_system_dir = tmp_path / "file-system"
+    driver = FileSystemDriver(
+        file_system_dir=file_system_dir,
+        version_policy=DriverVersionPolicy(
+            snapshot_interval=1,
+            max_count=5,
+            max_age_seconds=60,
+            max_delta_content_size=512,
+        ),
+    )
+    await driver.startup()
+    id_ = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+
+    async def write(content: bytes) -> None:
+        _ = await driver.write_regular_content(
+            BytesReader(content), id_, chunk_size=64, max_file_size=512
+        )
+
+    # Case about keeping a snapshot of a content older than the maximum age.
+
+    await write(b"# Foo\n")
+    old_mtime = time.time() - 120
+    os.utime(file_system_dir / id_.hex, (old_mtime, old_mtime))
+    await write(b"# Bar\n")
+
+    versions = await driver.read_regular_content_versions(id_)
+    assert [v.version for v in versions] == [1]
+    assert versions[0].created_at.timestamp() > old_mtime + 60
+
+    # Case about numbering versions after every version has been removed.
+
+    os.remove(file_system_dir / "versions" / id_.hex / "1.snapshot")
+    await write(b"# Baz\n")
+
+    versions = await driver.read_regular_content_versions(id_)
+    assert [v.version for v in versions] == [2]
+    async with driver.read_regular_content_version(id_, 2) as f:
+        assert await f.read() == b"# Bar\n"
+
+
+async def test_file_system_driver_upload(*, tmp_path: Path) -> None:
+    """Tests the FileSystemDriver's upload methods."""
+    file_system_dir = tmp_path / "file-system"
+    driver = FileSystemDriver(file_system_dir=file_system_dir)
+    await driver.startup()
+    user_id = UUID("6c2a8d1e-5d9b-4b0e-9c51-0b8f4c7e2a3d")
+
+    # Case about appending to an upload in multiple parts and committing it.
+
+    upload = await driver.create_upload(user_id=user_id, expire_seconds=60)
+    assert upload.offset == 0
+
+    for offset, part in [(0, b"# Foo\n\n"), (7, b"Bar.\n")]:
+        part_file = tmp_path / "some-part.md"
+        async with aiofiles.open(part_file, "wb") as f:
+            _ = await f.write(part)
+        async with aiofiles.open(part_file, "rb") as f:
+            _ = await driver.append_upload(
+                f,
+                upload.id,
+                user_id=user_id,
+                offset=offset,
+                chunk_size=4,
+                max_file_size=512,
+                expire_seconds=60,
+            )
+
+    upload = await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+    assert upload.offset == 12
+
+    file_size = await driver.commit_upload(
+        upload.id,
+        UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a"),
+        user_id=user_id,
+        expire_seconds=60,
+    )
+    assert file_size == 12
+
+    async with aiofiles.open(
+        file_system_dir / "42bd9c321c96485faf69b48536bc3c4a", "rb"
+    ) as f:
+        content = await f.read()
+    assert content == b"# Foo\n\nBar.\n"
+
+    with pytest.raises(DriverUploadNotFoundError):
+        _ = await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+
+    # Case about appending to an upload at a wrong offset.
+
+    upload = await driver.create_upload(user_id=user_id, expire_seconds=60)
+
+    with pytest.raises(DriverUploadOffsetError) as exc_info:
+        async with aiofiles.open(tmp_path / "some-part.md", "rb") as f:
+            _ = await driver.append_upload(
+                f,
+                upload.id,
+                user_id=user_id,
+                offset=3,
+                chunk_size=4,
+                max_file_size=512,
+                expire_seconds=60,
+            )
+    assert exc_info.value.offset == 0
+
+    # Case about accessing an upload owned by another user.
+
+    other_user_id = UUID("0d4b7f39-2e8a-4c61-a5f3-7e1c9b6d8a20")
+    with pytest.raises(DriverUploadNotFoundError):
+        _ = await driver.read_upload(
+            upload.id, user_id=other_user_id, expire_seconds=60
+        )
+    with pytest.raises(DriverUploadNotFoundError):
+        await driver.remove_upload(upload.id, user_id=other_user_id)
+
+    # Case about appending to an upload concurrently at the same offset.
+
+    async def append_at_0(part: bytes) -> None:
+        async with aiofiles.open(tmp_path / f"{part.decode()}.md", "wb") as f:
+            _ = await f.write(part)
+        async with aiofiles.open(tmp_path / f"{part.decode()}.md", "rb") as f:
+            _ = await driver.append_upload(
+                f,
+                upload.id,
+                user_id=user_id,
+                offset=0,
+                chunk_size=1,
+                max_file_size=512,
+                expire_seconds=60,
+            )
+
+    results = await asyncio.gather(
+        append_at_0(b"foo"), append_at_0(b"bar"), return_exceptions=True
+    )
+    assert sum(isinstance(r, DriverUploadOffsetError) for r in results) == 1
+    upload = await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+    assert upload.offset == 3
+
+    # Case about removing expired uploads.
+
+    assert await driver.remove_expired_uploads(expire_seconds=60) == 0
+    assert await driver.remove_expired_uploads(expire_seconds=0) == 1
+
+    with pytest.raises(DriverUploadNotFoundError):
+        _ = await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+
+
+async def test_file_system_driver_concurrent_writes(*, tmp_path: Path) -> None:
+    """Tests that concurrent writes of the same files lose or corrupt nothing."""
+    file_system_dir = tmp_path / "file-system"
+    driver = FileSystemDriver(
+        file_system_dir=file_system_dir,
+        version_policy=DriverVersionPolicy(
+            snapshot_interval=4,
+            max_count=64,
+            max_age_seconds=None,
+            max_delta_content_size=1024 * 1024,
+        ),
+    )
+    await driver.startup()
+
+    ids = [UUID(int=i) for i in range(4)]
+    writer_count = 16
+
+    def make_content(id_: UUID, writer: int) -> bytes:
+        return f"{id_} {writer}\n".encode() * (writer + 1) * 64
+
+    async def write(id_: UUID, writer: int) -> None:
+        _ = await driver.write_regular_content(
+            BytesReader(make_content(id_, writer)),
+            id_,
+            chunk_size=256,
+            max_file_size=1024 * 1024,
+        )
+
+    _ = await asyncio.gather(
+        *(write(id_, writer) for writer in range(writer_count) for id_ in ids)
+    )
+
+    for id_ in ids:
+        contents = {make_content(id_, writer) for writer in range(writer_count)}
+
+        # The content is one of the written ones and every other one is a version.
+        async with driver.read_regular_content(id_) as f:
+            content = await f.read()
+        assert content in contents
+
+        versions = await driver.read_regular_content_versions(id_)
+        assert len(versions) == writer_count - 1
+        version_contents = set()
+        for v in versions:
+            async with driver.read_regular_content_version(id_, v.version) as f:
+                version_contents.add(await f.read())
+        assert version_contents | {content} == contents
+
+    assert not list(file_system_dir.glob("*.incomplete"))
@@ -0,0 +1,159 @@
+import asyncio
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Literal, assert_never
+
+Durability = Literal["none", "fsync-file", "fsync-file-and-dir", "group-commit"]
+
+
+class Syncer:
+    """
+    Makes written files and renames durable according to the durability mode.
+
+    - "none" leaves flushing to the operating system. Files that have been renamed
+      into place may be empty or missing after a power loss.
+    - "fsync-file" syncs files before they are renamed into place, so a renamed file
+      is never empty, but the rename itself may be lost.
+    - "fsync-file-and-dir" also syncs the directory after the rename.
+    - "group-commit" syncs like "fsync-file-and-dir" but batches the syncs requested
+      by concurrent writes. A batch is synced while the next one is being collected
+      and a directory is synced once per batch however many renames it covers.
+    """
+
+    def __init__(
+        self,
+        durability: Durability,
+        /,
+        *,
+        executor: Executor | None = None,
+        group_commit_delay_seconds: float = 0,
+    ) -> None:
+        self.durability = durability
+        self.executor = executor
+        self.group_commit_delay_seconds = group_commit_delay_seconds
+
+        self._batch: list[tuple[int | Path, asyncio.Future[None]]] = []
+        self._batch_task: asyncio.Task[None] | None = None
+
+    async def sync_file(self, fd: int, /) -> None:
+        """
+        Syncs a file's data. The file must stay open until the sync is done.
+        """
+        match self.durability:
+            case "none":
+                ...
+            case "fsync-file" | "fsync-file-and-dir":
+                await self._run(os.fsync, fd)
+            case "group-commit":
+                await self._sync_in_batch(fd)
+            case _:
+                assert_never(self.durability)
+
+    async def sync_dir(self, path: Path, /) -> None:
+        """
+        Syncs a directory's entries after files have been renamed into it.
+        """
+        match self.durability:
+            case "none" | "fsync-file":
+                ...
+            case "fsync-file-and-dir":
+                await self._run(_sync_dir, path)
+            case "group-commit":
+                await self._sync_in_batch(path)
+            case _:
+                assert_never(self.durability)
+
+    async def _sync_in_batch(self, target: int | Path, /) -> None:
+        if isinstance(target, int):
+            # The batch syncs a duplicate of the file descriptor since the file may be
+            # closed before the batch is synced if the waiting write gets cancelled.
+            target = os.dup(target)
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((target, future))
+        if self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._sync_batches())
+        try:
+            # The batch is synced even if the waiting write gets cancelled.
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(_retrieve_exception)
+            raise
+
+    async def _sync_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._batch:
+                if self.group_commit_delay_seconds > 0:
+                    await asyncio.sleep(self.group_commit_delay_seconds)
+
+                batch, self._batch = self._batch, []
+                targets = [t for t, _ in batch]
+                errors: list[BaseException | None]
+                try:
+                    errors = await loop.run_in_executor(
+                        self.executor, _sync_batch, targets
+                    )
+                except Exception as e:
+                    errors = [e] * len(batch)
+                finally:
+                    for target in targets:
+                        if isinstance(target, int):
+                            os.close(target)
+
+                for (_, future), error in zip(batch, errors, strict=True):
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+        finally:
+            self._batch_task = None
+
+    async def _run(self, func: Callable[..., None], *args: object) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+
+def _sync_batch(targets: list[int | Path], /) -> list[BaseException | None]:
+    """
+    Syncs the targets and returns their errors, so that a failed sync fails only the
+    writes that requested it. A directory is synced once however many times it's
+    requested.
+    """
+    errors: list[BaseException | None] = []
+    dir_errors: dict[Path, OSError | None] = {}
+    for target in targets:
+        if isinstance(target, Path) and target in dir_errors:
+            errors.append(dir_errors[target])
+            continue
+
+        error: OSError | None = None
+        try:
+            if isinstance(target, int):
+                os.fsync(target)
+            else:
+                _sync_dir(target)
+        except OSError as e:
+            error = e
+
+        if isinstance(target, Path):
+            dir_errors[target] = error
+        errors.append(error)
+
+    return errors
+
+
+def _retrieve_exception(future: asyncio.Future[None], /) -> None:
+    # The exception of a future whose waiter has been cancelled would be logged as
+    # never retrieved otherwise.
+    if not future.cancelled():
+        _ = future.exception()
+
+
+def _sync_dir(path: Path, /) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+
+from ._driver import FileSystemDriver
+from ._durability import Durability, Syncer
+from ._stream import BytesReader
+
+
+@pytest.mark.parametrize(
+    "durability", ["none", "fsync-file", "fsync-file-and-dir", "group-commit"]
+)
+async def test_file_system_driver_durability(
+    *, durability: Durability, tmp_path: Path
+) -> None:
+    """Tests writing regular contents with every durability mode."""
+    driver = FileSystemDriver(
+        file_system_dir=tmp_path / "file-system", syncer=Syncer(durability)
+    )
+    await driver.startup()
+
+    ids = [UUID(int=i) for i in range(8)]
+    _ = await asyncio.gather(
+        *(
+            driver.write_regular_content(
+                BytesReader(f"# Foo {i}\n".encode()),
+                id_,
+                chunk_size=4,
+                max_file_size=512,
+            )
+            for i, id_ in enumerate(ids)
+        )
+    )
+
+    for i, id_ in enumerate(ids):
+        async with driver.read_regular_content(id_) as f:
+            assert await f.read() == f"# Foo {i}\n".encode()
+
+
+async def test_syncer_group_commit(
+    *, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that the group commit syncs a directory once per batch."""
+    synced_fds: list[int] = []
+    monkeypatch.setattr(os, "fsync", synced_fds.append)
+
+    syncer = Syncer("group-commit")
+    _ = await asyncio.gather(*(syncer.sync_dir(tmp_path) for _ in range(8)))
+
+    assert len(synced_fds) == 1
+
+
+async def test_syncer_group_commit_errors(*, tmp_path: Path) -> None:
+    """Tests that the group commit fails only the syncs that fail."""
+    syncer = Syncer("group-commit", group_commit_delay_seconds=0.05)
+
+    # Case about a file closed by a cancelled write before its batch is synced.
+
+    fd = os.open(tmp_path / "some-file.md", os.O_CREAT | os.O_WRONLY)
+    cancelled_task = asyncio.create_task(syncer.sync_file(fd))
+    await asyncio.sleep(0)
+    os.close(fd)
+    _ = cancelled_task.cancel()
+
+    # Case about a missing directory in the same batch.
+
+    results = await asyncio.gather(
+        syncer.sync_dir(tmp_path),
+        syncer.sync_dir(tmp_path / "missing"),
+        return_exceptions=True,
+    )
+    assert results[0] is None
+    assert isinstance(results[1], FileNotFoundError)
+    assert cancelled_task.cancelled()
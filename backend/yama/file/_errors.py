@@ -91,6 +91,30 @@ class FilePermissionError(FileFileError):
         return f'Permission denied for file at path "{self.descendant_path}" relative to {self.ancestor_id}.'
 
 
+class FileContentConflictError(FileFileError):
+    @property
+    @override
+    def name(self) -> str:
+        return "fileError.contentConflict"
+
+    @property
+    @override
+    def detail(self) -> str:
+        return f'Content of file at path "{self.descendant_path}" relative to {self.ancestor_id} does not match the base digest.'
+
+
+class FileInvalidPatchError(FileFileError):
+    @property
+    @override
+    def name(self) -> str:
+        return "fileError.invalidPatch"
+
+    @property
+    @override
+    def detail(self) -> str:
+        return f'Patch is invalid for file at path "{self.descendant_path}" relative to {self.ancestor_id}.'
+
+
 def _handle_file_file_error(_: Request, exc: FileFileError, /) -> JSONResponse:
     return JSONResponse(
         status_code=400, content={"name": exc.name, "detail": exc.detail}
@@ -0,0 +1,125 @@
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import assert_never
+
+from starlette.requests import Request
+
+from ._cache import CachingDriver, ContentCache
+from ._config import Config, FileSystemDriverConfig, S3DriverConfig
+from ._driver import Driver, DriverVersionPolicy, FileSystemDriver
+from ._durability import Syncer
+from ._s3 import S3Driver
+from ._tiered import TieredCache, TieredDriver
+
+
+@contextmanager
+def make_executor(*, config: Config) -> Iterator[Executor]:
+    """
+    Makes the thread pool that runs blocking file I/O so that it doesn't compete with
+    other blocking work for the event loop's default executor.
+    """
+    with ThreadPoolExecutor(
+        max_workers=config.io_thread_count, thread_name_prefix="yama-file-io"
+    ) as executor:
+        yield executor
+
+
+def make_content_cache(*, config: Config) -> ContentCache | None:
+    if config.content_cache_max_size <= 0:
+        return None
+    return ContentCache(
+        max_size=config.content_cache_max_size,
+        max_entry_size=config.content_cache_max_entry_size,
+        max_age_seconds=config.content_cache_max_age_seconds,
+    )
+
+
+def get_content_cache(*, request: Request) -> ContentCache | None:
+    """A lifetime dependency."""
+    return request.state.file_content_cache  # type: ignore[no-any-return]
+
+
+@asynccontextmanager
+async def make_tiered_cache(
+    *, config: Config, executor: Executor
+) -> AsyncIterator[TieredCache | None]:
+    if config.tiered_cache_dir is None:
+        yield None
+        return
+
+    cache = TieredCache(
+        cache_dir=config.tiered_cache_dir,
+        max_size=config.tiered_cache_max_size,
+        max_entry_size=config.tiered_cache_max_entry_size,
+        executor=executor,
+    )
+    await cache.startup()
+    try:
+        yield cache
+    finally:
+        await cache.shutdown()
+
+
+def get_tiered_cache(*, request: Request) -> TieredCache | None:
+    """A lifetime dependency."""
+    return request.state.file_tiered_cache  # type: ignore[no-any-return]
+
+
+@asynccontextmanager
+async def make_driver(
+    *,
+    config: Config,
+    executor: Executor,
+    content_cache: ContentCache | None,
+    tiered_cache: TieredCache | None,
+) -> AsyncIterator[Driver]:
+    driver = _make_driver(config=config, executor=executor)
+    if tiered_cache is not None:
+        driver = TieredDriver(driver, cache=tiered_cache, chunk_size=config.chunk_size)
+    if content_cache is not None:
+        driver = CachingDriver(driver, cache=content_cache)
+
+    await driver.startup()
+    try:
+        yield driver
+    finally:
+        await driver.shutdown()
+
+
+def get_driver(*, request: Request) -> Driver:
+    """A lifetime dependency."""
+    return request.state.file_driver  # type: ignore[no-any-return]
+
+
+def _make_driver(*, config: Config, executor: Executor) -> Driver:
+    match config.driver:
+        case FileSystemDriverConfig():
+            return FileSystemDriver(
+                file_system_dir=config.driver.file_system_dir,
+                version_policy=DriverVersionPolicy(
+                    snapshot_interval=config.driver.version_snapshot_interval,
+                    max_count=config.driver.version_max_count,
+                    max_age_seconds=config.driver.version_max_age_seconds,
+                    max_delta_content_size=config.driver.version_max_delta_content_size,
+                ),
+                executor=executor,
+                syncer=Syncer(
+                    config.driver.durability,
+                    executor=executor,
+                    group_commit_delay_seconds=config.driver.group_commit_delay_seconds,
+                ),
+            )
+        case S3DriverConfig():
+            return S3Driver(
+                endpoint_url=config.driver.endpoint_url,
+                bucket=config.driver.bucket,
+                region=config.driver.region,
+                access_key_id=config.driver.access_key_id,
+                secret_access_key=config.driver.secret_access_key,
+                key_prefix=config.driver.key_prefix,
+                part_size=config.driver.part_size,
+                connection_limit=config.driver.connection_limit,
+            )
+        case _:
+            assert_never(config.driver)
@@ -0,0 +1,33 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from uuid import UUID
+
+
+class LockManager:
+    """
+    Serializes tasks working on the same file while tasks working on distinct files
+    run in parallel.
+
+    A file's lock only exists while some task holds it or waits for it.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[UUID, tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def lock(self, id_: UUID, /) -> AsyncIterator[None]:
+        lock, user_count = self._locks.get(id_, (asyncio.Lock(), 0))
+        self._locks[id_] = (lock, user_count + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, user_count = self._locks[id_]
+            if user_count == 1:
+                del self._locks[id_]
+            else:
+                self._locks[id_] = (lock, user_count - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
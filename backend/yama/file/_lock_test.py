@@ -0,0 +1,28 @@
+import asyncio
+from uuid import UUID
+
+from ._lock import LockManager
+
+
+async def test_lock_manager() -> None:
+    """Tests that the LockManager serializes tasks per file only."""
+    locks = LockManager()
+    running: dict[UUID, int] = {}
+    max_running: dict[UUID, int] = {}
+    max_total_running = 0
+
+    async def work(id_: UUID) -> None:
+        nonlocal max_total_running
+        async with locks.lock(id_):
+            running[id_] = running.get(id_, 0) + 1
+            max_running[id_] = max(max_running.get(id_, 0), running[id_])
+            max_total_running = max(max_total_running, sum(running.values()))
+            await asyncio.sleep(0.01)
+            running[id_] -= 1
+
+    ids = [UUID(int=i) for i in range(4)]
+    _ = await asyncio.gather(*(work(id_) for id_ in ids * 4))
+
+    assert max_running == {id_: 1 for id_ in ids}
+    assert max_total_running == 4
+    assert len(locks) == 0
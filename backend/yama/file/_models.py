@@ -1,7 +1,8 @@
 from dataclasses import dataclass
+from datetime import datetime
 from enum import Enum
 from pathlib import PurePosixPath
-from typing import Annotated, Any, Literal, Protocol, TypeAlias
+from typing import Annotated, Any, Literal, TypeAlias
 from uuid import UUID
 
 from pydantic import (
@@ -11,19 +12,18 @@ from pydantic import (
     ValidatorFunctionWrapHandler,
     WrapValidator,
 )
+from sqlalchemy import Enum as SqlEnum
 from sqlalchemy import ForeignKey, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from yama import database
 
+from ._stream import AsyncReadable
+
 _MAX_FILE_NAME_LENGTH = 255
 _MAX_FILE_PATH_LENGTH = 4095
 
 
-class AsyncReadable(Protocol):
-    async def read(self, size: int = ..., /) -> bytes: ...
-
-
 def _check_file_name(name: str) -> str:
     assert len(name.encode()) <= _MAX_FILE_NAME_LENGTH, "File name is too long"
     assert name.isprintable(), "File name contains non-printable characters"
@@ -109,6 +109,28 @@ class Directory:
 File: TypeAlias = Regular | Directory
 
 
+@dataclass(frozen=True)
+class FileShareWrite:
+    path: FilePath
+    user_id: UUID
+    type: FileShareType
+
+
+@dataclass(frozen=True)
+class FileShare:
+    file_id: UUID
+    user_id: UUID
+    type: FileShareType
+
+
+@dataclass(frozen=True)
+class SharedFile:
+    path: FilePath
+    share_type: FileShareType
+    shared_at: datetime
+    file: File
+
+
 class RegularContentOut(BaseModel):
     url: str
 
@@ -137,15 +159,51 @@ class DirectoryOut(BaseModel):
 FileOut: TypeAlias = RegularOut | DirectoryOut
 
 
+class RegularVersionOut(BaseModel):
+    version: int
+    size: int
+    created_at: datetime
+    content: RegularContentOut
+
+
+class FileShareOut(BaseModel):
+    file_id: UUID
+    user_id: UUID
+    share_type: FileShareType
+
+
+class SharedFileOut(BaseModel):
+    path: FilePath
+    share_type: FileShareType
+    shared_at: datetime
+    file: FileOut
+
+
+class SharedFilesOut(BaseModel):
+    files: list[SharedFileOut]
+    next_cursor: str | None
+
+
+class UploadOut(BaseModel):
+    id: UUID
+    offset: int
+    expires_at: datetime
+
+
 @dataclass(frozen=True)
 class RegularContentWrite:
     stream: AsyncReadable
 
 
+@dataclass(frozen=True)
+class RegularContentUploadWrite:
+    upload_id: UUID
+
+
 @dataclass(frozen=True)
 class RegularWrite:
     type: Literal[FileType.REGULAR]
-    content: RegularContentWrite
+    content: RegularContentWrite | RegularContentUploadWrite
 
 
 @dataclass(frozen=True)
@@ -156,10 +214,25 @@ class DirectoryWrite:
 FileWrite: TypeAlias = RegularWrite | DirectoryWrite
 
 
-class _FileTypeDb(database.BaseTable):
-    __tablename__ = "file_types"
+@dataclass(frozen=True)
+class RegularContentEdit:
+    """
+    Replaces the base content's bytes from start to end (exclusive) with data.
+    """
+
+    start: int
+    end: int
+    data: bytes
 
-    type: Mapped[str] = mapped_column(primary_key=True)
+
+@dataclass(frozen=True)
+class RegularContentPatch:
+    """
+    Edits sorted by their positions in the base content which must have the digest.
+    """
+
+    base_digest: str
+    edits: list[RegularContentEdit]
 
 
 class _FileDb(database.BaseTable):
@@ -168,34 +241,49 @@ class _FileDb(database.BaseTable):
     id: Mapped[UUID] = mapped_column(
         server_default=func.uuid_generate_v4(), primary_key=True
     )
-    type: Mapped[str] = mapped_column(ForeignKey("file_types.type"))
+    type: Mapped[str] = mapped_column(
+        SqlEnum(*(t.value for t in FileType), name="file_type")
+    )
 
 
 class _FileAncestorFileDescendantDb(database.BaseTable):
     __tablename__ = "file_ancestors_file_descendants"
 
-    id: Mapped[UUID] = mapped_column(
-        server_default=func.uuid_generate_v4(), primary_key=True
+    ancestor_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"), primary_key=True)
+    descendant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("files.id"), primary_key=True
     )
-    ancestor_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"))
-    descendant_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"))
     descendant_path: Mapped[str]
     descendant_depth: Mapped[int]
 
 
-class _FileShareTypeDb(database.BaseTable):
-    __tablename__ = "file_share_types"
-
-    type: Mapped[str] = mapped_column(primary_key=True)
-
-
 class _FileShareDb(database.BaseTable):
     __tablename__ = "file_shares"
 
-    id: Mapped[UUID] = mapped_column(
-        server_default=func.uuid_generate_v4(), primary_key=True
+    file_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"), primary_key=True)
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    type: Mapped[str] = mapped_column(
+        SqlEnum(*(t.value for t in FileShareType), name="file_share_type"),
+        primary_key=True,
     )
-    type: Mapped[str] = mapped_column(ForeignKey("file_share_types.type"))
-    file_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"))
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
     created_by: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class _FileEffectiveShareDb(database.BaseTable):
+    """
+    The greatest share a user has on a file through shares to the user or to the
+    groups the user is in. It's maintained by database triggers.
+
+    shared_at is when the latest share created by someone else was created and it's
+    null if there's no such share.
+    """
+
+    __tablename__ = "file_effective_shares"
+
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    file_id: Mapped[UUID] = mapped_column(ForeignKey("files.id"), primary_key=True)
+    type: Mapped[str] = mapped_column(
+        SqlEnum(*(t.value for t in FileShareType), name="file_share_type")
+    )
+    shared_at: Mapped[datetime | None]
@@ -0,0 +1,93 @@
+import hashlib
+from collections.abc import AsyncIterator
+
+from ._models import RegularContentPatch
+from ._stream import AsyncIteratorReader, AsyncReadable
+
+
+class PatchError(Exception): ...
+
+
+class PatchDigestMismatchError(PatchError): ...
+
+
+def make_digest(content: bytes, /) -> str:
+    return "sha256:" + hashlib.sha256(content).hexdigest()
+
+
+def patch_content_stream(
+    base_stream: AsyncReadable,
+    patch: RegularContentPatch,
+    /,
+    *,
+    chunk_size: int,
+) -> AsyncReadable:
+    """
+    Returns a stream of the patched content.
+
+    The base content's digest is verified once the base stream is exhausted, so the
+    returned stream raises PatchDigestMismatchError as its last read instead of
+    signaling the end of the content. Consumers that write the content somewhere must
+    discard it in this case.
+    """
+    _check_patch(patch)
+    return AsyncIteratorReader(
+        _make_patched_chunks(base_stream, patch, chunk_size=chunk_size)
+    )
+
+
+def _check_patch(patch: RegularContentPatch, /) -> None:
+    position = 0
+    for edit in patch.edits:
+        if edit.start < position or edit.end < edit.start:
+            raise PatchError("Edits must be sorted and must not overlap")
+        position = edit.end
+
+
+async def _make_patched_chunks(
+    base_stream: AsyncReadable,
+    patch: RegularContentPatch,
+    /,
+    *,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    digest = hashlib.sha256()
+    position = 0
+
+    for edit in patch.edits:
+        async for chunk in _read_base(
+            base_stream, edit.start - position, chunk_size=chunk_size, digest=digest
+        ):
+            yield chunk
+        async for _ in _read_base(
+            base_stream, edit.end - edit.start, chunk_size=chunk_size, digest=digest
+        ):
+            ...
+        position = edit.end
+
+        yield edit.data
+
+    while chunk := await base_stream.read(chunk_size):
+        digest.update(chunk)
+        yield chunk
+
+    if "sha256:" + digest.hexdigest() != patch.base_digest:
+        raise PatchDigestMismatchError()
+
+
+async def _read_base(
+    base_stream: AsyncReadable,
+    size: int,
+    /,
+    *,
+    chunk_size: int,
+    digest: "hashlib._Hash",
+) -> AsyncIterator[bytes]:
+    while size > 0:
+        chunk = await base_stream.read(min(chunk_size, size))
+        if not chunk:
+            raise PatchError("Edit is out of the base content's bounds")
+
+        digest.update(chunk)
+        size -= len(chunk)
+        yield chunk
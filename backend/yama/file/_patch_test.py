@@ -0,0 +1,64 @@
+import pytest
+
+from ._models import RegularContentEdit, RegularContentPatch
+from ._patch import (
+    PatchDigestMismatchError,
+    PatchError,
+    make_digest,
+    patch_content_stream,
+)
+from ._stream import BytesReader
+
+
+async def test_patch_content_stream() -> None:
+    """Tests the patch_content_stream function."""
+    base = b"# Foo\n\nBar.\n"
+
+    # Case about applying edits to the base content.
+
+    patch = RegularContentPatch(
+        base_digest=make_digest(base),
+        edits=[
+            RegularContentEdit(start=2, end=5, data=b"Baz"),
+            RegularContentEdit(start=7, end=7, data=b"Qux "),
+            RegularContentEdit(start=10, end=11, data=b"!"),
+        ],
+    )
+    stream = patch_content_stream(BytesReader(base), patch, chunk_size=3)
+
+    assert await stream.read() == b"# Baz\n\nQux Bar!\n"
+
+    # Case about applying edits to a base content with another digest.
+
+    patch = RegularContentPatch(
+        base_digest=make_digest(b"# Foo\n"),
+        edits=[RegularContentEdit(start=2, end=5, data=b"Baz")],
+    )
+    stream = patch_content_stream(BytesReader(base), patch, chunk_size=3)
+
+    with pytest.raises(PatchDigestMismatchError):
+        _ = await stream.read()
+
+    # Case about applying edits out of the base content's bounds.
+
+    patch = RegularContentPatch(
+        base_digest=make_digest(base),
+        edits=[RegularContentEdit(start=10, end=20, data=b"")],
+    )
+    stream = patch_content_stream(BytesReader(base), patch, chunk_size=3)
+
+    with pytest.raises(PatchError):
+        _ = await stream.read()
+
+    # Case about applying overlapping edits.
+
+    patch = RegularContentPatch(
+        base_digest=make_digest(base),
+        edits=[
+            RegularContentEdit(start=2, end=5, data=b""),
+            RegularContentEdit(start=4, end=6, data=b""),
+        ],
+    )
+
+    with pytest.raises(PatchError):
+        _ = patch_content_stream(BytesReader(base), patch, chunk_size=3)
@@ -1,5 +1,10 @@
+import base64
+import binascii
+import functools
 import logging
 from collections.abc import AsyncIterator
+from contextlib import AbstractAsyncContextManager, AsyncExitStack
+from datetime import datetime
 from typing import Annotated, Literal, assert_never
 from uuid import UUID
 
@@ -17,31 +22,96 @@ from fastapi import (
     File as FastAPIFile,
 )
 from fastapi.responses import StreamingResponse
-from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.background import BackgroundTask
+from starlette.requests import Request
 
 from yama import database, user
 from yama.auth import get_current_user_id, get_current_user_id_or_none
 from yama.user import get_config as get_user_config
 
 from ._config import Config, get_config
-from ._driver import Driver, get_driver
+from ._driver import (
+    Driver,
+    DriverFileTooLargeError,
+    DriverUpload,
+    DriverUploadNotFoundError,
+    DriverUploadOffsetError,
+    DriverVersionNotFoundError,
+)
+from ._factory import get_driver
 from ._models import (
     Directory,
     DirectoryWrite,
     FileOut,
     FilePath,
+    FileShareOut,
     FileShareType,
+    FileShareWrite,
     FileType,
     FileWrite,
     Regular,
+    RegularContentEdit,
+    RegularContentPatch,
+    RegularContentUploadWrite,
     RegularContentWrite,
+    RegularVersionOut,
     RegularWrite,
+    SharedFileOut,
+    SharedFilesOut,
+    UploadOut,
+)
+from ._service import (
+    driver_version_to_regular_version_out,
+    file_to_file_out,
+    patch_file,
+    read_file,
+    read_shared_files,
+    remove_file,
+    revoke_files,
+    share_file,
+    share_files,
+    write_file,
 )
-from ._service import file_to_file_out, read_file, remove_file, share_file, write_file
+from ._stream import AsyncIteratorReader, AsyncReadable, PrefixedReader
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_OCTET_STREAM_MEDIA_TYPE = "application/octet-stream"
+_MIME_TYPE_SAMPLE_SIZE = 2048
+
+
+@functools.lru_cache(maxsize=1024)
+def _sample_to_mime_type(sample: bytes, /) -> str:
+    """
+    Determines the MIME type of content by its first bytes. Results are cached since
+    hot contents are sampled on every read.
+    """
+    return magic.from_buffer(sample, mime=True)
+
+
+def _is_octet_stream_request(request: Request, /) -> bool:
+    content_type = request.headers.get("content-type", "")
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type == _OCTET_STREAM_MEDIA_TYPE
+
+
+def _check_content_length(request: Request, /, *, max_file_size: int) -> None:
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        return
+
+    try:
+        size = int(content_length)
+    except ValueError:
+        raise HTTPException(400, "Content-Length header must be an integer.")
+
+    if size > max_file_size:
+        raise HTTPException(
+            413, f"Content must not be larger than {max_file_size} bytes."
+        )
+
 
 @router.get(
     "/files/{path:path}",
@@ -53,30 +123,51 @@ async def _read_file(
     *,
     path: FilePath,
     content: Annotated[bool, Query()] = False,
+    version: Annotated[int | None, Query(ge=1)] = None,
     working_file_id: Annotated[UUID | None, Query()] = None,
     user_id: Annotated[UUID | None, Depends(get_current_user_id_or_none)],
     config: Annotated[Config, Depends(get_config)],
     user_config: Annotated[user.Config, Depends(get_user_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    engine: Annotated[AsyncEngine, Depends(database.get_read_engine)],
     driver: Annotated[Driver, Depends(get_driver)],
 ) -> FileOut | StreamingResponse:
-    if content:
-        file = await read_file(
-            path,
-            max_depth=0,
-            user_id=user_id or user_config.public_user_id,
-            working_file_id=working_file_id or config.root_file_id,
-            config=config,
-            connection=connection,
+    if version is not None and not content:
+        raise HTTPException(
+            400, "version query parameter is allowed only with content query parameter."
         )
+
+    if content:
+        # The connection is returned to the pool before the content is streamed, so
+        # slow downloads don't hold connections.
+        async with database.connect_read_only(engine) as connection:
+            file = await read_file(
+                path,
+                max_depth=0,
+                user_id=user_id or user_config.public_user_id,
+                working_file_id=working_file_id or config.root_file_id,
+                config=config,
+                connection=connection,
+            )
         match file:
             case Regular(id=id_):
-                # TODO: Optimization opportunity: use the first chunk
-                async with driver.read_regular_content(id_) as f:
-                    sample = await f.read(2048)
+
+                def open_content() -> AbstractAsyncContextManager[AsyncReadable]:
+                    if version is None:
+                        return driver.read_regular_content(id_)
+                    return driver.read_regular_content_version(id_, version)
+
+                # The content is opened once, building a version only once too, and
+                # the sample for the MIME type is streamed back in front of it.
+                async with AsyncExitStack() as stack:
+                    try:
+                        f = await stack.enter_async_context(open_content())
+                    except DriverVersionNotFoundError:
+                        raise HTTPException(400, "Version not found.")
+                    sample = await f.read(_MIME_TYPE_SAMPLE_SIZE)
+                    content_stack = stack.pop_all()
 
                 try:
-                    mime_type = magic.from_buffer(sample, mime=True)
+                    mime_type = _sample_to_mime_type(sample)
                 except Exception as e:
                     logger.warning(
                         "Failed to determine MIME type for file %s: %s", id_, e
@@ -84,17 +175,26 @@ async def _read_file(
                     mime_type = "application/octet-stream"
 
                 async def content_stream() -> AsyncIterator[bytes]:
-                    async with driver.read_regular_content(id_) as f:
+                    try:
+                        content_f = PrefixedReader(sample, f)
                         file_size = 0
-                        while chunk := await f.read(
+                        while chunk := await content_f.read(
                             min(config.chunk_size, config.max_file_size - file_size)
                         ):
                             yield chunk
                             file_size += len(chunk)
                             if file_size >= config.max_file_size:
                                 break
+                    finally:
+                        await content_stack.aclose()
 
-                return StreamingResponse(content_stream(), media_type=mime_type)
+                # The background task closes the content also if the response is
+                # never streamed, closing it twice does nothing.
+                return StreamingResponse(
+                    content_stream(),
+                    media_type=mime_type,
+                    background=BackgroundTask(content_stack.aclose),
+                )
             case Directory():
                 raise HTTPException(
                     400,
@@ -103,61 +203,207 @@ async def _read_file(
             case _:
                 assert_never(file)
 
+    async with database.connect_read_only(engine) as connection:
+        file = await read_file(
+            path,
+            max_depth=1,
+            user_id=user_id or user_config.public_user_id,
+            working_file_id=working_file_id or config.root_file_id,
+            config=config,
+            connection=connection,
+        )
+    file_out = file_to_file_out(file, max_depth=1, config=config)
+    return file_out
+
+
+@router.get(
+    "/file-versions/{path:path}",
+    description="Read previous versions of regular file's content from the oldest to the newest.",
+)
+async def _read_file_versions(
+    *,
+    path: FilePath,
+    working_file_id: Annotated[UUID | None, Query()] = None,
+    user_id: Annotated[UUID | None, Depends(get_current_user_id_or_none)],
+    config: Annotated[Config, Depends(get_config)],
+    user_config: Annotated[user.Config, Depends(get_user_config)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> list[RegularVersionOut]:
+    connection = await lazy_connection.get()
     file = await read_file(
         path,
-        max_depth=1,
+        max_depth=0,
         user_id=user_id or user_config.public_user_id,
         working_file_id=working_file_id or config.root_file_id,
         config=config,
         connection=connection,
     )
-    file_out = file_to_file_out(file, max_depth=1, config=config)
-    return file_out
+    match file:
+        case Regular(id=id_):
+            versions = await driver.read_regular_content_versions(id_)
+            return [
+                driver_version_to_regular_version_out(id_, v, config=config)
+                for v in versions
+            ]
+        case Directory():
+            raise HTTPException(400, "Directories don't have versions.")
+        case _:
+            assert_never(file)
 
 
-@router.put("/files/{path:path}", description="Create or update file.")
+@router.put(
+    "/files/{path:path}",
+    description="Create or update file. Content of a regular file can be sent either as a multipart form, as a raw application/octet-stream body or as an upload to commit via the upload_id query parameter.",
+    openapi_extra={
+        "requestBody": {
+            "content": {_OCTET_STREAM_MEDIA_TYPE: {"schema": {"format": "binary"}}}
+        }
+    },
+)
 async def _create_or_update_file(
     *,
     path: FilePath,
     working_file_id: Annotated[UUID | None, Query()] = None,
     exist_ok: Annotated[bool, Query()] = True,
-    type: Annotated[FileType, Form()],
+    upload_id: Annotated[UUID | None, Query()] = None,
+    type: Annotated[FileType | None, Form()] = None,
     content: Annotated[UploadFile | None, FastAPIFile()] = None,
+    request: Request,
     user_id: Annotated[UUID | None, Depends(get_current_user_id_or_none)],
     config: Annotated[Config, Depends(get_config)],
     user_config: Annotated[user.Config, Depends(get_user_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    engine: Annotated[AsyncEngine, Depends(database.get_engine)],
     driver: Annotated[Driver, Depends(get_driver)],
 ) -> FileOut:
     file_write: FileWrite
-    match type:
-        case FileType.REGULAR:
-            if content is None:
-                raise HTTPException(
-                    400, "content form parameter must be provided for regular files."
-                )
-            file_write = RegularWrite(
-                type=type, content=RegularContentWrite(stream=content)
+    if upload_id is not None:
+        if type is not None or content is not None:
+            raise HTTPException(
+                400,
+                "type and content form parameters cannot be provided with upload_id.",
             )
-        case FileType.DIRECTORY:
-            if content is not None:
-                raise HTTPException(
-                    400, "content form parameter cannot be provided for directories."
+        # Uploads belong to the users who created them, so there is no upload to
+        # commit for an anonymous request.
+        if user_id is None:
+            raise HTTPException(401, "Uploads can only be committed by their owners.")
+        file_write = RegularWrite(
+            type=FileType.REGULAR,
+            content=RegularContentUploadWrite(upload_id=upload_id),
+        )
+    elif _is_octet_stream_request(request):
+        # The body is the regular file's content itself, so it is streamed straight
+        # into the driver instead of being spooled by the multipart parser.
+        _check_content_length(request, max_file_size=config.max_file_size)
+        file_write = RegularWrite(
+            type=FileType.REGULAR,
+            content=RegularContentWrite(stream=AsyncIteratorReader(request.stream())),
+        )
+    else:
+        match type:
+            case FileType.REGULAR:
+                if content is None:
+                    raise HTTPException(
+                        400,
+                        "content form parameter must be provided for regular files.",
+                    )
+                file_write = RegularWrite(
+                    type=type, content=RegularContentWrite(stream=content)
                 )
-            file_write = DirectoryWrite(type=type)
-        case _:
-            assert_never(type)
+            case FileType.DIRECTORY:
+                if content is not None:
+                    raise HTTPException(
+                        400,
+                        "content form parameter cannot be provided for directories.",
+                    )
+                file_write = DirectoryWrite(type=type)
+            case None:
+                raise HTTPException(400, "type form parameter must be provided.")
+            case _:
+                assert_never(type)
 
-    file = await write_file(
-        file_write,
-        path,
-        exist_ok=exist_ok,
-        user_id=user_id or user_config.public_user_id,
-        working_file_id=working_file_id or config.root_file_id,
-        config=config,
-        connection=connection,
-        driver=driver,
+    try:
+        file = await write_file(
+            file_write,
+            path,
+            exist_ok=exist_ok,
+            user_id=user_id or user_config.public_user_id,
+            working_file_id=working_file_id or config.root_file_id,
+            config=config,
+            engine=engine,
+            driver=driver,
+        )
+    except DriverFileTooLargeError:
+        raise HTTPException(
+            413, f"Content must not be larger than {config.max_file_size} bytes."
+        )
+    except DriverUploadNotFoundError:
+        raise HTTPException(400, "Upload not found.")
+    file_out = file_to_file_out(file, max_depth=0, config=config)
+    return file_out
+
+
+class RegularContentEditIn(pydantic.BaseModel):
+    start: Annotated[int, pydantic.Field(ge=0)]
+    end: Annotated[int, pydantic.Field(ge=0)]
+    text: str | None = None
+    data: pydantic.Base64Bytes | None = None
+
+    @pydantic.model_validator(mode="after")
+    def _check_text_and_data(self) -> "RegularContentEditIn":
+        if self.text is not None and self.data is not None:
+            raise ValueError("text and data cannot be provided together")
+        return self
+
+
+class RegularContentPatchIn(pydantic.BaseModel):
+    base_digest: Annotated[str, pydantic.Field(pattern=r"^sha256:[0-9a-f]{64}$")]
+    edits: list[RegularContentEditIn]
+
+
+@router.patch(
+    "/files/{path:path}",
+    description="Patch regular file's content. Edits replace byte ranges of the content whose digest is base_digest with either UTF-8 encoded text or base64 encoded data.",
+)
+async def _patch_file(
+    *,
+    path: FilePath,
+    patch: RegularContentPatchIn,
+    working_file_id: Annotated[UUID | None, Query()] = None,
+    user_id: Annotated[UUID | None, Depends(get_current_user_id_or_none)],
+    config: Annotated[Config, Depends(get_config)],
+    user_config: Annotated[user.Config, Depends(get_user_config)],
+    engine: Annotated[AsyncEngine, Depends(database.get_engine)],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> FileOut:
+    regular_content_patch = RegularContentPatch(
+        base_digest=patch.base_digest,
+        edits=[
+            RegularContentEdit(
+                start=e.start,
+                end=e.end,
+                data=e.text.encode() if e.text is not None else e.data or b"",
+            )
+            for e in patch.edits
+        ],
     )
+
+    try:
+        file = await patch_file(
+            regular_content_patch,
+            path,
+            user_id=user_id or user_config.public_user_id,
+            working_file_id=working_file_id or config.root_file_id,
+            config=config,
+            engine=engine,
+            driver=driver,
+        )
+    except DriverFileTooLargeError:
+        raise HTTPException(
+            413, f"Content must not be larger than {config.max_file_size} bytes."
+        )
     file_out = file_to_file_out(file, max_depth=0, config=config)
     return file_out
 
@@ -169,9 +415,12 @@ async def _delete_file(
     working_file_id: Annotated[UUID | None, Query()] = None,
     user_id: Annotated[UUID, Depends(get_current_user_id)],
     config: Annotated[Config, Depends(get_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
     driver: Annotated[Driver, Depends(get_driver)],
 ) -> FileOut:
+    connection = await lazy_connection.get()
     file = await remove_file(
         path,
         user_id=user_id,
@@ -198,8 +447,11 @@ async def _action_file(
     working_file_id: Annotated[UUID | None, Query()] = None,
     user_id: Annotated[UUID, Depends(get_current_user_id)],
     config: Annotated[Config, Depends(get_config)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
 ) -> FileOut:
+    connection = await lazy_connection.get()
     assert action.type == "share"
     file = await share_file(
         path,
@@ -212,3 +464,214 @@ async def _action_file(
     )
     file_out = file_to_file_out(file, max_depth=0, config=config)
     return file_out
+
+
+class FileShareIn(pydantic.BaseModel):
+    path: FilePath
+    user_id: UUID
+    share_type: FileShareType
+
+
+class ShareFilesActionIn(pydantic.BaseModel):
+    type: Literal["share"]
+    shares: list[FileShareIn]
+
+
+class RevokeFilesActionIn(pydantic.BaseModel):
+    type: Literal["revoke"]
+    shares: list[FileShareIn]
+
+
+@router.post(
+    "/file-shares",
+    description="Share or revoke many files in one transaction. Shares implied by existing or other requested shares are skipped. Revoking removes the user's shares of the type and the stronger types from the file and its descendants. Returns the added or removed shares.",
+)
+async def _action_file_shares(
+    *,
+    action: Annotated[
+        ShareFilesActionIn | RevokeFilesActionIn,
+        pydantic.Field(discriminator="type"),
+    ],
+    working_file_id: Annotated[UUID | None, Query()] = None,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    config: Annotated[Config, Depends(get_config)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
+) -> list[FileShareOut]:
+    if not action.shares:
+        return []
+
+    connection = await lazy_connection.get()
+    file_share_writes = [
+        FileShareWrite(path=s.path, user_id=s.user_id, type=s.share_type)
+        for s in action.shares
+    ]
+    match action:
+        case ShareFilesActionIn():
+            write_file_shares = share_files
+        case RevokeFilesActionIn():
+            write_file_shares = revoke_files
+        case _:
+            assert_never(action)
+    file_shares = await write_file_shares(
+        file_share_writes,
+        from_user_id=user_id,
+        working_file_id=working_file_id or config.root_file_id,
+        config=config,
+        connection=connection,
+    )
+    return [
+        FileShareOut(file_id=s.file_id, user_id=s.user_id, share_type=s.type)
+        for s in file_shares
+    ]
+
+
+@router.get(
+    "/shared-files",
+    description="Read files shared with the current user by others, directly or through groups, from the most recently shared. Pass the response's next_cursor as the cursor query parameter to read the next page.",
+)
+async def _read_shared_files(
+    *,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    cursor: Annotated[str | None, Query()] = None,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    config: Annotated[Config, Depends(get_config)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
+) -> SharedFilesOut:
+    after = _decode_shared_files_cursor(cursor) if cursor is not None else None
+    connection = await lazy_connection.get()
+    shared_files = await read_shared_files(
+        limit=limit, after=after, user_id=user_id, config=config, connection=connection
+    )
+    return SharedFilesOut(
+        files=[
+            SharedFileOut(
+                path=str(f.path),
+                share_type=f.share_type,
+                shared_at=f.shared_at,
+                file=file_to_file_out(f.file, max_depth=0, config=config),
+            )
+            for f in shared_files
+        ],
+        next_cursor=(
+            _encode_shared_files_cursor(
+                shared_files[-1].shared_at, shared_files[-1].file.id
+            )
+            if len(shared_files) == limit
+            else None
+        ),
+    )
+
+
+def _encode_shared_files_cursor(shared_at: datetime, file_id: UUID, /) -> str:
+    return base64.urlsafe_b64encode(
+        f"{shared_at.isoformat()}|{file_id}".encode()
+    ).decode()
+
+
+def _decode_shared_files_cursor(cursor: str, /) -> tuple[datetime, UUID]:
+    try:
+        shared_at, file_id = base64.urlsafe_b64decode(cursor).decode().split("|")
+        return datetime.fromisoformat(shared_at), UUID(file_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(400, "Invalid cursor.")
+
+
+@router.post(
+    "/uploads",
+    description="Create upload. Its content can be appended in multiple requests and then committed to a file with the upload_id query parameter of the file's PUT request.",
+)
+async def _create_upload(
+    *,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    config: Annotated[Config, Depends(get_config)],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> UploadOut:
+    _ = await driver.remove_expired_uploads(expire_seconds=config.upload_expire_seconds)
+    upload = await driver.create_upload(
+        user_id=user_id, expire_seconds=config.upload_expire_seconds
+    )
+    return _driver_upload_to_upload_out(upload)
+
+
+@router.get("/uploads/{upload_id}", description="Read upload's progress.")
+async def _read_upload(
+    *,
+    upload_id: UUID,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    config: Annotated[Config, Depends(get_config)],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> UploadOut:
+    try:
+        upload = await driver.read_upload(
+            upload_id, user_id=user_id, expire_seconds=config.upload_expire_seconds
+        )
+    except DriverUploadNotFoundError:
+        raise HTTPException(400, "Upload not found.")
+    return _driver_upload_to_upload_out(upload)
+
+
+@router.patch(
+    "/uploads/{upload_id}",
+    description="Append raw application/octet-stream body to upload at offset. The offset must be equal to the upload's current offset.",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {_OCTET_STREAM_MEDIA_TYPE: {"schema": {"format": "binary"}}},
+        }
+    },
+)
+async def _append_upload(
+    *,
+    upload_id: UUID,
+    offset: Annotated[int, Query(ge=0)],
+    request: Request,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    config: Annotated[Config, Depends(get_config)],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> UploadOut:
+    if not _is_octet_stream_request(request):
+        raise HTTPException(
+            415, f"Content-Type header must be {_OCTET_STREAM_MEDIA_TYPE}."
+        )
+    _check_content_length(request, max_file_size=max(config.max_file_size - offset, 0))
+
+    try:
+        upload = await driver.append_upload(
+            AsyncIteratorReader(request.stream()),
+            upload_id,
+            user_id=user_id,
+            offset=offset,
+            chunk_size=config.chunk_size,
+            max_file_size=config.max_file_size,
+            expire_seconds=config.upload_expire_seconds,
+        )
+    except DriverUploadNotFoundError:
+        raise HTTPException(400, "Upload not found.")
+    except DriverUploadOffsetError as e:
+        raise HTTPException(409, f"Upload offset must be {e.offset}.")
+    except DriverFileTooLargeError:
+        raise HTTPException(
+            413, f"Content must not be larger than {config.max_file_size} bytes."
+        )
+    return _driver_upload_to_upload_out(upload)
+
+
+@router.delete("/uploads/{upload_id}", description="Delete upload.")
+async def _delete_upload(
+    *,
+    upload_id: UUID,
+    user_id: Annotated[UUID, Depends(get_current_user_id)],
+    driver: Annotated[Driver, Depends(get_driver)],
+) -> None:
+    try:
+        await driver.remove_upload(upload_id, user_id=user_id)
+    except DriverUploadNotFoundError:
+        raise HTTPException(400, "Upload not found.")
+
+
+def _driver_upload_to_upload_out(upload: DriverUpload, /) -> UploadOut:
+    return UploadOut(id=upload.id, offset=upload.offset, expires_at=upload.expires_at)
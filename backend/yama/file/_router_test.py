@@ -0,0 +1,338 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePosixPath
+from typing import Any
+from uuid import UUID
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from yama import auth, database, user
+
+from . import _router
+from ._config import Config, FileSystemDriverConfig, get_config
+from ._driver import DriverVersionPolicy, FileSystemDriver
+from ._factory import get_driver
+from ._models import (
+    FileShareType,
+    FileType,
+    FileWrite,
+    Regular,
+    RegularContentWrite,
+    RegularWrite,
+    SharedFile,
+)
+from ._stream import AsyncReadable, BytesReader
+
+_FILE_ID = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+
+
+class _Connection:
+    async def execution_options(self, **_: object) -> "_Connection":
+        return self
+
+
+class _CountingEngine:
+    """
+    Stands in for an AsyncEngine and counts the checked out connections.
+    """
+
+    def __init__(self) -> None:
+        self.checked_out = 0
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[_Connection]:
+        self.checked_out += 1
+        try:
+            yield _Connection()
+        finally:
+            self.checked_out -= 1
+
+
+class _SlowDriver(FileSystemDriver):
+    """
+    Reads contents slowly and records the checked out connections while reading.
+    """
+
+    def __init__(self, /, *, file_system_dir: Path, engine: _CountingEngine) -> None:
+        super().__init__(file_system_dir=file_system_dir)
+        self.engine = engine
+        self.checked_out_while_reading: list[int] = []
+
+    @asynccontextmanager
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        async with super().read_regular_content(id_, offset=offset, size=size) as f:
+            yield _SlowReader(f, driver=self)
+
+
+class _SlowReader:
+    def __init__(self, stream: AsyncReadable, /, *, driver: _SlowDriver) -> None:
+        self._stream = stream
+        self._driver = driver
+
+    async def read(self, size: int = -1, /) -> bytes:
+        await asyncio.sleep(0.001)
+        self._driver.checked_out_while_reading.append(self._driver.engine.checked_out)
+        return await self._stream.read(size)
+
+
+async def test_read_file_content_releases_connection(
+    *, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that no connection is held while a file's content is streamed."""
+    engine = _CountingEngine()
+    driver = _SlowDriver(file_system_dir=tmp_path / "file-system", engine=engine)
+    await driver.startup()
+    _ = await driver.write_regular_content(
+        BytesReader(b"# Foo\n\nBar.\n" * 64),
+        _FILE_ID,
+        chunk_size=64,
+        max_file_size=1024,
+    )
+
+    async def read_file(*args: Any, **kwargs: Any) -> Regular:
+        assert engine.checked_out == 1
+        return Regular(id=_FILE_ID, type=FileType.REGULAR)
+
+    monkeypatch.setattr(_router, "read_file", read_file)
+
+    config = Config(
+        chunk_size=16,
+        files_base_url="http://localhost/files",
+        root_file_id=UUID(int=1),
+        driver=FileSystemDriverConfig(
+            type="file-system", file_system_dir=tmp_path / "file-system"
+        ),
+    )
+    app = FastAPI()
+    app.include_router(_router.router)
+    app.dependency_overrides[get_config] = lambda: config
+    app.dependency_overrides[user.get_config] = lambda: user.Config(
+        public_user_id=UUID(int=2), root_user_id=UUID(int=3)
+    )
+    app.dependency_overrides[auth.get_current_user_id_or_none] = lambda: None
+    app.dependency_overrides[database.get_read_engine] = lambda: engine
+    app.dependency_overrides[get_driver] = lambda: driver
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        response = await client.get("/files/foo.md", params={"content": True})
+
+    assert response.status_code == 200
+    assert response.content == b"# Foo\n\nBar.\n" * 64
+    assert len(driver.checked_out_while_reading) > 1
+    assert set(driver.checked_out_while_reading) == {0}
+
+
+class _CountingVersionDriver(FileSystemDriver):
+    """
+    Counts how many times versions are opened.
+    """
+
+    def __init__(self, /, *, file_system_dir: Path) -> None:
+        super().__init__(
+            file_system_dir=file_system_dir,
+            version_policy=DriverVersionPolicy(
+                snapshot_interval=16,
+                max_count=8,
+                max_age_seconds=None,
+                max_delta_content_size=1024,
+            ),
+        )
+        self.version_open_count = 0
+
+    @asynccontextmanager
+    async def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]:
+        self.version_open_count += 1
+        async with super().read_regular_content_version(id_, version) as f:
+            yield f
+
+
+async def test_read_file_version_content(
+    *, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that a version's content is built once per download."""
+    driver = _CountingVersionDriver(file_system_dir=tmp_path / "file-system")
+    await driver.startup()
+    for content in [b"# Foo\n\nBar.\n" * 64, b"# Foo\n\nBaz.\n" * 64]:
+        _ = await driver.write_regular_content(
+            BytesReader(content), _FILE_ID, chunk_size=64, max_file_size=1024
+        )
+
+    async def read_file(*args: Any, **kwargs: Any) -> Regular:
+        return Regular(id=_FILE_ID, type=FileType.REGULAR)
+
+    monkeypatch.setattr(_router, "read_file", read_file)
+
+    app = FastAPI()
+    app.include_router(_router.router)
+    app.dependency_overrides[get_config] = lambda: Config(
+        chunk_size=16,
+        files_base_url="http://localhost/files",
+        root_file_id=UUID(int=1),
+        driver=FileSystemDriverConfig(
+            type="file-system", file_system_dir=tmp_path / "file-system"
+        ),
+    )
+    app.dependency_overrides[user.get_config] = lambda: user.Config(
+        public_user_id=UUID(int=2), root_user_id=UUID(int=3)
+    )
+    app.dependency_overrides[auth.get_current_user_id_or_none] = lambda: None
+    app.dependency_overrides[database.get_read_engine] = lambda: _CountingEngine()
+    app.dependency_overrides[get_driver] = lambda: driver
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        # Case about downloading a version.
+
+        response = await client.get(
+            "/files/foo.md", params={"content": True, "version": 1}
+        )
+        assert response.status_code == 200
+        assert response.content == b"# Foo\n\nBar.\n" * 64
+        assert response.headers["content-type"].startswith("text/")
+        assert driver.version_open_count == 1
+
+        # Case about downloading a missing version.
+
+        response = await client.get(
+            "/files/foo.md", params={"content": True, "version": 2}
+        )
+        assert response.status_code == 400
+
+
+async def test_read_shared_files_pages(
+    *, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests paging through shared files with cursors."""
+    shared_files = [
+        SharedFile(
+            path=PurePosixPath(f"/foo-{i}.md"),
+            share_type=FileShareType.READ,
+            shared_at=datetime(2024, 1, 1, tzinfo=timezone.utc) - timedelta(days=i),
+            file=Regular(id=UUID(int=i), type=FileType.REGULAR),
+        )
+        for i in range(3)
+    ]
+
+    async def read_shared_files(
+        *, limit: int, after: tuple[datetime, UUID] | None, **kwargs: Any
+    ) -> list[SharedFile]:
+        start = 0 if after is None else after[1].int + 1
+        return shared_files[start : start + limit]
+
+    monkeypatch.setattr(_router, "read_shared_files", read_shared_files)
+
+    app = FastAPI()
+    app.include_router(_router.router)
+    app.dependency_overrides[get_config] = lambda: Config(
+        files_base_url="http://localhost/files",
+        root_file_id=UUID(int=1),
+        driver=FileSystemDriverConfig(type="file-system", file_system_dir=tmp_path),
+    )
+    app.dependency_overrides[auth.get_current_user_id] = lambda: UUID(int=2)
+    app.dependency_overrides[database.get_read_only_lazy_connection] = lambda: (
+        database.LazyConnection(_CountingEngine())  # type: ignore[arg-type]
+    )
+
+    paths: list[str] = []
+    cursor = None
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        for _ in range(2):
+            params: dict[str, Any] = {"limit": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = await client.get("/shared-files", params=params)
+            assert response.status_code == 200
+            paths.extend(f["path"] for f in response.json()["files"])
+            cursor = response.json()["next_cursor"]
+
+        response = await client.get("/shared-files", params={"cursor": "foo"})
+        assert response.status_code == 400
+
+    assert paths == ["/foo-0.md", "/foo-1.md", "/foo-2.md"]
+    assert cursor is None
+
+
+async def test_write_file_octet_stream(
+    *, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests writing a regular file's content as a raw application/octet-stream body."""
+    written: list[bytes] = []
+
+    async def write_file(file_write: FileWrite, *args: Any, **kwargs: Any) -> Regular:
+        assert isinstance(file_write, RegularWrite)
+        assert isinstance(file_write.content, RegularContentWrite)
+        written.append(await file_write.content.stream.read())
+        return Regular(id=_FILE_ID, type=FileType.REGULAR)
+
+    monkeypatch.setattr(_router, "write_file", write_file)
+
+    app = FastAPI()
+    app.include_router(_router.router)
+    app.dependency_overrides[get_config] = lambda: Config(
+        max_file_size=1024,
+        files_base_url="http://localhost/files",
+        root_file_id=UUID(int=1),
+        driver=FileSystemDriverConfig(type="file-system", file_system_dir=tmp_path),
+    )
+    app.dependency_overrides[user.get_config] = lambda: user.Config(
+        public_user_id=UUID(int=2), root_user_id=UUID(int=3)
+    )
+    app.dependency_overrides[auth.get_current_user_id_or_none] = lambda: None
+    app.dependency_overrides[auth.get_current_user_id] = lambda: UUID(int=2)
+    app.dependency_overrides[database.get_engine] = lambda: None
+    app.dependency_overrides[get_driver] = lambda: None
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://localhost"
+    ) as client:
+        # Case about writing a raw body.
+
+        response = await client.put(
+            "/files/foo.md",
+            content=b"# Foo\n\nBar.\n",
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == str(_FILE_ID)
+        assert written == [b"# Foo\n\nBar.\n"]
+
+        # Case about writing a raw body that is too large.
+
+        response = await client.put(
+            "/files/foo.md",
+            content=b"x" * 1025,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        assert response.status_code == 413
+        assert len(written) == 1
+
+        # Case about appending to an upload with another media type.
+
+        response = await client.patch(
+            f"/uploads/{UUID(int=4)}",
+            params={"offset": 0},
+            content=b"# Foo\n",
+            headers={"Content-Type": "text/plain"},
+        )
+        assert response.status_code == 415
+
+        # Case about committing an upload without authentication.
+
+        response = await client.put(
+            "/files/foo.md", params={"upload_id": str(UUID(int=4))}
+        )
+        assert response.status_code == 401
+        assert len(written) == 1
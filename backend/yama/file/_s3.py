@@ -0,0 +1,697 @@
+import hashlib
+import hmac
+import time
+import xml.etree.ElementTree as ET
+from collections.abc import AsyncIterator, Iterable, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from urllib.parse import quote
+from uuid import UUID, uuid4
+
+import aiohttp
+from typing_extensions import override
+from yarl import URL
+
+from ._driver import (
+    Driver,
+    DriverContentConflictError,
+    DriverFileError,
+    DriverFileNotFoundError,
+    DriverFileTooLargeError,
+    DriverUpload,
+    DriverUploadNotFoundError,
+    DriverUploadOffsetError,
+    DriverVersion,
+    DriverVersionNotFoundError,
+)
+from ._stream import AsyncIteratorReader, AsyncReadable, BytesReader
+
+_UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+_UPLOAD_MARKER_NAME = "marker"
+
+
+class S3DriverError(DriverFileError):
+    def __init__(self, status: int, code: str | None, /) -> None:
+        super().__init__()
+        self.status = status
+        self.code = code
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.status} {self.code}" if self.code else f"{self.status}"
+
+
+@dataclass(frozen=True)
+class _Object:
+    key: str
+    size: int
+    last_modified: datetime
+
+
+class S3Driver(Driver):
+    """
+    Stores regular contents as objects in an S3-compatible object storage.
+
+    Contents are uploaded with multipart uploads so that only a single part is held in
+    memory at a time. Uploads are stored as a sequence of part objects named after
+    their offsets which are concatenated when the upload is committed.
+
+    The driver doesn't keep versions of regular contents.
+    """
+
+    def __init__(
+        self,
+        /,
+        *,
+        endpoint_url: str,
+        bucket: str,
+        region: str,
+        access_key_id: str,
+        secret_access_key: str,
+        key_prefix: str = "",
+        part_size: int,
+        connection_limit: int = 100,
+    ) -> None:
+        super().__init__()
+        self.endpoint_url = endpoint_url
+        self.bucket = bucket
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.key_prefix = key_prefix
+        self.part_size = part_size
+        self.connection_limit = connection_limit
+
+        self._session: aiohttp.ClientSession | None = None
+
+    @override
+    async def startup(self) -> None:
+        # The session pools connections to the storage across requests.
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connection_limit),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300),
+        )
+
+    @override
+    async def shutdown(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        key = self._id_to_key(id_)
+
+        if size == 0:
+            if await self._head_object(key) is None:
+                raise DriverFileNotFoundError(id_)
+            yield BytesReader(b"")
+            return
+
+        headers: dict[str, str] = {}
+        if offset or size is not None:
+            end = str(offset + size - 1) if size is not None else ""
+            headers["range"] = f"bytes={offset}-{end}"
+
+        async with self._request("GET", key, headers=headers) as response:
+            if response.status == 404:
+                raise DriverFileNotFoundError(id_)
+            if response.status == 416:
+                # The offset is past the end of the content.
+                yield BytesReader(b"")
+                return
+            await _raise_for_status(response)
+            yield _ResponseReader(response)
+
+    @override
+    async def read_regular_content_tag(self, id_: UUID, /) -> str:
+        async with self._request("HEAD", self._id_to_key(id_)) as response:
+            if response.status == 404:
+                raise DriverFileNotFoundError(id_)
+            await _raise_for_status(response)
+            return response.headers["etag"]
+
+    @override
+    async def write_regular_content(
+        self,
+        content_stream: AsyncReadable,
+        id_: UUID,
+        /,
+        *,
+        chunk_size: int,
+        max_file_size: int,
+        expected_tag: str | None = None,
+    ) -> int:
+        try:
+            return await self._write_regular_content(
+                content_stream,
+                id_,
+                chunk_size=chunk_size,
+                max_file_size=max_file_size,
+                expected_tag=expected_tag,
+            )
+        except S3DriverError as e:
+            # The conditional write fails if the object has been replaced meanwhile.
+            if e.status == 412 or e.code == "PreconditionFailed":
+                raise DriverContentConflictError(id_) from e
+            raise
+
+    async def _write_regular_content(
+        self,
+        content_stream: AsyncReadable,
+        id_: UUID,
+        /,
+        *,
+        chunk_size: int,
+        max_file_size: int,
+        expected_tag: str | None,
+    ) -> int:
+        key = self._id_to_key(id_)
+
+        part = await _read_part(
+            content_stream,
+            part_size=self.part_size,
+            chunk_size=chunk_size,
+            max_size=max_file_size,
+        )
+        if len(part) < self.part_size:
+            await self._put_object(key, part, if_match=expected_tag)
+            return len(part)
+
+        upload_id = await self._create_multipart_upload(key)
+        try:
+            file_size = 0
+            etags: list[str] = []
+            while part:
+                file_size += len(part)
+                etags.append(
+                    await self._upload_part(
+                        key, part, upload_id=upload_id, part_number=len(etags) + 1
+                    )
+                )
+                part = await _read_part(
+                    content_stream,
+                    part_size=self.part_size,
+                    chunk_size=chunk_size,
+                    max_size=max_file_size - file_size,
+                )
+            await self._complete_multipart_upload(
+                key, etags, upload_id=upload_id, if_match=expected_tag
+            )
+        except BaseException:
+            await self._abort_multipart_upload(key, upload_id=upload_id)
+            raise
+
+        return file_size
+
+    @override
+    async def remove_regular_content(self, id_: UUID, /) -> None:
+        key = self._id_to_key(id_)
+
+        # Deleting a missing object succeeds in S3.
+        if await self._head_object(key) is None:
+            raise DriverFileNotFoundError(id_)
+        await self._delete_object(key)
+
+    @override
+    async def read_regular_content_versions(self, id_: UUID, /) -> list[DriverVersion]:
+        return []
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]:
+        raise DriverVersionNotFoundError(id_, version)
+        yield
+
+    @override
+    async def create_upload(
+        self, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        upload_id = uuid4()
+        await self._put_object(
+            self._upload_id_to_prefix(upload_id, user_id=user_id) + _UPLOAD_MARKER_NAME,
+            b"",
+        )
+
+        return DriverUpload(
+            id=upload_id,
+            offset=0,
+            expires_at=_make_expires_at(time.time(), expire_seconds),
+        )
+
+    @override
+    async def read_upload(
+        self, upload_id: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        objects = await self._list_upload_objects(upload_id, user_id=user_id)
+        offset, expires_at = _stat_upload(
+            objects, upload_id, expire_seconds=expire_seconds
+        )
+        return DriverUpload(id=upload_id, offset=offset, expires_at=expires_at)
+
+    @override
+    async def append_upload(
+        self,
+        content_stream: AsyncReadable,
+        upload_id: UUID,
+        /,
+        *,
+        user_id: UUID,
+        offset: int,
+        chunk_size: int,
+        max_file_size: int,
+        expire_seconds: int,
+    ) -> DriverUpload:
+        objects = await self._list_upload_objects(upload_id, user_id=user_id)
+        upload_size, _ = _stat_upload(objects, upload_id, expire_seconds=expire_seconds)
+        if upload_size != offset:
+            raise DriverUploadOffsetError(upload_id, offset=upload_size)
+
+        file_size = offset
+        buffer = bytearray()
+
+        async def put_buffer() -> None:
+            nonlocal file_size
+            if not await self._put_upload_part(
+                upload_id, bytes(buffer), file_size, user_id=user_id
+            ):
+                buffer.clear()
+                objects = await self._list_upload_objects(upload_id, user_id=user_id)
+                upload_size, _ = _stat_upload(
+                    objects, upload_id, expire_seconds=expire_seconds
+                )
+                raise DriverUploadOffsetError(upload_id, offset=upload_size)
+            file_size += len(buffer)
+            buffer.clear()
+
+        try:
+            while chunk := await content_stream.read(chunk_size):
+                if file_size + len(buffer) + len(chunk) > max_file_size:
+                    raise DriverFileTooLargeError()
+
+                buffer += chunk
+                if len(buffer) >= self.part_size:
+                    await put_buffer()
+        finally:
+            # Content that has been received is kept even if an error occurred.
+            if buffer:
+                await put_buffer()
+
+        return DriverUpload(
+            id=upload_id,
+            offset=file_size,
+            expires_at=_make_expires_at(time.time(), expire_seconds),
+        )
+
+    @override
+    async def commit_upload(
+        self, upload_id: UUID, id_: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> int:
+        objects = await self._list_upload_objects(upload_id, user_id=user_id)
+        file_size, _ = _stat_upload(objects, upload_id, expire_seconds=expire_seconds)
+
+        parts = sorted(_iter_upload_parts(objects), key=lambda t: t[0])
+
+        async def iterate_content() -> AsyncIterator[bytes]:
+            for _, part in parts:
+                async with self._request("GET", part.key) as response:
+                    if response.status == 404:
+                        raise DriverUploadNotFoundError(upload_id)
+                    await _raise_for_status(response)
+                    async for chunk in response.content.iter_chunked(self.part_size):
+                        yield chunk
+
+        _ = await self.write_regular_content(
+            AsyncIteratorReader(iterate_content()),
+            id_,
+            chunk_size=self.part_size,
+            max_file_size=file_size,
+        )
+        await self._delete_objects(o.key for o in objects)
+
+        return file_size
+
+    @override
+    async def remove_upload(self, upload_id: UUID, /, *, user_id: UUID) -> None:
+        objects = await self._list_upload_objects(upload_id, user_id=user_id)
+        if not objects:
+            raise DriverUploadNotFoundError(upload_id)
+        await self._delete_objects(o.key for o in objects)
+
+    @override
+    async def remove_expired_uploads(self, /, *, expire_seconds: int) -> int:
+        uploads_prefix = self.key_prefix + "uploads/"
+
+        upload_objects: dict[str, list[_Object]] = {}
+        for o in await self._list_objects(uploads_prefix):
+            upload_key, _, _ = o.key[len(uploads_prefix) :].partition("/")
+            upload_objects.setdefault(upload_key, []).append(o)
+
+        now = time.time()
+        removed_count = 0
+        for objects in upload_objects.values():
+            last_modified = max(o.last_modified for o in objects)
+            if last_modified.timestamp() + expire_seconds <= now:
+                await self._delete_objects(o.key for o in objects)
+                removed_count += 1
+
+        return removed_count
+
+    def _id_to_key(self, id_: UUID, /) -> str:
+        return f"{self.key_prefix}regular/{id_.hex}"
+
+    def _upload_id_to_prefix(self, upload_id: UUID, /, *, user_id: UUID) -> str:
+        # Uploads are prefixed with their owners too, so an upload can't be reached
+        # with another user's ID.
+        return f"{self.key_prefix}uploads/{user_id.hex}.{upload_id.hex}/"
+
+    async def _list_upload_objects(
+        self, upload_id: UUID, /, *, user_id: UUID
+    ) -> list[_Object]:
+        return await self._list_objects(
+            self._upload_id_to_prefix(upload_id, user_id=user_id)
+        )
+
+    async def _put_upload_part(
+        self, upload_id: UUID, content: bytes, offset: int, /, *, user_id: UUID
+    ) -> bool:
+        """
+        Returns False if a part at the offset already exists.
+        """
+        key = self._upload_id_to_prefix(upload_id, user_id=user_id) + f"{offset:020d}"
+
+        # The conditional write makes concurrent appends at the same offset fail
+        # instead of overwriting each other.
+        async with self._request(
+            "PUT", key, headers={"if-none-match": "*"}, data=content
+        ) as response:
+            if response.status == 412:
+                return False
+            await _raise_for_status(response)
+            return True
+
+    async def _head_object(self, key: str, /) -> int | None:
+        """
+        Returns the object's size or None if the object doesn't exist.
+        """
+        async with self._request("HEAD", key) as response:
+            if response.status == 404:
+                return None
+            await _raise_for_status(response)
+            return response.content_length or 0
+
+    async def _put_object(
+        self, key: str, content: bytes, /, *, if_match: str | None = None
+    ) -> None:
+        headers = {"if-match": if_match} if if_match is not None else {}
+        async with self._request("PUT", key, headers=headers, data=content) as response:
+            await _raise_for_status(response)
+
+    async def _delete_object(self, key: str, /) -> None:
+        async with self._request("DELETE", key) as response:
+            await _raise_for_status(response)
+
+    async def _delete_objects(self, keys: Iterable[str], /) -> None:
+        for key in keys:
+            await self._delete_object(key)
+
+    async def _list_objects(self, prefix: str, /) -> list[_Object]:
+        objects: list[_Object] = []
+        continuation_token: str | None = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if continuation_token is not None:
+                query["continuation-token"] = continuation_token
+
+            async with self._request("GET", "", query=query) as response:
+                await _raise_for_status(response)
+                root = ET.fromstring(await response.read())
+
+            for contents in root.iterfind("{*}Contents"):
+                objects.append(
+                    _Object(
+                        key=_find_text(contents, "Key"),
+                        size=int(_find_text(contents, "Size")),
+                        last_modified=datetime.fromisoformat(
+                            _find_text(contents, "LastModified")
+                        ),
+                    )
+                )
+
+            if root.findtext("{*}IsTruncated") != "true":
+                return objects
+            continuation_token = _find_text(root, "NextContinuationToken")
+
+    async def _create_multipart_upload(self, key: str, /) -> str:
+        async with self._request("POST", key, query={"uploads": ""}) as response:
+            await _raise_for_status(response)
+            root = ET.fromstring(await response.read())
+        return _find_text(root, "UploadId")
+
+    async def _upload_part(
+        self, key: str, content: bytes, /, *, upload_id: str, part_number: int
+    ) -> str:
+        async with self._request(
+            "PUT",
+            key,
+            query={"partNumber": str(part_number), "uploadId": upload_id},
+            data=content,
+        ) as response:
+            await _raise_for_status(response)
+            return response.headers["etag"]
+
+    async def _complete_multipart_upload(
+        self,
+        key: str,
+        etags: list[str],
+        /,
+        *,
+        upload_id: str,
+        if_match: str | None = None,
+    ) -> None:
+        root = ET.Element("CompleteMultipartUpload")
+        for part_number, etag in enumerate(etags, start=1):
+            part = ET.SubElement(root, "Part")
+            ET.SubElement(part, "PartNumber").text = str(part_number)
+            ET.SubElement(part, "ETag").text = etag
+
+        headers = {"if-match": if_match} if if_match is not None else {}
+        async with self._request(
+            "POST",
+            key,
+            query={"uploadId": upload_id},
+            headers=headers,
+            data=ET.tostring(root),
+        ) as response:
+            await _raise_for_status(response)
+            # The request may fail after the response status has been sent.
+            body = await response.read()
+            if ET.fromstring(body).tag.endswith("Error"):
+                raise S3DriverError(response.status, _parse_error_code(body))
+
+    async def _abort_multipart_upload(self, key: str, /, *, upload_id: str) -> None:
+        async with self._request(
+            "DELETE", key, query={"uploadId": upload_id}
+        ) as response:
+            await _raise_for_status(response)
+
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        key: str,
+        /,
+        *,
+        query: Mapping[str, str] | None = None,
+        headers: Mapping[str, str] | None = None,
+        data: bytes | None = None,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        url = self._make_url(key, query=query or {})
+        signed_headers = _sign_request(
+            method,
+            url,
+            headers or {},
+            region=self.region,
+            access_key_id=self.access_key_id,
+            secret_access_key=self.secret_access_key,
+            now=datetime.now(UTC),
+        )
+        assert self._session is not None, "The driver hasn't been started up."
+        async with self._session.request(
+            method, url, headers=signed_headers, data=data
+        ) as response:
+            yield response
+
+    def _make_url(self, key: str, /, *, query: Mapping[str, str]) -> URL:
+        # Path-style URLs work with every S3-compatible storage.
+        url = self.endpoint_url.rstrip("/") + "/" + _quote(self.bucket)
+        if key:
+            url += "/" + _quote(key, safe="/")
+        if query:
+            url += "?" + _make_canonical_query(query)
+        return URL(url, encoded=True)
+
+
+class _ResponseReader:
+    """
+    Reads a response's body filling the requested size unless the body ends.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse, /) -> None:
+        self._response = response
+
+    async def read(self, size: int = -1, /) -> bytes:
+        if size < 0:
+            return await self._response.content.read()
+
+        chunks: list[bytes] = []
+        remaining = size
+        while remaining > 0:
+            chunk = await self._response.content.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+
+async def _read_part(
+    stream: AsyncReadable, /, *, part_size: int, chunk_size: int, max_size: int
+) -> bytes:
+    """
+    Reads up to the part size from the stream.
+    """
+    part = bytearray()
+    while len(part) < part_size and (
+        chunk := await stream.read(min(chunk_size, part_size - len(part)))
+    ):
+        if len(part) + len(chunk) > max_size:
+            raise DriverFileTooLargeError()
+        part += chunk
+    return bytes(part)
+
+
+def _iter_upload_parts(objects: Iterable[_Object], /) -> Iterable[tuple[int, _Object]]:
+    for o in objects:
+        _, _, name = o.key.rpartition("/")
+        if name.isdigit():
+            yield int(name), o
+
+
+def _stat_upload(
+    objects: list[_Object], upload_id: UUID, /, *, expire_seconds: int
+) -> tuple[int, datetime]:
+    """
+    Returns the upload's size and expiration time. Expired uploads are treated as
+    missing.
+    """
+    if not objects:
+        raise DriverUploadNotFoundError(upload_id)
+
+    last_modified = max(o.last_modified for o in objects).timestamp()
+    if last_modified + expire_seconds <= time.time():
+        raise DriverUploadNotFoundError(upload_id)
+
+    size = max(
+        (offset + o.size for offset, o in _iter_upload_parts(objects)), default=0
+    )
+    return size, _make_expires_at(last_modified, expire_seconds)
+
+
+def _make_expires_at(timestamp: float, expire_seconds: int, /) -> datetime:
+    return datetime.fromtimestamp(timestamp + expire_seconds, UTC)
+
+
+async def _raise_for_status(response: aiohttp.ClientResponse, /) -> None:
+    if response.status < 300:
+        return
+    body = await response.read()
+    raise S3DriverError(response.status, _parse_error_code(body) if body else None)
+
+
+def _parse_error_code(body: bytes, /) -> str | None:
+    try:
+        return ET.fromstring(body).findtext("Code")
+    except ET.ParseError:
+        return None
+
+
+def _find_text(element: ET.Element, tag: str, /) -> str:
+    text = element.findtext("{*}" + tag)
+    if text is None:
+        raise S3DriverError(200, f"Missing{tag}")
+    return text
+
+
+def _sign_request(
+    method: str,
+    url: URL,
+    headers: Mapping[str, str],
+    /,
+    *,
+    region: str,
+    access_key_id: str,
+    secret_access_key: str,
+    now: datetime,
+) -> dict[str, str]:
+    """
+    Signs the request with AWS Signature Version 4. The payload isn't signed so that
+    it can be streamed.
+    """
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = now.strftime("%Y%m%d")
+    scope = f"{date}/{region}/s3/aws4_request"
+
+    host = url.raw_host or ""
+    if url.explicit_port is not None:
+        host += f":{url.explicit_port}"
+
+    signed_headers = {k.lower(): v.strip() for k, v in headers.items()}
+    signed_headers["host"] = host
+    signed_headers["x-amz-content-sha256"] = _UNSIGNED_PAYLOAD
+    signed_headers["x-amz-date"] = amz_date
+    header_names = sorted(signed_headers)
+
+    canonical_request = "\n".join(
+        [
+            method,
+            url.raw_path,
+            url.raw_query_string,
+            "".join(f"{k}:{signed_headers[k]}\n" for k in header_names),
+            ";".join(header_names),
+            _UNSIGNED_PAYLOAD,
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+
+    key = ("AWS4" + secret_access_key).encode()
+    for part in (date, region, "s3", "aws4_request"):
+        key = hmac.digest(key, part.encode(), "sha256")
+    signature = hmac.new(key, string_to_sign.encode(), "sha256").hexdigest()
+
+    signed_headers["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key_id}/{scope}, "
+        f"SignedHeaders={';'.join(header_names)}, Signature={signature}"
+    )
+    return signed_headers
+
+
+def _make_canonical_query(query: Mapping[str, str], /) -> str:
+    return "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+
+
+def _quote(s: str, /, *, safe: str = "") -> str:
+    return quote(s, safe="-_.~" + safe)
@@ -0,0 +1,291 @@
+import hashlib
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from uuid import UUID, uuid4
+from xml.etree import ElementTree as ET
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ._driver import (
+    DriverContentConflictError,
+    DriverFileNotFoundError,
+    DriverFileTooLargeError,
+    DriverUploadNotFoundError,
+    DriverUploadOffsetError,
+)
+from ._s3 import S3Driver
+from ._stream import BytesReader
+
+_BUCKET = "yama"
+
+
+class _FakeS3:
+    """
+    An in-memory stand-in for the subset of the S3 API used by the S3Driver.
+    """
+
+    def __init__(self) -> None:
+        self.objects: dict[str, tuple[bytes, datetime]] = {}
+        self.multipart_uploads: dict[str, dict[int, bytes]] = {}
+        self.completed_multipart_upload_count = 0
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 * 1024 * 64)
+        _ = app.router.add_route("GET", f"/{_BUCKET}", self.list_objects)
+        _ = app.router.add_route("*", f"/{_BUCKET}/{{key:.+}}", self.handle_object)
+        return app
+
+    async def list_objects(self, request: web.Request) -> web.Response:
+        assert request.headers["authorization"].startswith("AWS4-HMAC-SHA256 ")
+        prefix = request.query.get("prefix", "")
+
+        root = ET.Element("ListBucketResult")
+        for key, (content, last_modified) in sorted(self.objects.items()):
+            if key.startswith(prefix):
+                contents = ET.SubElement(root, "Contents")
+                ET.SubElement(contents, "Key").text = key
+                ET.SubElement(contents, "Size").text = str(len(content))
+                ET.SubElement(contents, "LastModified").text = last_modified.isoformat()
+        ET.SubElement(root, "IsTruncated").text = "false"
+        return web.Response(body=ET.tostring(root))
+
+    async def handle_object(self, request: web.Request) -> web.StreamResponse:
+        assert request.headers["authorization"].startswith("AWS4-HMAC-SHA256 ")
+        key = request.match_info["key"]
+        query = request.query
+
+        match request.method:
+            case "POST" if "uploads" in query:
+                upload_id = uuid4().hex
+                self.multipart_uploads[upload_id] = {}
+                root = ET.Element("InitiateMultipartUploadResult")
+                ET.SubElement(root, "UploadId").text = upload_id
+                return web.Response(body=ET.tostring(root))
+            case "POST" if "uploadId" in query:
+                if not self._matches(key, request):
+                    return web.Response(status=412)
+                parts = self.multipart_uploads.pop(query["uploadId"])
+                root = ET.fromstring(await request.read())
+                part_numbers = [int(p.findtext("PartNumber") or "") for p in root]
+                content = b"".join(parts[n] for n in part_numbers)
+                self.objects[key] = (content, datetime.now(UTC))
+                self.completed_multipart_upload_count += 1
+                return web.Response(body=b"<CompleteMultipartUploadResult/>")
+            case "PUT" if "uploadId" in query:
+                parts = self.multipart_uploads[query["uploadId"]]
+                parts[int(query["partNumber"])] = await request.read()
+                return web.Response(headers={"etag": f'"{query["partNumber"]}"'})
+            case "DELETE" if "uploadId" in query:
+                _ = self.multipart_uploads.pop(query["uploadId"])
+                return web.Response(status=204)
+            case "PUT":
+                if request.headers.get("if-none-match") == "*" and key in self.objects:
+                    return web.Response(status=412)
+                if not self._matches(key, request):
+                    return web.Response(status=412)
+                self.objects[key] = (await request.read(), datetime.now(UTC))
+                return web.Response()
+            case "DELETE":
+                _ = self.objects.pop(key, None)
+                return web.Response(status=204)
+            case "GET" | "HEAD":
+                if key not in self.objects:
+                    return web.Response(status=404)
+                content, _ = self.objects[key]
+                headers = {"etag": _make_etag(content)}
+                if range_ := request.http_range:
+                    if range_.start is not None and range_.start >= len(content):
+                        return web.Response(status=416)
+                    return web.Response(
+                        body=content[range_], status=206, headers=headers
+                    )
+                return web.Response(body=content, headers=headers)
+            case _:
+                return web.Response(status=405)
+
+    def _matches(self, key: str, request: web.Request, /) -> bool:
+        if_match = request.headers.get("if-match")
+        if if_match is None:
+            return True
+        return key in self.objects and _make_etag(self.objects[key][0]) == if_match
+
+
+def _make_etag(content: bytes, /) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+@pytest.fixture
+async def fake_s3() -> AsyncIterator[tuple[_FakeS3, S3Driver]]:
+    fake_s3 = _FakeS3()
+    async with TestServer(fake_s3.make_app()) as server:
+        driver = S3Driver(
+            endpoint_url=str(server.make_url("/")),
+            bucket=_BUCKET,
+            region="us-east-1",
+            access_key_id="yama",
+            secret_access_key="yama-secret",
+            key_prefix="test/",
+            part_size=8,
+        )
+        await driver.startup()
+        try:
+            yield fake_s3, driver
+        finally:
+            await driver.shutdown()
+
+
+async def test_s3_driver_regular_content(*, fake_s3: tuple[_FakeS3, S3Driver]) -> None:
+    """Tests reading, writing and removing regular contents with the S3Driver."""
+    storage, driver = fake_s3
+    id_ = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+
+    # Case about writing a content smaller than a part.
+
+    size = await driver.write_regular_content(
+        BytesReader(b"# Foo\n"), id_, chunk_size=3, max_file_size=512
+    )
+    assert size == 6
+    assert storage.objects["test/regular/42bd9c321c96485faf69b48536bc3c4a"][0] == (
+        b"# Foo\n"
+    )
+    assert storage.completed_multipart_upload_count == 0
+    tag = await driver.read_regular_content_tag(id_)
+
+    # Case about writing a content with a multipart upload.
+
+    size = await driver.write_regular_content(
+        BytesReader(b"# Foo\n\nBar.\n" * 2), id_, chunk_size=5, max_file_size=512
+    )
+    assert size == 24
+    assert storage.completed_multipart_upload_count == 1
+    assert await driver.read_regular_content_tag(id_) != tag
+
+    async with driver.read_regular_content(id_) as f:
+        assert await f.read() == b"# Foo\n\nBar.\n" * 2
+
+    # Case about writing a content only while it has the expected tag.
+
+    with pytest.raises(DriverContentConflictError):
+        _ = await driver.write_regular_content(
+            BytesReader(b"# Bar\n"),
+            id_,
+            chunk_size=5,
+            max_file_size=512,
+            expected_tag=tag,
+        )
+    with pytest.raises(DriverContentConflictError):
+        _ = await driver.write_regular_content(
+            BytesReader(b"# Bar\n" * 2),
+            id_,
+            chunk_size=5,
+            max_file_size=512,
+            expected_tag=tag,
+        )
+    assert not storage.multipart_uploads
+    _ = await driver.write_regular_content(
+        BytesReader(b"# Foo\n\nBar.\n" * 2),
+        id_,
+        chunk_size=5,
+        max_file_size=512,
+        expected_tag=await driver.read_regular_content_tag(id_),
+    )
+
+    # Case about reading a range.
+
+    async with driver.read_regular_content(id_, offset=7, size=4) as f:
+        assert await f.read() == b"Bar."
+    async with driver.read_regular_content(id_, offset=100) as f:
+        assert await f.read() == b""
+
+    # Case about writing a content that is too large.
+
+    with pytest.raises(DriverFileTooLargeError):
+        _ = await driver.write_regular_content(
+            BytesReader(b"x" * 20), id_, chunk_size=4, max_file_size=16
+        )
+    assert storage.multipart_uploads == {}
+
+    # Case about removing the content.
+
+    await driver.remove_regular_content(id_)
+    with pytest.raises(DriverFileNotFoundError):
+        async with driver.read_regular_content(id_) as _:
+            assert False
+    with pytest.raises(DriverFileNotFoundError):
+        _ = await driver.read_regular_content_tag(id_)
+    with pytest.raises(DriverFileNotFoundError):
+        await driver.remove_regular_content(id_)
+
+
+async def test_s3_driver_upload(*, fake_s3: tuple[_FakeS3, S3Driver]) -> None:
+    """Tests resumable uploads with the S3Driver."""
+    storage, driver = fake_s3
+    id_ = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    user_id = UUID("6c2a8d1e-5d9b-4b0e-9c51-0b8f4c7e2a3d")
+
+    upload = await driver.create_upload(user_id=user_id, expire_seconds=60)
+    assert upload.offset == 0
+
+    upload = await driver.append_upload(
+        BytesReader(b"# Foo\n\nBar"),
+        upload.id,
+        user_id=user_id,
+        offset=0,
+        chunk_size=3,
+        max_file_size=512,
+        expire_seconds=60,
+    )
+    assert upload.offset == 10
+
+    with pytest.raises(DriverUploadOffsetError) as e:
+        _ = await driver.append_upload(
+            BytesReader(b".\n"),
+            upload.id,
+            user_id=user_id,
+            offset=0,
+            chunk_size=3,
+            max_file_size=512,
+            expire_seconds=60,
+        )
+    assert e.value.offset == 10
+
+    upload = await driver.append_upload(
+        BytesReader(b".\n"),
+        upload.id,
+        user_id=user_id,
+        offset=10,
+        chunk_size=3,
+        max_file_size=512,
+        expire_seconds=60,
+    )
+    assert (
+        await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+    ).offset == 12
+
+    # Case about reading an upload owned by another user.
+
+    with pytest.raises(DriverUploadNotFoundError):
+        _ = await driver.read_upload(
+            upload.id,
+            user_id=UUID("0d4b7f39-2e8a-4c61-a5f3-7e1c9b6d8a20"),
+            expire_seconds=60,
+        )
+
+    size = await driver.commit_upload(
+        upload.id, id_, user_id=user_id, expire_seconds=60
+    )
+    assert size == 12
+    async with driver.read_regular_content(id_) as f:
+        assert await f.read() == b"# Foo\n\nBar.\n"
+    assert not any(k.startswith("test/uploads/") for k in storage.objects)
+
+    with pytest.raises(DriverUploadNotFoundError):
+        _ = await driver.read_upload(upload.id, user_id=user_id, expire_seconds=60)
+
+    # Case about removing expired uploads.
+
+    _ = await driver.create_upload(user_id=user_id, expire_seconds=60)
+    assert await driver.remove_expired_uploads(expire_seconds=60) == 0
+    assert await driver.remove_expired_uploads(expire_seconds=0) == 1
@@ -1,17 +1,36 @@
+import contextlib
 from collections import OrderedDict, defaultdict, deque
 from collections.abc import Iterable
 from dataclasses import astuple, dataclass
+from datetime import datetime
 from pathlib import PurePosixPath
-from typing import AsyncIterable, assert_never
+from typing import Any, AsyncIterable, assert_never
 from urllib.parse import urlencode, urlsplit, urlunsplit
-from uuid import UUID
-
-from sqlalchemy import and_, case, delete, insert, literal, select, union
-from sqlalchemy.ext.asyncio import AsyncConnection
+from uuid import UUID, uuid4
+
+from sqlalchemy import (
+    CTE,
+    DateTime,
+    Select,
+    String,
+    Uuid,
+    and_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+    union,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 from sqlalchemy.orm import aliased
 
-from yama.user.database import UserAncestorUserDescendantDb
-
 from . import (
     DirectoryContentFileOut,
     DirectoryContentOut,
@@ -19,12 +38,20 @@ from . import (
     FileOut,
     RegularContentOut,
     RegularOut,
+    RegularVersionOut,
 )
 from ._config import Config
-from ._driver import Driver
+from ._driver import (
+    Driver,
+    DriverContentConflictError,
+    DriverFileNotFoundError,
+    DriverVersion,
+)
 from ._errors import (
+    FileContentConflictError,
     FileFileExistsError,
     FileFileNotFoundError,
+    FileInvalidPatchError,
     FileIsADirectoryError,
     FileNotADirectoryError,
     FilePermissionError,
@@ -37,15 +64,23 @@ from ._models import (
     File,
     FileName,
     FilePath,
+    FileShare,
     FileShareType,
+    FileShareWrite,
     FileType,
     FileWrite,
     Regular,
+    RegularContentPatch,
+    RegularContentUploadWrite,
+    RegularContentWrite,
     RegularWrite,
+    SharedFile,
     _FileAncestorFileDescendantDb,
     _FileDb,
+    _FileEffectiveShareDb,
     _FileShareDb,
 )
+from ._patch import PatchDigestMismatchError, PatchError, patch_content_stream
 
 
 async def read_file(
@@ -147,13 +182,14 @@ async def share_file(
     )
 
     share_db_cte = (
-        insert(_FileShareDb)
+        postgresql.insert(_FileShareDb)
         .values(
             type=share_type.value,
             file_id=id_,
             user_id=to_user_id,
             created_by=from_user_id,
         )
+        .on_conflict_do_nothing()
         .returning(_FileShareDb)
         .cte()
     )
@@ -174,6 +210,94 @@ async def share_file(
     return file
 
 
+async def share_files(
+    file_share_writes: list[FileShareWrite],
+    /,
+    *,
+    from_user_id: UUID,
+    working_file_id: UUID,
+    config: Config,
+    connection: AsyncConnection,
+) -> list[FileShare]:
+    """
+    Shares the files in one transaction and returns the shares that were added.
+
+    Shares that are already implied by the user's direct shares on the files or their
+    ancestors, or by other shares of the batch, are skipped.
+    """
+    return await _write_file_shares(
+        _SHARE_FILES_QUERY,
+        file_share_writes,
+        from_user_id=from_user_id,
+        working_file_id=working_file_id,
+        config=config,
+        connection=connection,
+    )
+
+
+async def revoke_files(
+    file_share_writes: list[FileShareWrite],
+    /,
+    *,
+    from_user_id: UUID,
+    working_file_id: UUID,
+    config: Config,
+    connection: AsyncConnection,
+) -> list[FileShare]:
+    """
+    Revokes the files' subtrees in one transaction and returns the shares that were
+    removed.
+
+    Revoking a share type removes the user's shares of the type and the stronger
+    types from the file and its descendants.
+    """
+    return await _write_file_shares(
+        _REVOKE_FILES_QUERY,
+        file_share_writes,
+        from_user_id=from_user_id,
+        working_file_id=working_file_id,
+        config=config,
+        connection=connection,
+    )
+
+
+async def read_shared_files(
+    *,
+    limit: int,
+    after: tuple[datetime, UUID] | None,
+    user_id: UUID,
+    config: Config,
+    connection: AsyncConnection,
+) -> list[SharedFile]:
+    """
+    Reads the files shared with the user by others, directly or through groups, from
+    the most recently shared. after is the shared_at and ID of the previous page's
+    last file.
+    """
+    params: dict[str, Any] = {
+        "user_id": user_id,
+        "root_file_id": config.root_file_id,
+        "limit": limit,
+    }
+    if after is None:
+        query = _GET_SHARED_FILES_QUERY
+    else:
+        query = _GET_SHARED_FILES_AFTER_QUERY
+        params |= {"after_shared_at": after[0], "after_file_id": after[1]}
+
+    rows = (await connection.execute(query, params)).mappings().all()
+    files = _make_files((_FileDb(id=row["id"], type=row["type"]), None) for row in rows)
+    return [
+        SharedFile(
+            path=PurePosixPath("/", row["descendant_path"]),
+            share_type=FileShareType(row["share_type"]),
+            shared_at=row["shared_at"],
+            file=file,
+        )
+        for row, file in zip(rows, files, strict=True)
+    ]
+
+
 async def write_file(
     file_write: FileWrite,
     path: FilePath,
@@ -183,32 +307,44 @@ async def write_file(
     user_id: UUID,
     working_file_id: UUID,
     config: Config,
-    connection: AsyncConnection,
+    engine: AsyncEngine,
     driver: Driver,
 ) -> File:
-    parent_id, id_ = await _path_to_parent_id_and_id_or_none(
-        path,
-        root_file_id=config.root_file_id,
-        working_file_id=working_file_id,
-        connection=connection,
-    )
+    """
+    Writes the file without holding a connection while the content is written.
 
-    await _check_share_for_file_and_user(
-        allowed_types=[
-            FileShareType.WRITE,
-            FileShareType.SHARE,
-        ],
-        file_id=id_ or parent_id,
-        user_id=user_id,
-        connection=connection,
-    )
+    A new regular file's content is staged under the file's ID before the file is
+    added in a short transaction. The staged content is removed if the file can't be
+    added. An existing regular file's content is removed if the file has been removed
+    while the content was written.
+    """
+    async with engine.connect() as connection:
+        parent_id, id_ = await _path_to_parent_id_and_id_or_none(
+            path,
+            root_file_id=config.root_file_id,
+            working_file_id=working_file_id,
+            connection=connection,
+        )
 
-    connection_to_commit: AsyncConnection | None = None
-    if id_ is not None:
-        file = await _get_file(id_, max_depth=0, connection=connection)
+        await _check_share_for_file_and_user(
+            allowed_types=[
+                FileShareType.WRITE,
+                FileShareType.SHARE,
+            ],
+            file_id=id_ or parent_id,
+            user_id=user_id,
+            connection=connection,
+        )
 
+        file = (
+            await _get_file(id_, max_depth=0, connection=connection)
+            if id_ is not None
+            else None
+        )
+
+    if file is not None:
         if not exist_ok:
-            raise FileFileExistsError(id_)
+            raise FileFileExistsError(file.id)
 
         if file.type != file_write.type:
             match file.type:
@@ -218,32 +354,156 @@ async def write_file(
                     raise FileIsADirectoryError(file.id)
                 case _:
                     assert_never(file.type)
-    else:
-        name = _path_to_some_name(path)
 
-        file, connection_to_commit = await _add_file(
-            parent_id,
-            name,
-            type_=file_write.type,
-            user_id=user_id,
-            connection=connection,
+        await _write_content(
+            file_write, file.id, user_id=user_id, config=config, driver=driver
         )
+        if isinstance(file_write, RegularWrite):
+            await _check_written_file_exists(file.id, engine=engine, driver=driver)
+        return file
+
+    name = _path_to_some_name(path)
+    new_id = uuid4()
+
+    await _write_content(
+        file_write, new_id, user_id=user_id, config=config, driver=driver
+    )
+    try:
+        async with engine.connect() as connection:
+            file, connection_to_commit = await _add_file(
+                parent_id,
+                name,
+                id_=new_id,
+                type_=file_write.type,
+                user_id=user_id,
+                connection=connection,
+            )
+            await connection_to_commit.commit()
+    except BaseException:
+        if isinstance(file_write, RegularWrite):
+            with contextlib.suppress(DriverFileNotFoundError):
+                await driver.remove_regular_content(new_id)
+        raise
+
+    return file
+
 
+async def _check_written_file_exists(
+    id_: UUID, /, *, engine: AsyncEngine, driver: Driver
+) -> None:
+    """
+    Removes the content written for the file and raises FileFileNotFoundError if the
+    file has been removed meanwhile. Its removal may have removed the file's content
+    before the write, which would leave the written content behind otherwise.
+    """
+    async with engine.connect() as connection:
+        # A removal that hasn't been committed yet holds the file's row, so the
+        # lock waits for it to finish.
+        row = (
+            await connection.execute(_LOCK_FILE_QUERY, {"file_id": id_})
+        ).one_or_none()
+        await connection.commit()
+
+    if row is None:
+        with contextlib.suppress(DriverFileNotFoundError):
+            await driver.remove_regular_content(id_)
+        raise FileFileNotFoundError(id_)
+
+
+async def _write_content(
+    file_write: FileWrite,
+    id_: UUID,
+    /,
+    *,
+    user_id: UUID,
+    config: Config,
+    driver: Driver,
+) -> None:
     match file_write:
         case RegularWrite(content=content):
-            _ = await driver.write_regular_content(
-                content.stream,
-                file.id,
-                chunk_size=config.chunk_size,
-                max_file_size=config.max_file_size,
-            )
+            match content:
+                case RegularContentWrite(stream=stream):
+                    _ = await driver.write_regular_content(
+                        stream,
+                        id_,
+                        chunk_size=config.chunk_size,
+                        max_file_size=config.max_file_size,
+                    )
+                case RegularContentUploadWrite(upload_id=upload_id):
+                    _ = await driver.commit_upload(
+                        upload_id,
+                        id_,
+                        user_id=user_id,
+                        expire_seconds=config.upload_expire_seconds,
+                    )
+                case _:
+                    assert_never(content)
         case DirectoryWrite():
             ...
         case _:
             assert_never(file_write)
 
-    if connection_to_commit is not None:
-        await connection_to_commit.commit()
+
+async def patch_file(
+    patch: RegularContentPatch,
+    path: FilePath,
+    /,
+    *,
+    user_id: UUID,
+    working_file_id: UUID,
+    config: Config,
+    engine: AsyncEngine,
+    driver: Driver,
+) -> File:
+    """
+    Patches the regular file's content without holding a connection while the content
+    is written.
+    """
+    async with engine.connect() as connection:
+        id_ = await _path_to_id(
+            path,
+            root_file_id=config.root_file_id,
+            working_file_id=working_file_id,
+            connection=connection,
+        )
+
+        await _check_share_for_file_and_user(
+            allowed_types=[
+                FileShareType.WRITE,
+                FileShareType.SHARE,
+            ],
+            file_id=id_,
+            user_id=user_id,
+            connection=connection,
+        )
+
+        file = await _get_file(id_, max_depth=0, connection=connection)
+
+    match file:
+        case Regular():
+            ...
+        case Directory():
+            raise FileIsADirectoryError(file.id)
+        case _:
+            assert_never(file)
+
+    # The patched content only replaces the base it was computed from, a content
+    # written in the meantime makes the patch conflict instead of being overwritten.
+    # The tag is read before the base, so a base replaced between the two conflicts.
+    base_tag = await driver.read_regular_content_tag(file.id)
+    try:
+        async with driver.read_regular_content(file.id) as base_stream:
+            _ = await driver.write_regular_content(
+                patch_content_stream(base_stream, patch, chunk_size=config.chunk_size),
+                file.id,
+                chunk_size=config.chunk_size,
+                max_file_size=config.max_file_size,
+                expected_tag=base_tag,
+            )
+    except (PatchDigestMismatchError, DriverContentConflictError):
+        raise FileContentConflictError(file.id)
+    except PatchError:
+        raise FileInvalidPatchError(file.id)
 
     return file
 
@@ -345,30 +605,26 @@ async def move_file(
     return file
 
 
-async def _add_file(
-    parent_id: UUID,
-    name: FileName,
-    /,
-    *,
-    type_: FileType,
-    user_id: UUID,
-    connection: AsyncConnection,
-) -> tuple[File, AsyncConnection]:
-    """
-    Returns the added file and a connection with uncommitted transaction.
-    """
-    insert_file_db_cte = (
-        insert(_FileDb).values(type=type_.value).returning(_FileDb).cte()
+def _make_add_file_query(*, with_id: bool) -> Select[Any]:
+    file_values = (
+        {"id": bindparam("file_id", type_=Uuid()), "type": bindparam("file_type")}
+        if with_id
+        else {"type": bindparam("file_type")}
     )
+    name = bindparam("name", type_=String())
+    user_id = bindparam("user_id", type_=Uuid())
+    insert_file_db_cte = insert(_FileDb).values(file_values).returning(_FileDb).cte()
     insert_share_db_cte = (
         insert(_FileShareDb)
         .from_select(
             ["type", "file_id", "user_id", "created_by"],
             select(
-                literal(FileShareType.SHARE.value).label("type"),
+                literal(FileShareType.SHARE.value, type_=_FileShareDb.type.type).label(
+                    "type"
+                ),
                 insert_file_db_cte.c.id,
-                literal(user_id).label("user_id"),
-                literal(user_id).label("created_by"),
+                user_id.label("user_id"),
+                user_id.label("created_by"),
             ),
         )
         .cte()
@@ -394,13 +650,13 @@ async def _add_file(
                     (_FileAncestorFileDescendantDb.descendant_depth + 1).label("descendant_depth"),
                 ).select_from(
                     _FileAncestorFileDescendantDb, insert_file_db_cte
-                ).where(_FileAncestorFileDescendantDb.descendant_id == parent_id),
+                ).where(_FileAncestorFileDescendantDb.descendant_id == bindparam("parent_id")),
             ),
         )
         .returning(_FileAncestorFileDescendantDb)
         .cte()
     )  # fmt: skip
-    select_file_db_with_parent_id_and_name_query = (
+    return (
         select(
             insert_ancestors_db_cte.c.ancestor_id.label("id"),
             insert_file_db_cte.c.type,
@@ -414,10 +670,39 @@ async def _add_file(
         .add_cte(insert_ancestors_db_cte)
     )  # fmt: skip
 
+
+_ADD_FILE_QUERY = _make_add_file_query(with_id=False)
+_ADD_FILE_WITH_ID_QUERY = _make_add_file_query(with_id=True)
+
+
+async def _add_file(
+    parent_id: UUID,
+    name: FileName,
+    /,
+    *,
+    id_: UUID | None = None,
+    type_: FileType,
+    user_id: UUID,
+    connection: AsyncConnection,
+) -> tuple[File, AsyncConnection]:
+    """
+    Returns the added file and a connection with uncommitted transaction.
+    """
     # FIXME: Handle IntegrityError about "fafd_parent_id_child_name_uidx" that can be
     # caused by insert_ancestors_db_cte.
     file_db_with_parent_id_and_name_row = (
-        (await connection.execute(select_file_db_with_parent_id_and_name_query))
+        (
+            await connection.execute(
+                _ADD_FILE_QUERY if id_ is None else _ADD_FILE_WITH_ID_QUERY,
+                {
+                    "file_id": id_,
+                    "file_type": type_.value,
+                    "parent_id": parent_id,
+                    "name": name,
+                    "user_id": user_id,
+                },
+            )
+        )
         .mappings()
         .one_or_none()
     )
@@ -444,14 +729,12 @@ async def _add_file(
     return file, connection
 
 
-async def _get_file(
-    id_: UUID, *, max_depth: int | None, connection: AsyncConnection
-) -> File:
+def _make_get_file_query(*, deep: bool, depth_limited: bool) -> Select[Any]:
     descendant_alias = aliased(_FileAncestorFileDescendantDb)
     descendant_file_alias = aliased(_FileDb)
     descendant_parent_alias = aliased(_FileAncestorFileDescendantDb)
 
-    if max_depth is not None and max_depth >= 0 and max_depth <= 1:
+    if not deep:
         query = (
             select(
                 descendant_alias.descendant_id.label("id"),
@@ -461,9 +744,9 @@ async def _get_file(
             )
             .select_from(descendant_alias)
             .outerjoin(descendant_file_alias, descendant_alias.descendant_id == descendant_file_alias.id)
-            .where((descendant_alias.ancestor_id == id_) & (descendant_alias.descendant_depth <= max_depth))
+            .where(descendant_alias.ancestor_id == bindparam("file_id"))
         )  # fmt: skip
-    elif max_depth is None or max_depth >= 2:
+    else:
         query = (
             select(
                 descendant_alias.descendant_id.label("id"),
@@ -474,15 +757,35 @@ async def _get_file(
             .select_from(descendant_alias)
             .outerjoin(descendant_file_alias, descendant_alias.descendant_id == descendant_file_alias.id)
             .outerjoin(descendant_parent_alias, (descendant_alias.descendant_id == descendant_parent_alias.descendant_id) & (descendant_parent_alias.descendant_depth == 1))
-            .where(descendant_alias.ancestor_id == id_)
+            .where(descendant_alias.ancestor_id == bindparam("file_id"))
         )  # fmt: skip
-        if max_depth is not None:
-            query = query.where(descendant_alias.descendant_depth <= max_depth)
+    if depth_limited:
+        query = query.where(descendant_alias.descendant_depth <= bindparam("max_depth"))
+    return query
+
+
+# Reading a file at depth 0 or 1 needs no join for parents, they are the file itself.
+_GET_SHALLOW_FILE_QUERY = _make_get_file_query(deep=False, depth_limited=True)
+_GET_DEEP_FILE_QUERY = _make_get_file_query(deep=True, depth_limited=True)
+_GET_FULL_FILE_QUERY = _make_get_file_query(deep=True, depth_limited=False)
+
+
+async def _get_file(
+    id_: UUID, *, max_depth: int | None, connection: AsyncConnection
+) -> File:
+    if max_depth is not None and max_depth >= 0 and max_depth <= 1:
+        query = _GET_SHALLOW_FILE_QUERY
+    elif max_depth is not None and max_depth >= 2:
+        query = _GET_DEEP_FILE_QUERY
+    elif max_depth is None:
+        query = _GET_FULL_FILE_QUERY
     else:
         raise ValueError("Invalid max_depth")
 
     descendant_files_db_with_parent_id_and_name_rows = (
-        (await connection.execute(query)).mappings().all()
+        (await connection.execute(query, {"file_id": id_, "max_depth": max_depth}))
+        .mappings()
+        .all()
     )
     if not descendant_files_db_with_parent_id_and_name_rows:
         raise FileFileNotFoundError(id_)
@@ -501,24 +804,15 @@ async def _get_file(
     return file
 
 
-async def _move_file(
-    id_: UUID,
-    new_parent_id: UUID,
-    new_name: FileName,
-    /,
-    *,
-    connection: AsyncConnection,
-) -> tuple[File, AsyncConnection]:
-    """
-    Returns the moved file and a connection with uncommitted transaction.
-    """
+def _make_move_file_query() -> Select[Any]:
+    new_name = bindparam("new_name", type_=String())
     select_descendants_db_cte = (
         select(
             _FileAncestorFileDescendantDb.descendant_id,
             _FileAncestorFileDescendantDb.descendant_path,
             _FileAncestorFileDescendantDb.descendant_depth,
         )
-        .where(_FileAncestorFileDescendantDb.ancestor_id == id_)
+        .where(_FileAncestorFileDescendantDb.ancestor_id == bindparam("file_id"))
         .cte()
     )
     delete_old_descendant_ancestors_db_cte = (
@@ -536,18 +830,18 @@ async def _move_file(
                 select_descendants_db_cte.c.descendant_id,
                 case(
                     (and_(_FileAncestorFileDescendantDb.descendant_path == ".", select_descendants_db_cte.c.descendant_path == "."), new_name),
-                    (and_(_FileAncestorFileDescendantDb.descendant_path == ".", select_descendants_db_cte.c.descendant_path != "."), literal(new_name) + "/" + select_descendants_db_cte.c.descendant_path),
+                    (and_(_FileAncestorFileDescendantDb.descendant_path == ".", select_descendants_db_cte.c.descendant_path != "."), new_name + "/" + select_descendants_db_cte.c.descendant_path),
                     (and_(_FileAncestorFileDescendantDb.descendant_path != ".", select_descendants_db_cte.c.descendant_path == "."), _FileAncestorFileDescendantDb.descendant_path + "/" + new_name),
                     else_=(_FileAncestorFileDescendantDb.descendant_path + "/" + new_name + "/" + select_descendants_db_cte.c.descendant_path),
                 ).label("descendant_path"),
                 (_FileAncestorFileDescendantDb.descendant_depth + select_descendants_db_cte.c.descendant_depth + 1).label("descendant_depth"),
             )
             .select_from(select_descendants_db_cte, _FileAncestorFileDescendantDb)
-            .where(_FileAncestorFileDescendantDb.descendant_id == new_parent_id)
+            .where(_FileAncestorFileDescendantDb.descendant_id == bindparam("new_parent_id"))
         )
         .cte()
     )  # fmt: skip
-    select_file_db_with_parent_id_and_name_query = (
+    return (
         select(
             select_descendants_db_cte.c.descendant_id.label("id"),
             _FileDb.type,
@@ -555,17 +849,37 @@ async def _move_file(
             literal(None).label("name"),
         )
         .select_from(select_descendants_db_cte)
-        .where(select_descendants_db_cte.c.descendant_id == id_)
+        .where(select_descendants_db_cte.c.descendant_id == bindparam("file_id"))
         .outerjoin(_FileDb, select_descendants_db_cte.c.descendant_id == _FileDb.id)
         .add_cte(select_descendants_db_cte)
         .add_cte(delete_old_descendant_ancestors_db_cte)
         .add_cte(insert_new_descendant_ancestors_db_cte)
     )
 
+
+_MOVE_FILE_QUERY = _make_move_file_query()
+
+
+async def _move_file(
+    id_: UUID,
+    new_parent_id: UUID,
+    new_name: FileName,
+    /,
+    *,
+    connection: AsyncConnection,
+) -> tuple[File, AsyncConnection]:
+    """
+    Returns the moved file and a connection with uncommitted transaction.
+    """
     # FIXME: Handle IntegrityError about "fafd_parent_id_child_name_uidx" that can be
     # caused by insert_new_descendant_ancestors_db_cte.
     file_db_with_parent_id_and_name_row = (
-        (await connection.execute(select_file_db_with_parent_id_and_name_query))
+        (
+            await connection.execute(
+                _MOVE_FILE_QUERY,
+                {"file_id": id_, "new_parent_id": new_parent_id, "new_name": new_name},
+            )
+        )
         .mappings()
         .one_or_none()
     )
@@ -592,12 +906,7 @@ async def _move_file(
     return file, connection
 
 
-async def _remove_file(
-    id_: UUID, /, *, connection: AsyncConnection
-) -> tuple[File, AsyncConnection]:
-    """
-    Returns the removed file and a connection with uncommitted transaction.
-    """
+def _make_remove_file_query() -> Select[Any]:
     fafd1 = aliased(_FileAncestorFileDescendantDb)
     fafd2 = aliased(_FileAncestorFileDescendantDb)
     select_descendant_files_db_with_parent_id_and_name_cte = (
@@ -609,7 +918,7 @@ async def _remove_file(
         )
         # Select descendants (the descendants include the file itself)
         .select_from(fafd1)
-        .where(fafd1.ancestor_id == id_)
+        .where(fafd1.ancestor_id == bindparam("file_id"))
         # Select file for each descendant (should exist)
         .outerjoin(_FileDb, fafd1.descendant_id == _FileDb.id)
         # Select parent ID and name for each descendant if exists
@@ -639,7 +948,7 @@ async def _remove_file(
         )
         .cte()
     )
-    select_descendant_files_db_with_parent_id_and_name_query = (
+    return (
         select(
             select_descendant_files_db_with_parent_id_and_name_cte.c.id,
             select_descendant_files_db_with_parent_id_and_name_cte.c.type,
@@ -652,11 +961,27 @@ async def _remove_file(
         .add_cte(delete_descendant_files_db_cte)
     )  # fmt: skip
 
+
+_REMOVE_FILE_QUERY = _make_remove_file_query()
+
+_LOCK_FILE_QUERY = (
+    select(_FileDb.id)
+    .where(_FileDb.id == bindparam("file_id"))
+    .with_for_update(read=True)
+)
+
+
+async def _remove_file(
+    id_: UUID, /, *, connection: AsyncConnection
+) -> tuple[File, AsyncConnection]:
+    """
+    Returns the removed file and a connection with uncommitted transaction.
+    """
     descendant_files_db_with_parent_id_and_name_rows = (
-        (await connection.execute(select_descendant_files_db_with_parent_id_and_name_query))
+        (await connection.execute(_REMOVE_FILE_QUERY, {"file_id": id_}))
         .mappings()
         .all()
-    )  # fmt: skip
+    )
     if not descendant_files_db_with_parent_id_and_name_rows:
         raise FileFileNotFoundError(id_)
 
@@ -840,6 +1165,204 @@ def _file_to_file_with_depth_0(file: File, /) -> File:
     return file_with_depth_0
 
 
+def _make_check_share_for_file_and_user_query() -> Select[Any]:
+    # Probes the user's effective share on each ancestor of the file (the file
+    # included) by primary key.
+    return (
+        select(_FileEffectiveShareDb.file_id)
+        .select_from(_FileAncestorFileDescendantDb)
+        .join(
+            _FileEffectiveShareDb,
+            (_FileEffectiveShareDb.user_id == bindparam("user_id"))
+            & (_FileEffectiveShareDb.file_id == _FileAncestorFileDescendantDb.ancestor_id),
+        )
+        .where(_FileAncestorFileDescendantDb.descendant_id == bindparam("file_id"))
+        .where(_FileEffectiveShareDb.type.in_(bindparam("allowed_types", expanding=True)))
+        .limit(1)
+    )  # fmt: skip
+
+
+_CHECK_SHARE_FOR_FILE_AND_USER_QUERY = _make_check_share_for_file_and_user_query()
+
+
+def _make_file_shares_batch_cte() -> CTE:
+    # The batch is bound as three parallel arrays, so the statements are the same
+    # however many shares there are.
+    batch = (
+        func.unnest(
+            bindparam("file_ids", type_=postgresql.ARRAY(Uuid())),
+            bindparam("user_ids", type_=postgresql.ARRAY(Uuid())),
+            bindparam("types", type_=postgresql.ARRAY(String())),
+        )
+        .table_valued(
+            column("file_id", Uuid()),
+            column("user_id", Uuid()),
+            column("type", String()),
+        )
+        .render_derived()
+    )
+    return select(
+        batch.c.file_id,
+        batch.c.user_id,
+        cast(batch.c.type, _FileShareDb.type.type).label("type"),
+    ).cte("batch")
+
+
+def _make_share_files_query() -> Any:
+    batch_cte = _make_file_shares_batch_cte()
+    other_batch = batch_cte.alias("other_batch")
+    ancestor = aliased(_FileAncestorFileDescendantDb)
+    other_ancestor = aliased(_FileAncestorFileDescendantDb)
+
+    # A share is implied if the user already has a direct share of the type or a
+    # stronger one on the file or an ancestor. Share types are ordered from the
+    # weakest to the strongest. Shares through groups don't imply it, since the user
+    # would lose the access when leaving the group.
+    implied_by_direct_share = (
+        select(ancestor.ancestor_id)
+        .join(
+            _FileShareDb,
+            (_FileShareDb.user_id == batch_cte.c.user_id)
+            & (_FileShareDb.file_id == ancestor.ancestor_id),
+        )
+        .where(ancestor.descendant_id == batch_cte.c.file_id)
+        .where(_FileShareDb.type >= batch_cte.c.type)
+        .exists()
+    )
+    # Or if another share of the batch to the same user is on an ancestor with the
+    # type or a stronger one, or on the same file with a stronger type.
+    implied_by_batch_share = (
+        select(other_batch.c.file_id)
+        .join(
+            other_ancestor,
+            (other_ancestor.ancestor_id == other_batch.c.file_id)
+            & (other_ancestor.descendant_id == batch_cte.c.file_id),
+        )
+        .where(other_batch.c.user_id == batch_cte.c.user_id)
+        .where(other_batch.c.type >= batch_cte.c.type)
+        .where((other_ancestor.descendant_depth > 0) | (other_batch.c.type > batch_cte.c.type))
+        .exists()
+    )  # fmt: skip
+
+    return (
+        postgresql.insert(_FileShareDb)
+        .from_select(
+            ["file_id", "user_id", "type", "created_by"],
+            select(
+                batch_cte.c.file_id,
+                batch_cte.c.user_id,
+                batch_cte.c.type,
+                bindparam("created_by", type_=Uuid()),
+            )
+            .distinct()
+            .where(~implied_by_direct_share)
+            .where(~implied_by_batch_share),
+        )
+        .on_conflict_do_nothing()
+        .returning(_FileShareDb.file_id, _FileShareDb.user_id, _FileShareDb.type)
+    )
+
+
+def _make_revoke_files_query() -> Any:
+    batch_cte = _make_file_shares_batch_cte()
+    return (
+        delete(_FileShareDb)
+        .where(_FileAncestorFileDescendantDb.ancestor_id == batch_cte.c.file_id)
+        .where(_FileAncestorFileDescendantDb.descendant_id == _FileShareDb.file_id)
+        .where(_FileShareDb.user_id == batch_cte.c.user_id)
+        .where(_FileShareDb.type >= batch_cte.c.type)
+        .returning(_FileShareDb.file_id, _FileShareDb.user_id, _FileShareDb.type)
+    )
+
+
+_SHARE_FILES_QUERY = _make_share_files_query()
+_REVOKE_FILES_QUERY = _make_revoke_files_query()
+
+
+async def _write_file_shares(
+    query: Any,
+    file_share_writes: list[FileShareWrite],
+    /,
+    *,
+    from_user_id: UUID,
+    working_file_id: UUID,
+    config: Config,
+    connection: AsyncConnection,
+) -> list[FileShare]:
+    ids = await _paths_to_ids(
+        [w.path for w in file_share_writes],
+        root_file_id=config.root_file_id,
+        working_file_id=working_file_id,
+        connection=connection,
+    )
+
+    await _check_share_for_files_and_user(
+        allowed_types=[FileShareType.SHARE],
+        file_ids=ids,
+        user_id=from_user_id,
+        connection=connection,
+    )
+
+    rows = (
+        await connection.execute(
+            query,
+            {
+                "file_ids": ids,
+                "user_ids": [w.user_id for w in file_share_writes],
+                "types": [w.type.value for w in file_share_writes],
+                "created_by": from_user_id,
+            },
+        )
+    ).all()
+
+    await connection.commit()
+
+    return [
+        FileShare(file_id=file_id, user_id=user_id, type=FileShareType(type_))
+        for file_id, user_id, type_ in rows
+    ]
+
+
+def _make_get_shared_files_query(
+    *, after: bool
+) -> Select[UUID, str, str, datetime | None, str]:
+    # Scans fes_user_id_shared_at_file_id_idx from the cursor, so a page costs the
+    # same however many files are shared with the user.
+    query = (
+        select(
+            _FileDb.id,
+            _FileDb.type,
+            _FileEffectiveShareDb.type.label("share_type"),
+            _FileEffectiveShareDb.shared_at,
+            _FileAncestorFileDescendantDb.descendant_path,
+        )
+        .select_from(_FileEffectiveShareDb)
+        .join(_FileDb, _FileDb.id == _FileEffectiveShareDb.file_id)
+        .join(
+            _FileAncestorFileDescendantDb,
+            (_FileAncestorFileDescendantDb.ancestor_id == bindparam("root_file_id"))
+            & (_FileAncestorFileDescendantDb.descendant_id == _FileEffectiveShareDb.file_id),
+        )
+        .where(_FileEffectiveShareDb.user_id == bindparam("user_id"))
+        .where(_FileEffectiveShareDb.shared_at.is_not(None))
+        .order_by(_FileEffectiveShareDb.shared_at.desc(), _FileEffectiveShareDb.file_id.desc())
+        .limit(bindparam("limit"))
+    )  # fmt: skip
+    if after:
+        query = query.where(
+            tuple_(_FileEffectiveShareDb.shared_at, _FileEffectiveShareDb.file_id)
+            < tuple_(
+                bindparam("after_shared_at", type_=DateTime(timezone=True)),
+                bindparam("after_file_id", type_=Uuid()),
+            )
+        )
+    return query
+
+
+_GET_SHARED_FILES_QUERY = _make_get_shared_files_query(after=False)
+_GET_SHARED_FILES_AFTER_QUERY = _make_get_shared_files_query(after=True)
+
+
 async def _check_share_for_file_and_user(
     *,
     allowed_types: list[FileShareType],
@@ -847,33 +1370,48 @@ async def _check_share_for_file_and_user(
     user_id: UUID,
     connection: AsyncConnection,
 ) -> None:
-    ancestor_file_ids_cte = (
-        select(_FileAncestorFileDescendantDb.ancestor_id)
-        .where(_FileAncestorFileDescendantDb.descendant_id == file_id)
-        .cte()
-    )
-    ancestor_user_ids_cte = (
-        select(UserAncestorUserDescendantDb.ancestor_id)
-        .where(UserAncestorUserDescendantDb.descendant_id == user_id)
-        .cte()
-    )
-    share_id_query = (
-        select(_FileShareDb.id)
-        .select_from(_FileShareDb)
-        .join(ancestor_file_ids_cte, _FileShareDb.file_id == ancestor_file_ids_cte.c.ancestor_id)
-        .join(ancestor_user_ids_cte, _FileShareDb.user_id == ancestor_user_ids_cte.c.ancestor_id)
-        .where(_FileShareDb.type.in_([t.value for t in allowed_types]))
-        .limit(1)
-        .add_cte(ancestor_file_ids_cte)
-        .add_cte(ancestor_user_ids_cte)
-    )  # fmt: skip
-    share_id = (
-        (await connection.execute(share_id_query)).scalars().one_or_none()
+    share_file_id = (
+        (
+            await connection.execute(
+                _CHECK_SHARE_FOR_FILE_AND_USER_QUERY,
+                {
+                    "file_id": file_id,
+                    "user_id": user_id,
+                    "allowed_types": [t.value for t in allowed_types],
+                },
+            )
+        )
+        .scalars()
+        .one_or_none()
     )  # TODO: Log
-    if share_id is None:
+    if share_file_id is None:
         raise FilePermissionError(file_id)
 
 
+async def _check_share_for_files_and_user(
+    *,
+    allowed_types: list[FileShareType],
+    file_ids: list[UUID],
+    user_id: UUID,
+    connection: AsyncConnection,
+) -> None:
+    query = (
+        select(_FileAncestorFileDescendantDb.descendant_id)
+        .distinct()
+        .join(
+            _FileEffectiveShareDb,
+            (_FileEffectiveShareDb.user_id == user_id)
+            & (_FileEffectiveShareDb.file_id == _FileAncestorFileDescendantDb.ancestor_id),
+        )
+        .where(_FileAncestorFileDescendantDb.descendant_id.in_(file_ids))
+        .where(_FileEffectiveShareDb.type.in_([t.value for t in allowed_types]))
+    )  # fmt: skip
+    share_file_ids = set((await connection.execute(query)).scalars().all())
+    for file_id in file_ids:
+        if file_id not in share_file_ids:
+            raise FilePermissionError(file_id)
+
+
 async def _path_to_id(
     path: FilePath,
     /,
@@ -895,6 +1433,50 @@ async def _path_to_id(
     return id_
 
 
+async def _paths_to_ids(
+    paths: list[FilePath],
+    /,
+    *,
+    root_file_id: UUID,
+    working_file_id: UUID,
+    connection: AsyncConnection,
+) -> list[UUID]:
+    """
+    Resolves the paths with a query per distinct ancestor, that is at most two.
+    """
+    ancestor_ids_and_descendant_paths = [
+        _path_to_ancestor_id_and_descendant_path(
+            p, root_file_id=root_file_id, working_file_id=working_file_id
+        )
+        for p in paths
+    ]
+
+    ancestor_id_to_descendant_paths: defaultdict[UUID, list[FilePath]] = defaultdict(
+        list
+    )
+    for ancestor_id, descendant_path in ancestor_ids_and_descendant_paths:
+        ancestor_id_to_descendant_paths[ancestor_id].append(descendant_path)
+
+    ancestor_id_and_descendant_path_to_id: dict[tuple[UUID, FilePath], UUID] = {}
+    for ancestor_id, descendant_paths in ancestor_id_to_descendant_paths.items():
+        descendant_path_to_id = await _ancestor_id_and_descendant_paths_to_ids(
+            ancestor_id, descendant_paths, connection=connection
+        )
+        for descendant_path, id_ in descendant_path_to_id.items():
+            ancestor_id_and_descendant_path_to_id[(ancestor_id, descendant_path)] = id_
+
+    ids: list[UUID] = []
+    for ancestor_id, descendant_path in ancestor_ids_and_descendant_paths:
+        id_or_none = ancestor_id_and_descendant_path_to_id.get(
+            (ancestor_id, descendant_path)
+        )
+        if id_or_none is None:
+            raise FileFileNotFoundError(ancestor_id, descendant_path)
+        ids.append(id_or_none)
+
+    return ids
+
+
 async def _id_to_parent_id(id_: UUID, /, *, connection: AsyncConnection) -> UUID:
     parent_id_query = (
         select(_FileAncestorFileDescendantDb.ancestor_id)
@@ -1039,6 +1621,24 @@ async def _ancestor_id_and_descendant_path_to_id_or_none(
     return descendant_path_to_id.get(descendant_path)
 
 
+# The closure table may be hash-partitioned by ancestor_id (see
+# provision.partition_file_closure). Lookups of descendants compare ancestor_id with a
+# bound parameter rather than a joined column, so PostgreSQL prunes them to a single
+# partition even with generic plans of prepared statements.
+_DESCENDANT_PATHS_TO_IDS_QUERY = (
+    select(
+        _FileAncestorFileDescendantDb.descendant_path,
+        _FileAncestorFileDescendantDb.descendant_id,
+    )
+    .where(_FileAncestorFileDescendantDb.ancestor_id == bindparam("ancestor_id"))
+    .where(
+        _FileAncestorFileDescendantDb.descendant_path.in_(
+            bindparam("descendant_paths", expanding=True)
+        )
+    )
+)
+
+
 async def _ancestor_id_and_descendant_paths_to_ids(
     ancestor_id: UUID,
     descendant_paths: list[FilePath],
@@ -1046,20 +1646,18 @@ async def _ancestor_id_and_descendant_paths_to_ids(
     *,
     connection: AsyncConnection,
 ) -> dict[FilePath, UUID]:
-    descendant_path_to_id_query = (
-        select(
-            _FileAncestorFileDescendantDb.descendant_path,
-            _FileAncestorFileDescendantDb.descendant_id,
-        )
-        .where(_FileAncestorFileDescendantDb.ancestor_id == ancestor_id)
-        .where(
-            _FileAncestorFileDescendantDb.descendant_path.in_(
-                str(p) for p in descendant_paths
+    descendant_path_to_id_rows = (
+        (
+            await connection.execute(
+                _DESCENDANT_PATHS_TO_IDS_QUERY,
+                {
+                    "ancestor_id": ancestor_id,
+                    "descendant_paths": [str(p) for p in descendant_paths],
+                },
             )
         )
-    )
-    descendant_path_to_id_rows = (
-        (await connection.execute(descendant_path_to_id_query)).mappings().all()
+        .mappings()
+        .all()
     )
     descendant_path_to_id: dict[FilePath, UUID] = {
         PurePosixPath(row["descendant_path"]): row["descendant_id"]  # pyright: ignore[reportAny]  # basedpyright-specific
@@ -1111,13 +1709,35 @@ def file_to_file_out(
             assert_never(file)
 
 
+def driver_version_to_regular_version_out(
+    id_: UUID, version: DriverVersion, /, *, config: Config
+) -> RegularVersionOut:
+    return RegularVersionOut(
+        version=version.version,
+        size=version.size,
+        created_at=version.created_at,
+        content=RegularContentOut(
+            url=_make_regular_content_url(
+                id_, version=version.version, files_base_url=config.files_base_url
+            )
+        ),
+    )
+
+
 def _make_regular_content_url(
     id_: UUID,
     /,
     *,
+    version: int | None = None,
     files_base_url: str,
 ) -> str:
     scheme, netloc, files_base_path, _, _ = urlsplit(files_base_url)
     path = str(PurePosixPath(files_base_path)) + "/."
-    query = urlencode({"content": True, "working_file_id": str(id_)})
+    query_params: dict[str, str | bool | int] = {
+        "content": True,
+        "working_file_id": str(id_),
+    }
+    if version is not None:
+        query_params["version"] = version
+    query = urlencode(query_params)
     return urlunsplit((scheme, netloc, path, query, ""))
@@ -0,0 +1,86 @@
+from collections.abc import AsyncIterator
+from typing import Protocol
+
+
+class AsyncReadable(Protocol):
+    async def read(self, size: int = ..., /) -> bytes: ...
+
+
+class AsyncIteratorReader:
+    """
+    Adapts an async iterator of chunks to AsyncReadable.
+    """
+
+    def __init__(self, iterator: AsyncIterator[bytes], /) -> None:
+        self._iterator = iterator
+        self._buffer = bytearray()
+        self._is_exhausted = False
+
+    async def read(self, size: int = -1, /) -> bytes:
+        while not self._is_exhausted and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += await anext(self._iterator)
+            except StopAsyncIteration:
+                self._is_exhausted = True
+
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+class BytesReader:
+    """
+    Adapts bytes to AsyncReadable.
+    """
+
+    def __init__(self, content: bytes, /) -> None:
+        self._content = memoryview(content)
+        self._position = 0
+
+    async def read(self, size: int = -1, /) -> bytes:
+        start = self._position
+        end = len(self._content) if size < 0 else min(start + size, len(self._content))
+        self._position = end
+        return bytes(self._content[start:end])
+
+
+class PrefixedReader:
+    """
+    Prepends bytes that have already been read from an AsyncReadable back to it.
+    """
+
+    def __init__(self, prefix: bytes, stream: AsyncReadable, /) -> None:
+        self._prefix = BytesReader(prefix)
+        self._prefix_size = len(prefix)
+        self._stream = stream
+
+    async def read(self, size: int = -1, /) -> bytes:
+        if self._prefix_size > 0:
+            chunk = await self._prefix.read(size)
+            self._prefix_size -= len(chunk)
+            if size < 0:
+                return chunk + await self._stream.read()
+            return chunk
+        return await self._stream.read(size)
+
+
+class LimitedReader:
+    """
+    Reads at most size bytes from an AsyncReadable.
+    """
+
+    def __init__(self, stream: AsyncReadable, size: int, /) -> None:
+        self._stream = stream
+        self._size = size
+
+    async def read(self, size: int = -1, /) -> bytes:
+        if size < 0 or size > self._size:
+            size = self._size
+        if size == 0:
+            return b""
+
+        chunk = await self._stream.read(size)
+        self._size -= len(chunk)
+        return chunk
@@ -0,0 +1,407 @@
+import asyncio
+import fcntl
+import functools
+import os
+import shutil
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import Executor
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from pathlib import Path
+from uuid import UUID, uuid4
+
+import aiofiles.os
+from typing_extensions import override
+
+from ._cache import ContentCacheStats
+from ._driver import Driver, DriverUpload, DriverVersion
+from ._stream import AsyncReadable, LimitedReader
+
+_ENTRIES_DIR_PREFIX = "entries-"
+_LOCK_NAME = "lock"
+
+
+class TieredCache:
+    """
+    An LRU cache of regular contents on local disk bounded by the total size of the
+    contents.
+
+    Entries are keyed by file ID and content tag (see Driver.read_regular_content_tag)
+    like the ContentCache's, so a content replaced through another process is never
+    served from the cache. Concurrent fills of one entry are coalesced into a single
+    read of the backing driver.
+
+    Every cache keeps its entries in a directory of its own under the cache directory,
+    so caches of several processes can share the cache directory. The directory is
+    locked while the cache is running and directories of caches that weren't shut
+    down are removed by the next cache that starts up.
+    """
+
+    def __init__(
+        self,
+        /,
+        *,
+        cache_dir: Path,
+        max_size: int,
+        max_entry_size: int,
+        executor: Executor | None = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_entry_size = min(max_entry_size, max_size)
+        self.executor = executor
+        self.entries_dir = cache_dir / f"{_ENTRIES_DIR_PREFIX}{uuid4().hex}"
+
+        # Every entry has a path of its own, so removing a replaced entry's file
+        # never races with storing the new one.
+        self._entries: OrderedDict[UUID, tuple[str, int, Path]] = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._fills: dict[UUID, asyncio.Future[None]] = {}
+        # Contents that are larger than an entry aren't read twice on every miss.
+        self._too_large_tags: dict[UUID, str] = {}
+        self._lock_fd: int | None = None
+
+    async def startup(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._lock_fd = await loop.run_in_executor(
+            self.executor, _make_entries_dir, self.cache_dir, self.entries_dir
+        )
+
+    async def shutdown(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor,
+            functools.partial(shutil.rmtree, self.entries_dir, ignore_errors=True),
+        )
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def get(self, id_: UUID, tag: str, /) -> Path | None:
+        path = self.peek(id_, tag)
+        if path is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(id_)
+        return path
+
+    def peek(self, id_: UUID, tag: str, /) -> Path | None:
+        """
+        Returns the entry's path without affecting the entries' order and statistics.
+        """
+        entry = self._entries.get(id_)
+        if entry is None or entry[0] != tag:
+            return None
+        return entry[2]
+
+    async def fill(
+        self,
+        id_: UUID,
+        tag: str,
+        open_content: Callable[[], AbstractAsyncContextManager[AsyncReadable]],
+        /,
+        *,
+        chunk_size: int,
+    ) -> Path | None:
+        """
+        Stores the content under the tag unless it's larger than an entry and returns
+        the entry's path. The tag must be read before the content is opened. Callers
+        filling an entry that is already being filled wait for that fill instead.
+        """
+        if self._too_large_tags.get(id_) == tag:
+            return None
+
+        fill = self._fills.get(id_)
+        if fill is not None:
+            await asyncio.shield(fill)
+            return self.peek(id_, tag)
+
+        fill = asyncio.get_running_loop().create_future()
+        self._fills[id_] = fill
+        try:
+            async with self._write_entry(id_) as (f, incomplete_path):
+                size = 0
+                async with open_content() as content_f:
+                    while chunk := await content_f.read(chunk_size):
+                        if size + len(chunk) > self.max_entry_size:
+                            self._too_large_tags[id_] = tag
+                            return None
+                        _ = await f.write(chunk)
+                        size += len(chunk)
+                await f.flush()
+                # The content is at least as new as the tag since the tag was read
+                # first, so an entry is never served in place of a newer content.
+                await self._put(id_, tag, incomplete_path, size)
+            return self.peek(id_, tag)
+        finally:
+            del self._fills[id_]
+            fill.set_result(None)
+
+    async def invalidate(self, id_: UUID, /) -> None:
+        """
+        Removes the entry of a replaced content. The entry wouldn't be served anyway
+        since its tag is stale, this only frees its space early.
+        """
+        _ = self._too_large_tags.pop(id_, None)
+        await self._unlink(self._pop(id_))
+
+    def stats(self) -> ContentCacheStats:
+        return ContentCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            entry_count=len(self._entries),
+            size=self._size,
+        )
+
+    @asynccontextmanager
+    async def _write_entry(
+        self, id_: UUID, /
+    ) -> AsyncIterator[tuple[aiofiles.threadpool.binary.AsyncBufferedIOBase, Path]]:
+        path = self.entries_dir / f"{id_.hex}.{uuid4().hex}.incomplete"
+        try:
+            async with aiofiles.open(path, "wb", executor=self.executor) as f:
+                yield f, path
+        finally:
+            await self._unlink(path)
+
+    async def _put(
+        self, id_: UUID, tag: str, incomplete_path: Path, size: int, /
+    ) -> None:
+        path = incomplete_path.with_suffix("")
+        await aiofiles.os.rename(incomplete_path, path, executor=self.executor)
+
+        removed_paths = [self._pop(id_)]
+        self._entries[id_] = (tag, size, path)
+        self._size += size
+        while self._size > self.max_size:
+            removed_paths.append(self._pop(next(iter(self._entries))))
+
+        await self._unlink(*removed_paths)
+
+    def _pop(self, id_: UUID, /) -> Path | None:
+        """
+        Removes the entry from the bookkeeping and returns its path to be unlinked.
+        """
+        entry = self._entries.pop(id_, None)
+        if entry is None:
+            return None
+        self._size -= entry[1]
+        return entry[2]
+
+    async def _unlink(self, *paths: Path | None) -> None:
+        # Readers that have opened an entry keep reading the unlinked file.
+        loop = asyncio.get_running_loop()
+        for path in paths:
+            if path is not None:
+                await loop.run_in_executor(
+                    self.executor, functools.partial(path.unlink, missing_ok=True)
+                )
+
+
+def _make_entries_dir(cache_dir: Path, entries_dir: Path, /) -> int:
+    """
+    Removes abandoned entries directories, makes the entries directory and returns
+    the file descriptor that holds its lock.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _remove_abandoned_entries_dirs(cache_dir)
+
+    # The directory is locked before it gets its final name, so other caches never
+    # see it unlocked.
+    incomplete_dir = cache_dir / f"{uuid4().hex}.incomplete"
+    incomplete_dir.mkdir()
+    lock_fd = os.open(incomplete_dir / _LOCK_NAME, os.O_CREAT | os.O_WRONLY)
+    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    incomplete_dir.rename(entries_dir)
+    return lock_fd
+
+
+def _remove_abandoned_entries_dirs(cache_dir: Path, /) -> None:
+    """
+    Removes the entries directories whose caches weren't shut down. Nothing else in
+    the cache directory is touched.
+    """
+    for entries_dir in cache_dir.glob(f"{_ENTRIES_DIR_PREFIX}*"):
+        try:
+            lock_fd = os.open(entries_dir / _LOCK_NAME, os.O_WRONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # The cache is still running.
+            continue
+        else:
+            shutil.rmtree(entries_dir, ignore_errors=True)
+        finally:
+            os.close(lock_fd)
+
+
+class TieredDriver(Driver):
+    """
+    Keeps recently read regular contents on local disk in front of a slower driver.
+
+    Writes go to the slower driver and only invalidate the cache. A written content
+    isn't cached since its tag can only be read after the write, by which time
+    another process may have replaced the content.
+    """
+
+    def __init__(
+        self, driver: Driver, /, *, cache: TieredCache, chunk_size: int
+    ) -> None:
+        super().__init__()
+        self.driver = driver
+        self.cache = cache
+        self.chunk_size = chunk_size
+
+    @override
+    async def startup(self) -> None:
+        await self.driver.startup()
+
+    @override
+    async def shutdown(self) -> None:
+        await self.driver.shutdown()
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        tag = await self.driver.read_regular_content_tag(id_)
+        if offset or size is not None:
+            # Partial reads are served from the cache but don't fill it.
+            path = self.cache.peek(id_, tag)
+        else:
+            path = self.cache.get(id_, tag)
+            if path is None:
+                path = await self.cache.fill(
+                    id_,
+                    tag,
+                    lambda: self.driver.read_regular_content(id_),
+                    chunk_size=self.chunk_size,
+                )
+
+        if path is not None:
+            try:
+                cached_f = await aiofiles.open(path, "rb", executor=self.cache.executor)
+            except FileNotFoundError:
+                # The entry has been evicted concurrently.
+                ...
+            else:
+                try:
+                    if offset:
+                        _ = await cached_f.seek(offset)
+                    yield cached_f if size is None else LimitedReader(cached_f, size)
+                finally:
+                    await cached_f.close()
+                return
+
+        async with self.driver.read_regular_content(id_, offset=offset, size=size) as f:
+            yield f
+
+    @override
+    async def read_regular_content_tag(self, id_: UUID, /) -> str:
+        return await self.driver.read_regular_content_tag(id_)
+
+    @override
+    async def write_regular_content(
+        self,
+        content_stream: AsyncReadable,
+        id_: UUID,
+        /,
+        *,
+        chunk_size: int,
+        max_file_size: int,
+        expected_tag: str | None = None,
+    ) -> int:
+        try:
+            return await self.driver.write_regular_content(
+                content_stream,
+                id_,
+                chunk_size=chunk_size,
+                max_file_size=max_file_size,
+                expected_tag=expected_tag,
+            )
+        finally:
+            await self.cache.invalidate(id_)
+
+    @override
+    async def remove_regular_content(self, id_: UUID, /) -> None:
+        try:
+            await self.driver.remove_regular_content(id_)
+        finally:
+            await self.cache.invalidate(id_)
+
+    @override
+    async def read_regular_content_versions(self, id_: UUID, /) -> list[DriverVersion]:
+        return await self.driver.read_regular_content_versions(id_)
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content_version(
+        self, id_: UUID, version: int, /
+    ) -> AsyncIterator[AsyncReadable]:
+        async with self.driver.read_regular_content_version(id_, version) as f:
+            yield f
+
+    @override
+    async def create_upload(
+        self, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        return await self.driver.create_upload(
+            user_id=user_id, expire_seconds=expire_seconds
+        )
+
+    @override
+    async def read_upload(
+        self, upload_id: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> DriverUpload:
+        return await self.driver.read_upload(
+            upload_id, user_id=user_id, expire_seconds=expire_seconds
+        )
+
+    @override
+    async def append_upload(
+        self,
+        content_stream: AsyncReadable,
+        upload_id: UUID,
+        /,
+        *,
+        user_id: UUID,
+        offset: int,
+        chunk_size: int,
+        max_file_size: int,
+        expire_seconds: int,
+    ) -> DriverUpload:
+        return await self.driver.append_upload(
+            content_stream,
+            upload_id,
+            user_id=user_id,
+            offset=offset,
+            chunk_size=chunk_size,
+            max_file_size=max_file_size,
+            expire_seconds=expire_seconds,
+        )
+
+    @override
+    async def commit_upload(
+        self, upload_id: UUID, id_: UUID, /, *, user_id: UUID, expire_seconds: int
+    ) -> int:
+        try:
+            return await self.driver.commit_upload(
+                upload_id, id_, user_id=user_id, expire_seconds=expire_seconds
+            )
+        finally:
+            await self.cache.invalidate(id_)
+
+    @override
+    async def remove_upload(self, upload_id: UUID, /, *, user_id: UUID) -> None:
+        await self.driver.remove_upload(upload_id, user_id=user_id)
+
+    @override
+    async def remove_expired_uploads(self, /, *, expire_seconds: int) -> int:
+        return await self.driver.remove_expired_uploads(expire_seconds=expire_seconds)
@@ -0,0 +1,139 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from uuid import UUID
+
+from typing_extensions import override
+
+from ._driver import FileSystemDriver
+from ._stream import AsyncReadable, BytesReader
+from ._tiered import TieredCache, TieredDriver
+
+
+class _CountingDriver(FileSystemDriver):
+    def __init__(self, /, *, file_system_dir: Path) -> None:
+        super().__init__(file_system_dir=file_system_dir)
+        self.read_count = 0
+
+    @override
+    @asynccontextmanager
+    async def read_regular_content(
+        self, id_: UUID, /, *, offset: int = 0, size: int | None = None
+    ) -> AsyncIterator[AsyncReadable]:
+        self.read_count += 1
+        # Lets concurrent readers pile up behind the first one.
+        await asyncio.sleep(0.01)
+        async with super().read_regular_content(id_, offset=offset, size=size) as f:
+            yield f
+
+
+async def test_tiered_driver_read_regular_content(*, tmp_path: Path) -> None:
+    """Tests the TieredDriver.read_regular_content method."""
+    backing_driver = _CountingDriver(file_system_dir=tmp_path / "file-system")
+    cache = TieredCache(cache_dir=tmp_path / "cache", max_size=16, max_entry_size=8)
+    await cache.startup()
+    driver = TieredDriver(backing_driver, cache=cache, chunk_size=4)
+    await driver.startup()
+
+    foo_id = UUID("42bd9c32-1c96-485f-af69-b48536bc3c4a")
+    bar_id = UUID("24bd9c32-1c96-485f-af69-b48536bc3c4a")
+    baz_id = UUID("00bd9c32-1c96-485f-af69-b48536bc3c4a")
+    for id_, content in [
+        (foo_id, b"# Foo\n"),
+        (bar_id, b"# Bar\n"),
+        (baz_id, b"# Baz\n\nQux.\n"),
+    ]:
+        _ = await backing_driver.write_regular_content(
+            BytesReader(content), id_, chunk_size=64, max_file_size=512
+        )
+    await cache.invalidate(foo_id)
+
+    # Case about concurrent cold reads of one file.
+
+    async def read(id_: UUID) -> bytes:
+        async with driver.read_regular_content(id_) as f:
+            return await f.read()
+
+    contents = await asyncio.gather(*(read(foo_id) for _ in range(8)))
+    assert contents == [b"# Foo\n"] * 8
+    assert backing_driver.read_count == 1
+
+    # Case about reading a cached file and a range of it.
+
+    assert await read(foo_id) == b"# Foo\n"
+    async with driver.read_regular_content(foo_id, offset=2, size=3) as f:
+        assert await f.read() == b"Foo"
+    assert backing_driver.read_count == 1
+
+    # Case about reading a file that is larger than an entry.
+
+    assert await read(baz_id) == b"# Baz\n\nQux.\n"
+    assert await read(baz_id) == b"# Baz\n\nQux.\n"
+    assert cache.stats().entry_count == 1
+
+    # Case about reading a file after it has been written through the driver.
+
+    _ = await driver.write_regular_content(
+        BytesReader(b"# Quux\n"), foo_id, chunk_size=4, max_file_size=512
+    )
+    read_count = backing_driver.read_count
+    assert await read(foo_id) == b"# Quux\n"
+    assert await read(foo_id) == b"# Quux\n"
+    assert backing_driver.read_count == read_count + 1
+
+    # Case about reading a file after it has been written by another process.
+
+    _ = await backing_driver.write_regular_content(
+        BytesReader(b"# Corge\n"), foo_id, chunk_size=64, max_file_size=512
+    )
+    assert await read(foo_id) == b"# Corge\n"
+
+    # Case about evicting the least recently used file.
+
+    assert await read(bar_id) == b"# Bar\n"
+    _ = await backing_driver.write_regular_content(
+        BytesReader(b"# Waldo\n"), baz_id, chunk_size=64, max_file_size=512
+    )
+    assert await read(baz_id) == b"# Waldo\n"
+
+    stats = cache.stats()
+    assert (stats.entry_count, stats.size) == (2, 14)
+    foo_tag = await backing_driver.read_regular_content_tag(foo_id)
+    assert cache.peek(foo_id, foo_tag) is None
+
+
+async def test_tiered_cache_dir(*, tmp_path: Path) -> None:
+    """Tests that TieredCaches share their cache directory."""
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "some-file.md").write_bytes(b"# Foo\n")
+
+    # Case about creating caches with a shared cache directory.
+
+    cache = TieredCache(cache_dir=cache_dir, max_size=16, max_entry_size=8)
+    await cache.startup()
+    other_cache = TieredCache(cache_dir=cache_dir, max_size=16, max_entry_size=8)
+    await other_cache.startup()
+    assert cache.entries_dir != other_cache.entries_dir
+    assert cache.entries_dir.is_dir()
+    assert other_cache.entries_dir.is_dir()
+
+    # Case about removing the entries directory of a cache that wasn't shut down.
+
+    abandoned_entries_dir = cache_dir / "entries-42bd9c321c96485faf69b48536bc3c4a"
+    abandoned_entries_dir.mkdir()
+    (abandoned_entries_dir / "lock").touch()
+    (abandoned_entries_dir / "42bd9c321c96485faf69b48536bc3c4a").touch()
+
+    await TieredCache(cache_dir=cache_dir, max_size=16, max_entry_size=8).startup()
+    assert not abandoned_entries_dir.exists()
+    assert cache.entries_dir.is_dir()
+    assert other_cache.entries_dir.is_dir()
+    assert (cache_dir / "some-file.md").read_bytes() == b"# Foo\n"
+
+    # Case about shutting down a cache.
+
+    await cache.shutdown()
+    assert not cache.entries_dir.exists()
+    assert other_cache.entries_dir.is_dir()
@@ -0,0 +1,110 @@
+import difflib
+import struct
+
+# A delta is stored as a header holding the size of the older content followed by
+# edits that build the older content: copies of ranges of the newer content and
+# inserts of data.
+_DELTA_HEADER = struct.Struct(">Q")
+DELTA_HEADER_SIZE = _DELTA_HEADER.size
+
+_COPY = b"c"
+_INSERT = b"i"
+_COPY_EDIT = struct.Struct(">QQ")
+_INSERT_EDIT = struct.Struct(">Q")
+
+_PREFIX_STEP = 4096
+
+
+def make_delta(newer: bytes, older: bytes, /) -> bytes:
+    """
+    Makes a delta that turns the newer content into the older content.
+
+    The contents' common prefix and suffix are copied as they are and the rest is
+    compared line by line, so edits far apart, such as ones to the head and the tail
+    of a note, make one edit each instead of one that spans the content between.
+    """
+    prefix_size = _common_prefix_size(newer, older)
+    suffix_size = _common_suffix_size(
+        newer[prefix_size:], older[prefix_size:]
+    )  # The suffix mustn't overlap the prefix.
+    newer_end = len(newer) - suffix_size
+    older_end = len(older) - suffix_size
+
+    parts = [_DELTA_HEADER.pack(len(older))]
+    if prefix_size > 0:
+        parts.append(_COPY + _COPY_EDIT.pack(0, prefix_size))
+
+    newer_lines = newer[prefix_size:newer_end].splitlines(keepends=True)
+    older_lines = older[prefix_size:older_end].splitlines(keepends=True)
+    newer_offsets = _line_offsets(newer_lines, start=prefix_size)
+    older_offsets = _line_offsets(older_lines, start=prefix_size)
+    matcher = difflib.SequenceMatcher(None, newer_lines, older_lines)
+    for tag, newer_i, newer_j, older_i, older_j in matcher.get_opcodes():
+        if tag == "equal":
+            start = newer_offsets[newer_i]
+            parts.append(_COPY + _COPY_EDIT.pack(start, newer_offsets[newer_j] - start))
+        elif older_i < older_j:
+            data = older[older_offsets[older_i] : older_offsets[older_j]]
+            parts.append(_INSERT + _INSERT_EDIT.pack(len(data)) + data)
+
+    if suffix_size > 0:
+        parts.append(_COPY + _COPY_EDIT.pack(newer_end, suffix_size))
+    return b"".join(parts)
+
+
+def apply_delta(newer: bytes, delta: bytes, /) -> bytes:
+    newer_view, delta_view = memoryview(newer), memoryview(delta)
+    parts: list[memoryview] = []
+
+    i = DELTA_HEADER_SIZE
+    while i < len(delta):
+        kind = delta[i : i + 1]
+        i += 1
+        if kind == _COPY:
+            start, size = _COPY_EDIT.unpack_from(delta, i)
+            i += _COPY_EDIT.size
+            parts.append(newer_view[start : start + size])
+        elif kind == _INSERT:
+            (size,) = _INSERT_EDIT.unpack_from(delta, i)
+            i += _INSERT_EDIT.size
+            parts.append(delta_view[i : i + size])
+            i += size
+        else:
+            raise ValueError(f"Unknown delta edit {kind!r}.")
+
+    return b"".join(parts)
+
+
+def read_delta_size(delta_header: bytes, /) -> int:
+    """
+    Returns the older content's size from the delta's header.
+    """
+    (size,) = _DELTA_HEADER.unpack_from(delta_header)
+    return int(size)
+
+
+def _line_offsets(lines: list[bytes], /, *, start: int) -> list[int]:
+    offsets = [start]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def _common_prefix_size(a: bytes, b: bytes, /) -> int:
+    a_view, b_view = memoryview(a), memoryview(b)
+    size = min(len(a), len(b))
+
+    i = 0
+    while (
+        i + _PREFIX_STEP <= size
+        and a_view[i : i + _PREFIX_STEP] == b_view[i : i + _PREFIX_STEP]
+    ):
+        i += _PREFIX_STEP
+    while i < size and a[i] == b[i]:
+        i += 1
+
+    return i
+
+
+def _common_suffix_size(a: bytes, b: bytes, /) -> int:
+    return _common_prefix_size(a[::-1], b[::-1])
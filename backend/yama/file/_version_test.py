@@ -0,0 +1,42 @@
+import random
+
+from ._version import DELTA_HEADER_SIZE, apply_delta, make_delta, read_delta_size
+
+
+def test_delta() -> None:
+    """Tests making and applying deltas between contents."""
+    rng = random.Random(0)
+    lines = [f"- Item {i}: {rng.randbytes(16).hex()}\n".encode() for i in range(512)]
+    content = b"# Foo\n\n" + b"".join(lines)
+
+    # Case about edits far apart in the content.
+
+    older = content.replace(b"# Foo", b"# Bar").replace(lines[-1], b"- Done.\n")
+    delta = make_delta(content, older)
+    assert apply_delta(content, delta) == older
+    assert read_delta_size(delta[:DELTA_HEADER_SIZE]) == len(older)
+    assert len(delta) < 256
+
+    # Case about identical and unrelated contents.
+
+    assert apply_delta(content, make_delta(content, content)) == content
+    assert apply_delta(content, make_delta(content, b"")) == b""
+    assert apply_delta(b"", make_delta(b"", content)) == content
+    unrelated = rng.randbytes(1024)
+    assert apply_delta(content, make_delta(content, unrelated)) == unrelated
+
+    # Case about random edits of lines.
+
+    for _ in range(64):
+        edited = list(lines)
+        for _ in range(rng.randint(1, 8)):
+            i = rng.randrange(len(edited))
+            match rng.randrange(3):
+                case 0:
+                    del edited[i]
+                case 1:
+                    edited.insert(i, rng.randbytes(rng.randint(0, 32)))
+                case _:
+                    edited[i] = edited[i][:-1] + b" (edited)\r\n"
+        older = b"".join(edited)
+        assert apply_delta(content, make_delta(content, older)) == older
@@ -197,7 +197,7 @@ async def _write_output_files(
         user_id=config.output_user_id,
         working_file_id=config.output_file_id,  # ...inside the global output directory.
         config=file_config,
-        connection=connection,
+        engine=connection.engine,
         driver=driver,
     )
 
@@ -233,7 +233,7 @@ async def _write_output_files(
             user_id=config.output_user_id,
             working_file_id=output_dir.id,  # ...inside the output directory.
             config=file_config,
-            connection=connection,
+            engine=connection.engine,
             driver=driver,
         )
     except Exception as e:
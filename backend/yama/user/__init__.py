@@ -1,3 +1,9 @@
 from ._config import Config as Config
 from ._config import get_config as get_config
+from ._import import UserImportConflict as UserImportConflict
+from ._import import UserImportFormat as UserImportFormat
+from ._import import UserImportReport as UserImportReport
+from ._import import get_import_executor as get_import_executor
+from ._import import import_users as import_users
+from ._import import make_import_executor as make_import_executor
 from ._router import router as router
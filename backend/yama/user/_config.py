@@ -9,6 +9,8 @@ class Config(BaseSettings):
 
     public_user_id: UUID
     root_user_id: UUID
+    import_batch_size: int = 1000
+    import_hash_process_count: int | None = None
 
 
 def get_config(*, request: Request) -> Config:
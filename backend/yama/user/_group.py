@@ -0,0 +1,244 @@
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import (
+    Uuid,
+    bindparam,
+    delete,
+    exists,
+    func,
+    literal,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.orm import aliased
+
+from yama.user.database import UserAncestorUserDescendantDb, UserDb, UserMembershipDb
+
+from ._user import UserType, _add_user
+
+# Memberships are edges from groups to their members and user_ancestors_user_descendants
+# is their transitive closure with the shortest depths. Groups may share members and
+# subgroups, so the closure is maintained as described in "Maintaining Transitive
+# Closure of Graphs in SQL" by Dong et al.: adding an edge from a group to a member
+# connects every ancestor of the group with every descendant of the member, removing
+# it keeps only the affected pairs that are still connected by another edge. Both
+# touch only the affected pairs.
+
+
+class _GroupCycleError(Exception): ...
+
+
+def _make_add_members_ancestors_query() -> Any:
+    group_ancestor = aliased(UserAncestorUserDescendantDb)
+    member_descendant = aliased(UserAncestorUserDescendantDb)
+    insert_query = postgresql.insert(UserAncestorUserDescendantDb).from_select(
+        ["ancestor_id", "descendant_id", "descendant_depth"],
+        select(
+            group_ancestor.ancestor_id,
+            member_descendant.descendant_id,
+            func.min(group_ancestor.descendant_depth + 1 + member_descendant.descendant_depth),
+        )
+        .select_from(group_ancestor)
+        .join(member_descendant, true())
+        .where(group_ancestor.descendant_id == bindparam("group_id"))
+        .where(member_descendant.ancestor_id.in_(bindparam("member_ids", expanding=True)))
+        .group_by(group_ancestor.ancestor_id, member_descendant.descendant_id),
+    )  # fmt: skip
+    return insert_query.on_conflict_do_update(
+        index_elements=["ancestor_id", "descendant_id"],
+        set_={
+            "descendant_depth": func.least(
+                UserAncestorUserDescendantDb.descendant_depth,
+                insert_query.excluded.descendant_depth,
+            )
+        },
+    )
+
+
+def _make_remove_member_ancestors_query() -> Any:
+    group_ancestor = aliased(UserAncestorUserDescendantDb)
+    member_descendant = aliased(UserAncestorUserDescendantDb)
+    group_id = bindparam("group_id", type_=Uuid())
+    member_id = bindparam("member_id", type_=Uuid())
+
+    # The pairs that may have been connected only through the removed edge.
+    affected_cte = (
+        select(
+            group_ancestor.ancestor_id,
+            member_descendant.descendant_id,
+        )
+        .select_from(group_ancestor)
+        .join(member_descendant, true())
+        .where(group_ancestor.descendant_id == group_id)
+        .where(member_descendant.ancestor_id == member_id)
+        .cte("affected")
+    )
+
+    # An affected pair is still connected if it's connected through a remaining edge
+    # from x to y where x isn't a descendant of the member and y isn't an ancestor of
+    # the group, since the pairs on either side of such an edge aren't affected.
+    ax = aliased(UserAncestorUserDescendantDb)
+    yd = aliased(UserAncestorUserDescendantDb)
+    member_of_x = aliased(UserAncestorUserDescendantDb)
+    y_of_group = aliased(UserAncestorUserDescendantDb)
+    connected_cte = (
+        select(
+            affected_cte.c.ancestor_id,
+            affected_cte.c.descendant_id,
+            func.min(ax.descendant_depth + 1 + yd.descendant_depth).label("descendant_depth"),
+        )
+        .select_from(affected_cte)
+        .join(yd, yd.descendant_id == affected_cte.c.descendant_id)
+        .join(UserMembershipDb, UserMembershipDb.member_id == yd.ancestor_id)
+        .join(ax, (ax.ancestor_id == affected_cte.c.ancestor_id) & (ax.descendant_id == UserMembershipDb.group_id))
+        .where(~exists().where((member_of_x.ancestor_id == member_id) & (member_of_x.descendant_id == ax.descendant_id)))
+        .where(~exists().where((y_of_group.ancestor_id == yd.ancestor_id) & (y_of_group.descendant_id == group_id)))
+        .group_by(affected_cte.c.ancestor_id, affected_cte.c.descendant_id)
+        .cte("connected")
+    )  # fmt: skip
+
+    delete_disconnected_cte = (
+        delete(UserAncestorUserDescendantDb)
+        .where(UserAncestorUserDescendantDb.ancestor_id == affected_cte.c.ancestor_id)
+        .where(UserAncestorUserDescendantDb.descendant_id == affected_cte.c.descendant_id)
+        .where(
+            ~exists().where(
+                (connected_cte.c.ancestor_id == affected_cte.c.ancestor_id)
+                & (connected_cte.c.descendant_id == affected_cte.c.descendant_id)
+            )
+        )
+        .cte("delete_disconnected")
+    )  # fmt: skip
+    return (
+        update(UserAncestorUserDescendantDb)
+        .values(descendant_depth=connected_cte.c.descendant_depth)
+        .where(UserAncestorUserDescendantDb.ancestor_id == connected_cte.c.ancestor_id)
+        .where(UserAncestorUserDescendantDb.descendant_id == connected_cte.c.descendant_id)
+        .where(UserAncestorUserDescendantDb.descendant_depth != connected_cte.c.descendant_depth)
+        .add_cte(affected_cte)
+        .add_cte(connected_cte)
+        .add_cte(delete_disconnected_cte)
+    )  # fmt: skip
+
+
+_ADD_MEMBERS_ANCESTORS_QUERY = _make_add_members_ancestors_query()
+_REMOVE_MEMBER_ANCESTORS_QUERY = _make_remove_member_ancestors_query()
+
+
+async def _create_group(
+    *, handle: str, created_by: UUID, connection: AsyncConnection
+) -> UserDb:
+    """
+    Creates the group with its creator as the first member and admin. Returns the
+    group, the connection's transaction is left uncommitted.
+    """
+    group_db = await _add_user(
+        type_=UserType.GROUP, handle=handle, password_hash=None, connection=connection
+    )
+    _ = await _add_group_members(
+        group_db.id, [created_by], is_admin=True, connection=connection
+    )
+    return group_db
+
+
+async def _add_group_members(
+    group_id: UUID,
+    member_ids: list[UUID],
+    /,
+    *,
+    is_admin: bool = False,
+    connection: AsyncConnection,
+) -> list[UUID]:
+    """
+    Adds the members to the group in bulk and returns the IDs of the ones that
+    weren't members yet. The connection's transaction is left uncommitted.
+    """
+    # A group can't become its own member, not even through its subgroups.
+    cycle_query = select(
+        exists()
+        .where(UserAncestorUserDescendantDb.ancestor_id.in_(member_ids))
+        .where(UserAncestorUserDescendantDb.descendant_id == group_id)
+    )
+    if (await connection.execute(cycle_query)).scalar_one():
+        raise _GroupCycleError()
+
+    insert_memberships_query = (
+        postgresql.insert(UserMembershipDb)
+        .from_select(
+            ["group_id", "member_id", "is_admin"],
+            select(
+                literal(group_id, type_=Uuid()),
+                func.unnest(literal(member_ids, type_=postgresql.ARRAY(Uuid()))),
+                literal(is_admin),
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(UserMembershipDb.member_id)
+    )
+    new_member_ids = list(
+        (await connection.execute(insert_memberships_query)).scalars().all()
+    )
+    if new_member_ids:
+        _ = await connection.execute(
+            _ADD_MEMBERS_ANCESTORS_QUERY,
+            {"group_id": group_id, "member_ids": new_member_ids},
+        )
+
+    return new_member_ids
+
+
+async def _remove_group_member(
+    group_id: UUID, member_id: UUID, /, *, connection: AsyncConnection
+) -> bool:
+    """
+    Removes the member from the group and returns whether it was a member. The
+    connection's transaction is left uncommitted.
+    """
+    delete_membership_query = (
+        delete(UserMembershipDb)
+        .where(UserMembershipDb.group_id == group_id)
+        .where(UserMembershipDb.member_id == member_id)
+        .returning(UserMembershipDb.member_id)
+    )
+    if (await connection.execute(delete_membership_query)).first() is None:
+        return False
+
+    _ = await connection.execute(
+        _REMOVE_MEMBER_ANCESTORS_QUERY, {"group_id": group_id, "member_id": member_id}
+    )
+    return True
+
+
+async def _read_group_members(
+    group_id: UUID, /, *, connection: AsyncConnection
+) -> list[UserDb]:
+    query = (
+        select(UserDb)
+        .join(UserMembershipDb, UserMembershipDb.member_id == UserDb.id)
+        .where(UserMembershipDb.group_id == group_id)
+        .order_by(UserDb.handle)
+    )
+    rows = (await connection.execute(query)).mappings()
+    return [UserDb(**row) for row in rows]
+
+
+async def _can_manage_group(
+    group_id: UUID, /, *, user_id: UUID, root_user_id: UUID, connection: AsyncConnection
+) -> bool:
+    """
+    Returns whether the user is the root user or an admin of the group. Admins are
+    direct members, so members of the group's subgroups don't manage it.
+    """
+    if user_id == root_user_id:
+        return True
+    query = select(
+        exists()
+        .where(UserMembershipDb.group_id == group_id)
+        .where(UserMembershipDb.member_id == user_id)
+        .where(UserMembershipDb.is_admin)
+    )
+    return (await connection.execute(query)).scalar_one()
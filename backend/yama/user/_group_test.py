@@ -0,0 +1,93 @@
+import random
+from collections import deque
+
+# The closure queries in _group run against PostgreSQL only, so these tests check
+# their set logic on in-memory graphs instead: the closure is a mapping of ancestor
+# and descendant pairs to the shortest depths and the memberships are edges.
+
+_Closure = dict[tuple[int, int], int]
+
+
+def _add_members(
+    closure: _Closure, memberships: set[tuple[int, int]], group: int, members: list[int]
+) -> None:
+    """Mirrors _ADD_MEMBERS_ANCESTORS_QUERY."""
+    new_members = [m for m in members if (group, m) not in memberships]
+    memberships.update((group, m) for m in new_members)
+
+    depths: _Closure = {}
+    for (a, x), ax_depth in closure.items():
+        if x != group:
+            continue
+        for (y, d), yd_depth in closure.items():
+            if y in new_members:
+                depth = ax_depth + 1 + yd_depth
+                depths[a, d] = min(depths.get((a, d), depth), depth)
+    for pair, depth in depths.items():
+        closure[pair] = min(closure.get(pair, depth), depth)
+
+
+def _remove_member(
+    closure: _Closure, memberships: set[tuple[int, int]], group: int, member: int
+) -> None:
+    """Mirrors _REMOVE_MEMBER_ANCESTORS_QUERY."""
+    memberships.remove((group, member))
+
+    affected = [
+        (a, d) for (a, x) in closure if x == group for (y, d) in closure if y == member
+    ]
+    connected: _Closure = {}
+    for a, d in affected:
+        for x, y in memberships:
+            if (
+                (a, x) in closure
+                and (y, d) in closure
+                and (member, x) not in closure
+                and (y, group) not in closure
+            ):
+                depth = closure[a, x] + 1 + closure[y, d]
+                connected[a, d] = min(connected.get((a, d), depth), depth)
+
+    for pair in affected:
+        if pair in connected:
+            closure[pair] = connected[pair]
+        else:
+            del closure[pair]
+
+
+def _make_closure(users: range, memberships: set[tuple[int, int]]) -> _Closure:
+    closure: _Closure = {}
+    for u in users:
+        queue = deque([(u, 0)])
+        while queue:
+            d, depth = queue.popleft()
+            if (u, d) in closure:
+                continue
+            closure[u, d] = depth
+            queue.extend((m, depth + 1) for g, m in memberships if g == d)
+    return closure
+
+
+def test_group_closure() -> None:
+    """Tests the set logic of maintaining the closure of group memberships."""
+    rng = random.Random(0)
+    users = range(8)
+    closure: _Closure = {(u, u): 0 for u in users}
+    memberships: set[tuple[int, int]] = set()
+
+    # Case about adding and removing memberships of groups sharing members and
+    # subgroups.
+
+    for _ in range(500):
+        if memberships and rng.random() < 0.4:
+            group, member = rng.choice(sorted(memberships))
+            _remove_member(closure, memberships, group, member)
+        else:
+            group = rng.choice(users)
+            members = rng.sample(users, rng.randint(1, 3))
+            # _add_group_members refuses memberships that make cycles.
+            if any((m, group) in closure for m in members):
+                continue
+            _add_members(closure, memberships, group, members)
+
+        assert closure == _make_closure(users, memberships)
@@ -0,0 +1,333 @@
+import asyncio
+import csv
+import json
+import multiprocessing
+from collections.abc import AsyncIterable, AsyncIterator, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Literal, assert_never
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    cast,
+    func,
+    insert,
+    literal,
+    select,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateTable
+from starlette.requests import Request
+
+from yama.user.database import UserAncestorUserDescendantDb, UserDb, lower_handle
+from yama.user.password import hash_password
+
+from ._config import Config
+from ._user import Handle, UserType
+
+UserImportFormat = Literal["csv", "ndjson"]
+
+_HANDLE_ADAPTER: TypeAdapter[Handle] = TypeAdapter(Handle)
+
+
+@dataclass(frozen=True)
+class UserImportConflict:
+    """
+    A record that wasn't imported. "invalid" records couldn't be parsed or
+    validated, "duplicate" ones repeat the handle of an earlier record and "exists"
+    ones have the handle of an existing user.
+    """
+
+    line: int
+    handle: str | None
+    reason: Literal["invalid", "duplicate", "exists"]
+
+
+@dataclass(frozen=True)
+class UserImportReport:
+    imported_count: int
+    conflicts: list[UserImportConflict]
+
+
+@dataclass(frozen=True)
+class _UserImportRecord:
+    line: int
+    type: UserType
+    handle: str
+    password: str | None
+
+
+# Records are copied into this table, then moved into users with a single INSERT that
+# skips the handles that are taken. It's created for every batch and dropped when the
+# batch is committed.
+_user_imports_table = Table(
+    "user_imports",
+    MetaData(),
+    Column("line", Integer, nullable=False),
+    Column("type", String, nullable=False),
+    Column("handle", String, nullable=False),
+    Column("password_hash", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+def _make_move_user_imports_query() -> Any:
+    t = _user_imports_table
+    insert_users_db_cte = (
+        postgresql.insert(UserDb)
+        .from_select(
+            ["type", "handle", "password_hash"],
+            select(cast(t.c.type, UserDb.type.type), t.c.handle, t.c.password_hash)
+            .order_by(t.c.line),
+        )
+        .on_conflict_do_nothing()
+        .returning(UserDb.id, UserDb.handle)
+        .cte("insert_users")
+    )  # fmt: skip
+    insert_self_ancestors_db_cte = (
+        insert(UserAncestorUserDescendantDb)
+        .from_select(
+            ["ancestor_id", "descendant_id", "descendant_depth"],
+            select(insert_users_db_cte.c.id, insert_users_db_cte.c.id, literal(0)),
+        )
+        .cte("insert_self_ancestors")
+    )
+    # Handles are compared the way the unique index compares them, so a record is a
+    # duplicate exactly when the index would reject it in favor of an earlier one.
+    ranked = select(
+        t.c.line,
+        t.c.handle,
+        lower_handle(t.c.handle).label("lower_handle"),
+        (
+            func.row_number().over(
+                partition_by=lower_handle(t.c.handle), order_by=t.c.line
+            )
+            > 1
+        ).label("is_duplicate"),
+    ).subquery("ranked")
+    return (
+        select(
+            ranked.c.line,
+            ranked.c.handle,
+            ranked.c.lower_handle,
+            ranked.c.is_duplicate,
+            (insert_users_db_cte.c.id.is_not(None) & ~ranked.c.is_duplicate).label(
+                "is_imported"
+            ),
+        )
+        .outerjoin(insert_users_db_cte, insert_users_db_cte.c.handle == ranked.c.handle)
+        .order_by(ranked.c.line)
+        .add_cte(insert_self_ancestors_db_cte)
+    )
+
+
+_MOVE_USER_IMPORTS_QUERY = _make_move_user_imports_query()
+
+
+@contextmanager
+def make_import_executor(*, config: Config) -> Iterator[Executor]:
+    """
+    Makes the process pool that hashes imported passwords. Hashing is CPU-bound, so
+    threads would be serialized by the GIL. Workers are spawned on the first import.
+    """
+    with ProcessPoolExecutor(
+        max_workers=config.import_hash_process_count,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        yield executor
+
+
+def get_import_executor(*, request: Request) -> Executor:
+    """A lifetime dependency."""
+    return request.state.user_import_executor  # type: ignore[no-any-return]
+
+
+async def import_users(
+    chunks: AsyncIterable[bytes],
+    /,
+    *,
+    format: UserImportFormat,
+    batch_size: int,
+    executor: Executor | None,
+    connection: AsyncConnection,
+) -> UserImportReport:
+    """
+    Imports users from CSV with a header or from NDJSON, one record per line. Records
+    have a handle and optionally a password and a type.
+
+    Records are loaded in batches, each committed on its own, so an interrupted
+    import can be resumed by running it again: the imported users are reported as
+    existing.
+    """
+    imported_count = 0
+    conflicts: list[UserImportConflict] = []
+    # Lowercased by the database, which lowercases some characters unlike Python.
+    seen_lower_handles: set[str] = set()
+    batch: list[_UserImportRecord] = []
+
+    async for record_or_conflict in _parse_records(chunks, format=format):
+        if isinstance(record_or_conflict, UserImportConflict):
+            conflicts.append(record_or_conflict)
+            continue
+
+        batch.append(record_or_conflict)
+        if len(batch) >= batch_size:
+            batch_conflicts = await _import_batch(
+                batch,
+                seen_lower_handles=seen_lower_handles,
+                executor=executor,
+                connection=connection,
+            )
+            imported_count += len(batch) - len(batch_conflicts)
+            conflicts.extend(batch_conflicts)
+            batch = []
+
+    if batch:
+        batch_conflicts = await _import_batch(
+            batch,
+            seen_lower_handles=seen_lower_handles,
+            executor=executor,
+            connection=connection,
+        )
+        imported_count += len(batch) - len(batch_conflicts)
+        conflicts.extend(batch_conflicts)
+
+    conflicts.sort(key=lambda c: c.line)
+    return UserImportReport(imported_count=imported_count, conflicts=conflicts)
+
+
+async def _import_batch(
+    batch: list[_UserImportRecord],
+    /,
+    *,
+    seen_lower_handles: set[str],
+    executor: Executor | None,
+    connection: AsyncConnection,
+) -> list[UserImportConflict]:
+    """
+    Imports the batch and returns its conflicts. Records repeating the handle of a
+    record in the batch or in the earlier batches, whose lowercased handles are
+    collected in seen_lower_handles, are duplicates.
+    """
+    loop = asyncio.get_running_loop()
+    hashes = iter(
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, hash_password, r.password)
+                for r in batch
+                if r.password is not None
+            )
+        )
+    )
+    password_hashes = [next(hashes) if r.password is not None else None for r in batch]
+
+    _ = await connection.execute(CreateTable(_user_imports_table))
+    raw_connection = await connection.get_raw_connection()
+    _ = await raw_connection.driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+        _user_imports_table.name,
+        records=[
+            (r.line, r.type.value, r.handle, h)
+            for r, h in zip(batch, password_hashes, strict=True)
+        ],
+        columns=[c.name for c in _user_imports_table.columns],
+    )
+    rows = (await connection.execute(_MOVE_USER_IMPORTS_QUERY)).mappings().all()
+    await connection.commit()
+
+    conflicts: list[UserImportConflict] = []
+    for row in rows:
+        if not row["is_imported"]:
+            is_duplicate = (
+                row["is_duplicate"] or row["lower_handle"] in seen_lower_handles
+            )
+            conflicts.append(
+                UserImportConflict(
+                    line=row["line"],
+                    handle=row["handle"],
+                    reason="duplicate" if is_duplicate else "exists",
+                )
+            )
+    seen_lower_handles.update(row["lower_handle"] for row in rows)
+    return conflicts
+
+
+async def _parse_records(
+    chunks: AsyncIterable[bytes], /, *, format: UserImportFormat
+) -> AsyncIterator[_UserImportRecord | UserImportConflict]:
+    header: list[str] | None = None
+    async for line_number, line_bytes in _split_lines(chunks):
+        try:
+            line = line_bytes.decode()
+        except UnicodeDecodeError:
+            yield UserImportConflict(line=line_number, handle=None, reason="invalid")
+            continue
+        if not line.strip():
+            continue
+
+        data: Any
+        try:
+            match format:
+                case "csv":
+                    (fields,) = csv.reader([line])
+                    if header is None:
+                        header = fields
+                        continue
+                    data = dict(zip(header, fields, strict=True))
+                case "ndjson":
+                    data = json.loads(line)
+                case _:
+                    assert_never(format)
+        except (csv.Error, ValueError):
+            yield UserImportConflict(line=line_number, handle=None, reason="invalid")
+            continue
+
+        yield _data_to_record_or_conflict(data, line=line_number)
+
+
+def _data_to_record_or_conflict(
+    data: Any, /, *, line: int
+) -> _UserImportRecord | UserImportConflict:
+    if not isinstance(data, dict):
+        return UserImportConflict(line=line, handle=None, reason="invalid")
+
+    handle = data.get("handle")
+    password = data.get("password") or None
+    try:
+        type_ = UserType(data.get("type") or UserType.REGULAR)
+        handle = _HANDLE_ADAPTER.validate_python(handle)
+    except (ValidationError, ValueError):
+        return UserImportConflict(
+            line=line,
+            handle=handle if isinstance(handle, str) else None,
+            reason="invalid",
+        )
+
+    # Groups can't sign in, so they have no passwords.
+    if not isinstance(password, str | None) or (
+        type_ == UserType.GROUP and password is not None
+    ):
+        return UserImportConflict(line=line, handle=handle, reason="invalid")
+
+    return _UserImportRecord(line=line, type=type_, handle=handle, password=password)
+
+
+async def _split_lines(
+    chunks: AsyncIterable[bytes], /
+) -> AsyncIterator[tuple[int, bytes]]:
+    line_number = 0
+    rest = b""
+    async for chunk in chunks:
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.removesuffix(b"\r")
+    if rest:
+        yield line_number + 1, rest.removesuffix(b"\r")
@@ -0,0 +1,64 @@
+from collections.abc import AsyncIterator
+
+from ._import import (
+    UserImportConflict,
+    UserImportFormat,
+    _parse_records,
+    _UserImportRecord,
+)
+from ._user import UserType
+
+
+async def _parse(
+    content: bytes, /, *, format: UserImportFormat
+) -> list[_UserImportRecord | UserImportConflict]:
+    async def chunks() -> AsyncIterator[bytes]:
+        # Lines are split across chunks.
+        for i in range(0, len(content), 5):
+            yield content[i : i + 5]
+
+    return [r async for r in _parse_records(chunks(), format=format)]
+
+
+async def test_parse_records() -> None:
+    """Tests the _parse_records function."""
+
+    # Case about parsing CSV.
+
+    records = await _parse(
+        b"handle,password,type\r\nfoo,secret,\r\nbar,,group\r\nbaz,secret,group\r\n,x,",
+        format="csv",
+    )
+    assert records == [
+        _UserImportRecord(
+            line=2, type=UserType.REGULAR, handle="foo", password="secret"
+        ),
+        _UserImportRecord(line=3, type=UserType.GROUP, handle="bar", password=None),
+        UserImportConflict(line=4, handle="baz", reason="invalid"),
+        UserImportConflict(line=5, handle="", reason="invalid"),
+    ]
+
+    # Case about parsing NDJSON.
+
+    records = await _parse(
+        b'{"handle": "foo", "password": "secret"}\n\n{"handle": "current"}\n[]\n{',
+        format="ndjson",
+    )
+    assert records == [
+        _UserImportRecord(
+            line=1, type=UserType.REGULAR, handle="foo", password="secret"
+        ),
+        UserImportConflict(line=3, handle="current", reason="invalid"),
+        UserImportConflict(line=4, handle=None, reason="invalid"),
+        UserImportConflict(line=5, handle=None, reason="invalid"),
+    ]
+
+    # Case about parsing lines that aren't valid UTF-8.
+
+    records = await _parse(
+        b'{"handle": "f\xffoo"}\n{"handle": "b\xc3\xa4r"}\n', format="ndjson"
+    )
+    assert records == [
+        UserImportConflict(line=1, handle=None, reason="invalid"),
+        _UserImportRecord(line=2, type=UserType.REGULAR, handle="bär", password=None),
+    ]
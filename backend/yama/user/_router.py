@@ -1,17 +1,33 @@
+from concurrent.futures import Executor
 from typing import Annotated, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy import func, insert, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.requests import Request
 
 from yama import database
 from yama.auth import get_current_user_id
-from yama.user.database import UserDb
+from yama.user.database import UserDb, lower_handle
 from yama.user.password import hash_password
 
-from ._user import Handle, UserType, _user_exists
+from ._config import Config, get_config
+from ._group import (
+    _add_group_members,
+    _can_manage_group,
+    _create_group,
+    _GroupCycleError,
+    _read_group_members,
+    _remove_group_member,
+)
+from ._import import (
+    UserImportFormat,
+    get_import_executor,
+    import_users,
+)
+from ._user import Handle, UserType, _add_user, _user_exists
 
 router = APIRouter()
 
@@ -28,39 +44,95 @@ class _UserOut(BaseModel):
     handle: Handle
 
 
+class _UserImportConflictOut(BaseModel):
+    line: int
+    handle: str | None
+    reason: Literal["invalid", "duplicate", "exists"]
+
+
+class _UserImportReportOut(BaseModel):
+    imported_count: int
+    conflicts: list[_UserImportConflictOut]
+
+
+class _GroupCreateIn(BaseModel):
+    handle: Handle
+
+
+class _GroupMembersAddIn(BaseModel):
+    handles: list[Handle]
+
+
 @router.post("/users")
 async def _create_user(
     *,
     user_create_in: _UserCreateIn,
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
 ) -> _UserOut:
+    connection = await lazy_connection.get()
     if await _user_exists(handle=user_create_in.handle, connection=connection):
         raise HTTPException(status_code=400, detail="User already exists.")
 
     password_hash = hash_password(user_create_in.password)
 
-    query = (
-        insert(UserDb)
-        .values(
-            type=user_create_in.type.value,
-            handle=user_create_in.handle,
-            password_hash=password_hash,
-        )
-        .returning(UserDb)
+    user_db = await _add_user(
+        type_=user_create_in.type,
+        handle=user_create_in.handle,
+        password_hash=password_hash,
+        connection=connection,
     )
-    row = (await connection.execute(query)).mappings().one()
-    user_db = UserDb(**row)
     await connection.commit()
 
     return _user_db_to_user_out(user_db)
 
 
+@router.post(
+    "/users/import",
+    description="Import users from the request body in CSV with a header or NDJSON, one record per line with a handle and optionally a password and a type. Only the root user can import users.",
+)
+async def _import_users(
+    *,
+    format: Annotated[UserImportFormat, Query()],
+    request: Request,
+    config: Annotated[Config, Depends(get_config)],
+    current_user_id: Annotated[UUID, Depends(get_current_user_id)],
+    executor: Annotated[Executor, Depends(get_import_executor)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
+) -> _UserImportReportOut:
+    if current_user_id != config.root_user_id:
+        raise HTTPException(400, "Permission denied.")
+
+    connection = await lazy_connection.get()
+    report = await import_users(
+        request.stream(),
+        format=format,
+        batch_size=config.import_batch_size,
+        executor=executor,
+        connection=connection,
+    )
+
+    return _UserImportReportOut(
+        imported_count=report.imported_count,
+        conflicts=[
+            _UserImportConflictOut(line=c.line, handle=c.handle, reason=c.reason)
+            for c in report.conflicts
+        ],
+    )
+
+
 @router.get("/users/current")
 async def _read_current_user(
     *,
     current_user_id: Annotated[UUID, Depends(get_current_user_id)],
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
 ) -> _UserOut:
+    connection = await lazy_connection.get()
     query = select(UserDb).where(UserDb.id == current_user_id)
     row = (await connection.execute(query)).mappings().one_or_none()
     if row is None:
@@ -74,9 +146,12 @@ async def _read_current_user(
 async def _read_user(
     *,
     handle: Handle,
-    connection: Annotated[AsyncConnection, Depends(database.get_connection)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
 ) -> _UserOut:
-    query = select(UserDb).where(func.lower(UserDb.handle) == func.lower(handle))
+    connection = await lazy_connection.get()
+    query = select(UserDb).where(lower_handle(UserDb.handle) == lower_handle(handle))
     row = (await connection.execute(query)).mappings().one_or_none()
     if row is None:
         raise HTTPException(400, "User not found.")
@@ -85,16 +160,186 @@ async def _read_user(
     return _user_db_to_user_out(user_db)
 
 
-@router.get("/users")
+@router.get(
+    "/users",
+    description="Read users ordered by handle. Pass the last handle as the after query parameter to read the next page.",
+)
 async def _read_users(
-    *, connection: Annotated[AsyncConnection, Depends(database.get_connection)]
+    *,
+    prefix: Annotated[str | None, Query(min_length=1)] = None,
+    after: Annotated[str | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
 ) -> list[_UserOut]:
-    query = select(UserDb)
+    connection = await lazy_connection.get()
+    # Both the prefix and the page are ranges of users_lower_handle_uidx.
+    query = select(UserDb).order_by(lower_handle(UserDb.handle)).limit(limit)
+    if prefix is not None:
+        start, end = _prefix_to_range(prefix.lower())
+        query = query.where(lower_handle(UserDb.handle) >= lower_handle(start))
+        if end is not None:
+            query = query.where(lower_handle(UserDb.handle) < lower_handle(end))
+    if after is not None:
+        query = query.where(lower_handle(UserDb.handle) > lower_handle(after))
     rows = (await connection.execute(query)).mappings()
     users_db = [UserDb(**row) for row in rows]
 
     return [_user_db_to_user_out(u) for u in users_db]
 
 
+@router.post("/groups")
+async def _create_group_(
+    *,
+    group_create_in: _GroupCreateIn,
+    current_user_id: Annotated[UUID, Depends(get_current_user_id)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
+) -> _UserOut:
+    connection = await lazy_connection.get()
+    if await _user_exists(handle=group_create_in.handle, connection=connection):
+        raise HTTPException(status_code=400, detail="User already exists.")
+
+    group_db = await _create_group(
+        handle=group_create_in.handle,
+        created_by=current_user_id,
+        connection=connection,
+    )
+    await connection.commit()
+
+    return _user_db_to_user_out(group_db)
+
+
+@router.get("/groups/{handle}/members", dependencies=[Depends(get_current_user_id)])
+async def _read_group_members_(
+    *,
+    handle: Handle,
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_read_only_lazy_connection)
+    ],
+) -> list[_UserOut]:
+    connection = await lazy_connection.get()
+    group_db = await _read_group(handle, connection=connection)
+    members_db = await _read_group_members(group_db.id, connection=connection)
+
+    return [_user_db_to_user_out(m) for m in members_db]
+
+
+@router.post("/groups/{handle}/members")
+async def _add_group_members_(
+    *,
+    handle: Handle,
+    group_members_add_in: _GroupMembersAddIn,
+    config: Annotated[Config, Depends(get_config)],
+    current_user_id: Annotated[UUID, Depends(get_current_user_id)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
+) -> list[_UserOut]:
+    """
+    Adds the members in bulk and returns the ones that weren't members yet.
+    """
+    connection = await lazy_connection.get()
+    group_db = await _read_managed_group(
+        handle, user_id=current_user_id, config=config, connection=connection
+    )
+
+    handles = {h.lower() for h in group_members_add_in.handles}
+    query = select(UserDb).where(
+        lower_handle(UserDb.handle).in_([lower_handle(h) for h in handles])
+    )
+    rows = (await connection.execute(query)).mappings()
+    users_db = {u.id: u for u in (UserDb(**row) for row in rows)}
+    if len(users_db) != len(handles):
+        raise HTTPException(400, "User not found.")
+
+    try:
+        added_ids = await _add_group_members(
+            group_db.id, list(users_db), connection=connection
+        )
+    except _GroupCycleError:
+        raise HTTPException(400, "Group can't be its own member.")
+    await connection.commit()
+
+    return [_user_db_to_user_out(users_db[id_]) for id_ in added_ids]
+
+
+@router.delete("/groups/{handle}/members/{member_handle}")
+async def _remove_group_member_(
+    *,
+    handle: Handle,
+    member_handle: Handle,
+    config: Annotated[Config, Depends(get_config)],
+    current_user_id: Annotated[UUID, Depends(get_current_user_id)],
+    lazy_connection: Annotated[
+        database.LazyConnection, Depends(database.get_lazy_connection)
+    ],
+) -> _UserOut:
+    connection = await lazy_connection.get()
+    group_db = await _read_managed_group(
+        handle, user_id=current_user_id, config=config, connection=connection
+    )
+
+    query = select(UserDb).where(
+        lower_handle(UserDb.handle) == lower_handle(member_handle)
+    )
+    row = (await connection.execute(query)).mappings().one_or_none()
+    if row is None:
+        raise HTTPException(400, "User not found.")
+    member_db = UserDb(**row)
+
+    if not await _remove_group_member(group_db.id, member_db.id, connection=connection):
+        raise HTTPException(400, "User is not a member.")
+    await connection.commit()
+
+    return _user_db_to_user_out(member_db)
+
+
+async def _read_group(handle: str, /, *, connection: AsyncConnection) -> UserDb:
+    query = (
+        select(UserDb)
+        .where(lower_handle(UserDb.handle) == lower_handle(handle))
+        .where(UserDb.type == UserType.GROUP.value)
+    )
+    row = (await connection.execute(query)).mappings().one_or_none()
+    if row is None:
+        raise HTTPException(400, "Group not found.")
+    return UserDb(**row)
+
+
+async def _read_managed_group(
+    handle: str, /, *, user_id: UUID, config: Config, connection: AsyncConnection
+) -> UserDb:
+    group_db = await _read_group(handle, connection=connection)
+    if not await _can_manage_group(
+        group_db.id,
+        user_id=user_id,
+        root_user_id=config.root_user_id,
+        connection=connection,
+    ):
+        raise HTTPException(400, "Permission denied.")
+    return group_db
+
+
+def _prefix_to_range(prefix: str, /) -> tuple[str, str | None]:
+    """
+    Returns the range of strings starting with the prefix in code point order. The
+    end is exclusive and None if the range is unbounded.
+    """
+    end = prefix
+    while end and end[-1] == chr(0x10FFFF):
+        end = end[:-1]
+    if not end:
+        return prefix, None
+
+    next_code_point = ord(end[-1]) + 1
+    # Surrogates can't be encoded, so the code point after U+D7FF is U+E000.
+    if 0xD800 <= next_code_point <= 0xDFFF:
+        next_code_point = 0xE000
+    return prefix, end[:-1] + chr(next_code_point)
+
+
 def _user_db_to_user_out(u: UserDb, /) -> _UserOut:
     return _UserOut(id=u.id, type=UserType(u.type), handle=u.handle)
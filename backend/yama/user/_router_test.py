@@ -0,0 +1,9 @@
+from ._router import _prefix_to_range
+
+
+def test_prefix_to_range() -> None:
+    """Tests the _prefix_to_range function."""
+    assert _prefix_to_range("foo") == ("foo", "fop")
+    assert _prefix_to_range("foo\U0010ffff") == ("foo\U0010ffff", "fop")
+    assert _prefix_to_range("\U0010ffff") == ("\U0010ffff", None)
+    assert _prefix_to_range("foo\ud7ff") == ("foo\ud7ff", "foo\ue000")
@@ -2,17 +2,17 @@ from enum import Enum
 from typing import Annotated, TypeAlias
 
 from pydantic import AfterValidator
-from sqlalchemy import exists, func, select
+from sqlalchemy import exists, insert, literal, select
 from sqlalchemy.ext.asyncio import AsyncConnection
 
-from yama.user.database import UserDb
+from yama.user.database import UserAncestorUserDescendantDb, UserDb, lower_handle
 
 _MIN_HANDLE_LENGTH = 1
 _MAX_HANDLE_LENGTH = 255
 
 
 async def _user_exists(*, handle: str, connection: AsyncConnection) -> bool:
-    query = select(exists().where(func.lower(UserDb.handle) == func.lower(handle)))
+    query = select(exists().where(lower_handle(UserDb.handle) == lower_handle(handle)))
     return (await connection.execute(query)).scalar_one()
 
 
@@ -31,3 +31,36 @@ Handle: TypeAlias = Annotated[str, AfterValidator(_check_handle)]
 class UserType(str, Enum):
     REGULAR = "regular"
     GROUP = "group"
+
+
+async def _add_user(
+    *,
+    type_: UserType,
+    handle: str,
+    password_hash: str | None,
+    connection: AsyncConnection,
+) -> UserDb:
+    """
+    Adds the user along with the closure row that makes it its own ancestor.
+    """
+    insert_user_db_cte = (
+        insert(UserDb)
+        .values(type=type_.value, handle=handle, password_hash=password_hash)
+        .returning(UserDb)
+        .cte()
+    )
+    insert_self_ancestor_db_cte = (
+        insert(UserAncestorUserDescendantDb)
+        .from_select(
+            ["ancestor_id", "descendant_id", "descendant_depth"],
+            select(
+                insert_user_db_cte.c.id,
+                insert_user_db_cte.c.id,
+                literal(0),
+            ),
+        )
+        .cte()
+    )
+    query = select(insert_user_db_cte).add_cte(insert_self_ancestor_db_cte)
+    row = (await connection.execute(query)).mappings().one()
+    return UserDb(**row)
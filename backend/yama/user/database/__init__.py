@@ -1,3 +1,4 @@
 from ._database import UserAncestorUserDescendantDb as UserAncestorUserDescendantDb
 from ._database import UserDb as UserDb
-from ._database import UserTypeDb as UserTypeDb
+from ._database import UserMembershipDb as UserMembershipDb
+from ._database import lower_handle as lower_handle
@@ -1,34 +1,50 @@
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import (
+    ColumnElement,
+    Enum,
+    ForeignKey,
+    SQLColumnExpression,
+    false,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
 from yama import database
 
 
-class UserTypeDb(database.BaseTable):
-    __tablename__ = "user_types"
-
-    type: Mapped[str] = mapped_column(primary_key=True)
-
-
 class UserDb(database.BaseTable):
     __tablename__ = "users"
 
     id: Mapped[UUID] = mapped_column(
         server_default=func.uuid_generate_v4(), primary_key=True
     )
-    type: Mapped[str] = mapped_column(ForeignKey("user_types.type"))
+    type: Mapped[str] = mapped_column(Enum("regular", "group", name="user_type"))
     handle: Mapped[str]
     password_hash: Mapped[str | None]
 
 
+def lower_handle(handle: SQLColumnExpression[str] | str, /) -> ColumnElement[str]:
+    """
+    Lowercases the handle in the "C" collation, like the users_lower_handle_uidx
+    index, so that comparisons and ordering by it use the index.
+    """
+    return func.lower(handle).collate("C")
+
+
 class UserAncestorUserDescendantDb(database.BaseTable):
     __tablename__ = "user_ancestors_user_descendants"
 
-    id: Mapped[UUID] = mapped_column(
-        server_default=func.uuid_generate_v4(), primary_key=True
+    ancestor_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    descendant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("users.id"), primary_key=True
     )
-    ancestor_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
-    descendant_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
     descendant_depth: Mapped[int]
+
+
+class UserMembershipDb(database.BaseTable):
+    __tablename__ = "user_memberships"
+
+    group_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    member_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    is_admin: Mapped[bool] = mapped_column(server_default=false())